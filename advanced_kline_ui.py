@@ -5,18 +5,28 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox
-import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import matplotlib.dates as mdates
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import threading
-import time
 import queue
+import os
 
-from data_fetcher import StockDataFetcher
+from config import DATA_DIR, OFFSCREEN_RENDER
+from data_fetcher import create_fetcher
+from kline_renderer import ohlcv_arrays, draw_candlesticks, draw_volume
+from latency_trace import TraceRecorder
+from profiling import profiled
+from render_scheduler import RenderScheduler
+import offscreen_render
+from price_stream import PriceStreamView
+from font_utils import setup_cjk_font
+from quote_hub import TRADE_FIELDS, get_hub, trace_for
+from update_engine import UpdateEngine
+
+setup_cjk_font()
 
 class AdvancedKlineUI:
     def __init__(self, root):
@@ -29,21 +39,30 @@ class AdvancedKlineUI:
         self.update_interval = 5  # 5秒更新，比同花顺快12倍
         self.is_updating = False
         self.update_count = 0
+        self.subscription = None
         
         # 数据存储
-        self.fetcher = StockDataFetcher()
+        self.fetcher = create_fetcher()
         self.kline_data = pd.DataFrame()
         self.realtime_data = []
         self.price_queue = queue.Queue()
         
+        # 端到端延迟追踪：请求 -> 响应 -> 解析 -> 投递 -> 绘制 -> 画布刷新
+        self.trace_recorder = TraceRecorder()
+        
+        # 界面刷新调度：行情入队后标记刷新，主线程按帧合并处理
+        self.scheduler = RenderScheduler(self.root)
+        # 后台任务：固定大小线程池，停止/重新开始后旧任务的结果直接丢弃
+        self.engine = UpdateEngine(self.scheduler)
+        
         # 界面样式配置
         self.setup_styles()
         
         # 创建界面
         self.create_widgets()
         
-        # 启动价格更新检查
-        self.check_price_updates()
+        # 启动时钟显示
+        self.update_clock()
         
     def setup_styles(self):
         """设置界面样式"""
@@ -99,6 +118,7 @@ class AdvancedKlineUI:
         self.stop_btn.pack(side="left", padx=5)
         
         ttk.Button(row1, text="🔄 刷新", command=self.refresh_data).pack(side="left", padx=5)
+        ttk.Button(row1, text="📤 导出延迟", command=self.export_latency_csv).pack(side="left", padx=5)
         
         # 第二行：状态信息
         row2 = ttk.Frame(control_frame)
@@ -172,6 +192,8 @@ class AdvancedKlineUI:
             ("最低:", "low_var"),
             ("成交量:", "volume_var"),
             ("成交额:", "amount_var"),
+            ("买一:", "bid_var"),
+            ("卖一:", "ask_var"),
         ]
         
         for i, (label, var_name) in enumerate(info_items):
@@ -187,13 +209,10 @@ class AdvancedKlineUI:
         stream_frame = ttk.LabelFrame(parent, text="价格流水", padding=5)
         stream_frame.pack(fill="both", expand=True)
         
-        # 价格流显示
-        self.price_stream = tk.Listbox(stream_frame, height=12, font=("Courier", 9))
-        stream_scroll = ttk.Scrollbar(stream_frame, orient="vertical", command=self.price_stream.yview)
-        self.price_stream.configure(yscrollcommand=stream_scroll.set)
-        
-        self.price_stream.pack(side="left", fill="both", expand=True)
-        stream_scroll.pack(side="right", fill="y")
+        # 价格流显示（环形缓冲区，只绘制可见行）
+        self.price_stream = PriceStreamView(stream_frame, capacity=2000, height=12,
+                                            scheduler=self.scheduler, show_filter=True)
+        self.price_stream.pack(fill="both", expand=True)
         
     def create_chart_panel(self, parent):
         """创建图表面板"""
@@ -204,15 +223,27 @@ class AdvancedKlineUI:
         self.ax_main = self.fig.add_subplot(3, 1, (1, 2))  # K线图（占用2/3空间）
         self.ax_volume = self.fig.add_subplot(3, 1, 3)     # 成交量（占用1/3空间）
         
-        # 创建画布
-        self.canvas = FigureCanvasTkAgg(self.fig, parent)
-        self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        # 创建画布：后台渲染模式下图形只在工作线程绘制，主线程只贴图
+        self.offscreen = None
+        if OFFSCREEN_RENDER and offscreen_render.is_available():
+            self.offscreen = offscreen_render.OffscreenChart(parent, self.fig, self.scheduler)
+        else:
+            self.canvas = FigureCanvasTkAgg(self.fig, parent)
+            self.canvas.get_tk_widget().pack(fill="both", expand=True)
         
         # 初始化空图表
         self.init_chart()
         
     def init_chart(self):
         """初始化图表"""
+        if self.offscreen is not None:
+            self.offscreen.render(self.draw_empty_chart)
+        else:
+            self.draw_empty_chart()
+            self.canvas.draw()
+        
+    def draw_empty_chart(self):
+        """绘制空图表（标题、坐标轴和网格）"""
         # 清空图表
         self.ax_main.clear()
         self.ax_volume.clear()
@@ -229,12 +260,13 @@ class AdvancedKlineUI:
         
         # 调整布局
         self.fig.tight_layout()
-        self.canvas.draw()
         
     def on_freq_change(self, event=None):
         """更新频率改变"""
         freq_text = self.freq_var.get()
         self.update_interval = int(freq_text.replace('秒', ''))
+        if self.subscription is not None:
+            self.subscription.set_interval(self.update_interval)
         
     def start_updates(self):
         """开始更新"""
@@ -247,195 +279,238 @@ class AdvancedKlineUI:
         self.start_btn.config(state="disabled")
         self.stop_btn.config(state="normal")
         
-        # 启动更新线程
-        threading.Thread(target=self.update_thread, daemon=True).start()
+        # 新的一代任务：上一次启动尚未完成的加载和订阅全部作废
+        token = self.engine.start()
+        self.engine.submit(self.update_thread, self.current_stock, token=token)
         
         self.update_status("开始实时更新")
         
     def stop_updates(self):
-        """停止更新"""
+        """停止更新（订阅随代号一起关闭）"""
         self.is_updating = False
+        self.engine.stop()
         self.start_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
         self.update_status("已停止更新")
         
     def refresh_data(self):
-        """刷新数据"""
-        threading.Thread(target=self.load_initial_data, daemon=True).start()
+        """刷新数据（加载未完成时不重复提交）"""
+        self.engine.submit(self.load_initial_data, self.current_stock, key="load")
         
-    def update_thread(self):
-        """更新线程"""
-        # 首次加载基础数据
-        self.load_initial_data()
-        
-        while self.is_updating:
-            try:
-                start_time = time.time()
-                
-                # 生成模拟实时数据
-                self.generate_realtime_data()
-                
-                # 计算延迟
-                delay = (time.time() - start_time) * 1000  # 转为毫秒
-                
-                # 更新计数和延迟显示
-                self.update_count += 1
-                self.root.after(0, lambda: self.count_var.set(str(self.update_count)))
-                self.root.after(0, lambda: self.delay_var.set(f"{delay:.1f}ms"))
-                
-                time.sleep(self.update_interval)
-                
-            except Exception as e:
-                self.root.after(0, lambda: self.update_status(f"更新失败: {str(e)}"))
-                break
+    def update_thread(self, token, stock_code):
+        """首次加载基础数据，之后行情由 QuoteHub 统一轮询推送"""
+        self.load_initial_data(token, stock_code)
+        if token.cancelled:
+            return
+        subscription = get_hub().subscribe([stock_code], lambda quotes: self.on_quotes(token, stock_code, quotes),
+                                           interval=self.update_interval)
+        self.subscription = subscription
+        self.engine.attach(token, lambda: self.close_subscription(subscription))
+        
+    def close_subscription(self, subscription):
+        subscription.close()
+        if self.subscription is subscription:
+            self.subscription = None
                 
-    def load_initial_data(self):
-        """加载初始数据"""
+    def load_initial_data(self, token, stock_code):
+        """加载初始数据（线程池中执行，结果在主线程落到界面）"""
         try:
-            self.update_status("加载基础数据...")
+            self.engine.post(token, "status", self.update_status, "加载基础数据...")
             
-            # 获取历史K线数据
-            hist_data = self.fetcher.get_historical_data(self.current_stock)
-            if hist_data is not None:
-                self.kline_data = hist_data.tail(30)  # 取最近30根K线
-                
+            # 获取历史K线数据（取最近30根K线）
+            hist_data = self.fetcher.get_historical_data(stock_code)
             # 获取基本信息
-            info = self.fetcher.get_stock_info(self.current_stock)
-            if info:
-                self.root.after(0, lambda: self.name_var.set(info.get('股票简称', '--')))
-                
-            self.root.after(0, self.update_chart)
-            self.update_status("基础数据加载完成")
+            info = self.fetcher.get_stock_info(stock_code)
+            
+            self.engine.post(token, "initial_data", self.on_initial_data, hist_data, info)
             
         except Exception as e:
-            self.update_status(f"数据加载失败: {str(e)}")
+            self.engine.post(token, "status", self.update_status, f"数据加载失败: {str(e)}")
             
-    def generate_realtime_data(self):
-        """生成实时数据"""
-        if self.kline_data.empty:
+    def on_initial_data(self, hist_data, info):
+        """主线程：应用基础数据"""
+        if hist_data is not None:
+            self.kline_data = hist_data.tail(30)
+        if info:
+            self.name_var.set(info.get('股票简称', '--'))
+        self.update_chart()
+        self.update_status("基础数据加载完成")
+            
+    def on_quotes(self, token, stock_code, quotes):
+        """QuoteHub 推送行情（轮询线程）：投递到界面队列，过期订阅的推送直接丢弃"""
+        if token.cancelled:
+            return
+        quote = quotes.get(stock_code)
+        if not quote:
+            self.engine.post(token, "status", self.update_status, "本轮未获取到行情")
             return
             
-        # 基于最后收盘价生成实时价格
-        last_close = float(self.kline_data.iloc[-1]['收盘'])
-        
-        # 模拟价格波动
-        change_rate = np.random.uniform(-0.005, 0.005)  # ±0.5%的随机波动
-        new_price = last_close * (1 + change_rate)
-        
-        # 计算涨跌
-        change_amount = new_price - last_close
-        change_percent = (change_amount / last_close) * 100
-        
-        # 模拟其他数据
-        volume = np.random.randint(10000, 100000)
-        
-        # 更新显示
-        current_time = datetime.now()
-        
-        # 将数据放入队列
+        trace = trace_for(quote, stock_code)
         price_data = {
-            'time': current_time,
-            'price': new_price,
-            'change_amount': change_amount,
-            'change_percent': change_percent,
-            'volume': volume
+            'time': datetime.now(),
+            'price': quote['price'],
+            'change_amount': quote.get('change_amount', 0),
+            'change_percent': quote['change'],
+            'volume': int(quote.get('volume', 0)),
+            'bid': quote.get('bid', 0),
+            'ask': quote.get('ask', 0),
+            'quote_time': quote.get('quote_time', ''),
+            # QuoteHub 只推送有变化的股票，这里记录具体哪些字段变了
+            'changed': set(quote.get('changed_fields', quote)),
+            'trace': trace,
         }
         
+        trace.mark("queued")
         self.price_queue.put(price_data)
+        self.scheduler.mark_dirty("quotes", self.check_price_updates)
+        
+        # 更新计数
+        self.update_count += 1
+        self.engine.post(token, "count", self.count_var.set, str(self.update_count))
         
     def check_price_updates(self):
-        """检查价格更新队列"""
+        """处理价格更新队列（由刷新调度器在主线程调用）"""
+        batch = []
         try:
             while not self.price_queue.empty():
-                data = self.price_queue.get_nowait()
-                self.update_price_display(data)
+                batch.append(self.price_queue.get_nowait())
         except queue.Empty:
             pass
+        if not batch:
+            return
         
-        # 更新时间显示
-        self.time_var.set(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        # 标签只显示最新一笔并且只更新变化的字段，成交变化的各笔一次写入价格流
+        latest = batch[-1]
+        changed = set().union(*(d['changed'] for d in batch))
+        self.update_price_display(latest, changed)
+        self.price_stream.extend((d['time'], d['price'], d['change_percent'], d['volume'], self.current_stock)
+                                 for d in batch if d['changed'] & TRADE_FIELDS)
         
-        # 每100ms检查一次
-        self.root.after(100, self.check_price_updates)
+        # 只有买卖盘变化时不重绘；否则最新行情合并到K线，下一帧重绘，完成后记录端到端延迟
+        if not changed & TRADE_FIELDS:
+            return
+        self.apply_quote_to_kline(latest)
+        self.scheduler.mark_dirty("chart", self.update_chart, latest.get('trace'))
+        
+    def update_clock(self):
+        """更新时间显示"""
+        self.time_var.set(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        self.root.after(1000, self.update_clock)
         
-    def update_price_display(self, data):
-        """更新价格显示"""
+    def update_price_display(self, data, changed):
+        """更新价格显示，只写入 changed 中变化的字段"""
         # 更新价格
-        self.price_var.set(f"{data['price']:.2f}")
+        if 'price' in changed:
+            self.price_var.set(f"{data['price']:.2f}")
         
         # 更新涨跌信息
-        change_text = f"{data['change_amount']:+.2f} ({data['change_percent']:+.2f}%)"
-        self.change_var.set(change_text)
-        
-        # 设置颜色
-        if data['change_percent'] > 0:
-            self.change_label.configure(style="Positive.TLabel")
-        elif data['change_percent'] < 0:
-            self.change_label.configure(style="Negative.TLabel")
-        else:
-            self.change_label.configure(foreground="black")
+        if changed & {'change', 'change_amount'}:
+            change_text = f"{data['change_amount']:+.2f} ({data['change_percent']:+.2f}%)"
+            self.change_var.set(change_text)
+            
+            # 设置颜色
+            if data['change_percent'] > 0:
+                self.change_label.configure(style="Positive.TLabel")
+            elif data['change_percent'] < 0:
+                self.change_label.configure(style="Negative.TLabel")
+            else:
+                self.change_label.configure(foreground="black")
         
         # 更新其他信息
-        self.volume_var.set(f"{data['volume']:,}")
-        
-        # 添加到价格流
-        time_str = data['time'].strftime("%H:%M:%S")
-        stream_text = f"{time_str} {data['price']:.2f} {data['change_percent']:+.2f}%"
-        
-        self.price_stream.insert(0, stream_text)
-        if self.price_stream.size() > 50:
-            self.price_stream.delete(50, tk.END)
+        if 'volume' in changed:
+            self.volume_var.set(f"{data['volume']:,}")
+        if 'bid' in changed:
+            self.bid_var.set(f"{data['bid']:.2f}")
+        if 'ask' in changed:
+            self.ask_var.set(f"{data['ask']:.2f}")
+            
+    def apply_quote_to_kline(self, data):
+        """将实时行情合并到最后一根K线（行情日期更新时追加新K线）"""
+        quote_date = data.get('quote_time', '')[:8]
+        if self.kline_data.empty or not quote_date:
+            return
             
-    def update_chart(self):
+        df = self.kline_data.copy()
+        price = data['price']
+        last_date = pd.to_datetime(df.iloc[-1]['日期']).strftime('%Y%m%d')
+        
+        if quote_date == last_date:
+            idx = df.index[-1]
+            df.loc[idx, '收盘'] = price
+            df.loc[idx, '最高'] = max(float(df.loc[idx, '最高']), price)
+            df.loc[idx, '最低'] = min(float(df.loc[idx, '最低']), price)
+            df.loc[idx, '成交量'] = data['volume']
+        elif quote_date > last_date:
+            new_bar = {
+                '日期': f"{quote_date[:4]}-{quote_date[4:6]}-{quote_date[6:]}",
+                '开盘': price, '收盘': price, '最高': price, '最低': price,
+                '成交量': data['volume'],
+            }
+            df = pd.concat([df, pd.DataFrame([new_bar])], ignore_index=True).tail(30)
+            
+        self.kline_data = df
+        
+    @profiled("draw.AdvancedKlineUI.update_chart")
+    def update_chart(self, trace=None):
         """更新图表"""
         if self.kline_data.empty:
             return
             
+        # 后台渲染：把当前K线快照交给工作线程，贴图完成后再记录延迟
+        if self.offscreen is not None:
+            self.offscreen.render(self.draw_kline_chart, self.kline_data, trace,
+                                  on_done=lambda: self.finish_trace(trace))
+            return
+            
         try:
             # 重绘K线图
-            self.draw_kline_chart()
+            self.draw_kline_chart(self.kline_data, trace)
+                
             self.canvas.draw()
+            self.canvas.flush_events()
+            self.finish_trace(trace)
             
         except Exception as e:
             print(f"图表更新错误: {e}")
             
-    def draw_kline_chart(self):
-        """绘制K线图"""
+    def finish_trace(self, trace):
+        """画面已刷新：记录端到端延迟并显示"""
+        if trace is None:
+            return
+        trace.mark("canvas_flushed")
+        self.trace_recorder.add(trace)
+        self.delay_var.set(trace.format_status())
+            
+    def export_latency_csv(self):
+        """导出端到端延迟时间线"""
+        if self.trace_recorder.latest() is None:
+            messagebox.showinfo("提示", "暂无延迟记录，请先开始实时更新")
+            return
+            
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(DATA_DIR, f"latency_{self.current_stock}_{timestamp}.csv")
+        count = self.trace_recorder.export_csv(path)
+        self.update_status(f"已导出 {count} 条延迟记录: {path}")
+            
+    @profiled("draw.AdvancedKlineUI.draw_kline_chart")
+    def draw_kline_chart(self, kline_data=None, trace=None):
+        """绘制K线图（后台渲染模式下在工作线程调用，只读传入的K线快照）"""
         # 清空图表
         self.ax_main.clear()
         self.ax_volume.clear()
         
-        df = self.kline_data.copy()
+        df = (self.kline_data if kline_data is None else kline_data).copy()
         df['日期'] = pd.to_datetime(df['日期'])
         
-        # 绘制K线
-        for i, (idx, row) in enumerate(df.iterrows()):
-            x = i
-            open_price = float(row['开盘'])
-            high_price = float(row['最高'])
-            low_price = float(row['最低'])
-            close_price = float(row['收盘'])
-            volume = float(row['成交量'])
-            
-            # K线颜色
-            color = 'red' if close_price >= open_price else 'green'
-            
-            # 绘制影线
-            self.ax_main.plot([x, x], [low_price, high_price], color='black', linewidth=1)
-            
-            # 绘制实体
-            body_height = abs(close_price - open_price)
-            body_bottom = min(open_price, close_price)
-            
-            if body_height > 0:
-                self.ax_main.add_patch(plt.Rectangle((x-0.4, body_bottom), 0.8, body_height, 
-                                                    facecolor=color, alpha=0.8, edgecolor='black'))
-            else:
-                # 十字星
-                self.ax_main.plot([x-0.4, x+0.4], [close_price, close_price], color=color, linewidth=2)
-            
-            # 绘制成交量
-            self.ax_volume.bar(x, volume, width=0.8, color=color, alpha=0.6)
+        # 绘制K线和成交量
+        x = np.arange(len(df))
+        opens, highs, lows, closes, volumes = ohlcv_arrays(df)
+        draw_candlesticks(self.ax_main, x, opens, highs, lows, closes,
+                          up_color='red', down_color='green',
+                          up_edge_color='black', down_edge_color='black',
+                          alpha=0.8, edge_width=1.0, doji_threshold=0)
+        draw_volume(self.ax_volume, x, volumes, opens, closes,
+                    up_color='red', down_color='green', alpha=0.6)
         
         # 设置图表样式
         self.ax_main.set_title(f"{self.current_stock} - 实时K线图 (更新间隔: {self.update_interval}秒)", 
@@ -460,6 +535,8 @@ class AdvancedKlineUI:
             self.ax_volume.set_xticklabels([x_labels[i] for i in x_positions], rotation=45)
         
         self.fig.tight_layout()
+        if trace is not None:
+            trace.mark("draw_done")
         
     def update_status(self, message):
         """更新状态"""
@@ -480,8 +557,7 @@ def main():
     try:
         root.mainloop()
     except KeyboardInterrupt:
-        if hasattr(app, 'is_updating'):
-            app.is_updating = False
+        app.stop_updates()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,336 @@
+"""
+基于 asyncio 的数据获取器
+接口与 StockDataFetcher 一一对应（协程版本），请求参数和响应解析复用 StockDataFetcher：
+- 安装了 aiohttp 时所有请求在同一个事件循环中并发，上千个在途请求只是上千个协程
+- aiohttp 是必需依赖；未安装时（例如离线基准）退回在线程池中执行 requests 并告警，
+  此时并发受线程池大小限制
+- 腾讯接口失败时的 AkShare 备用方案本身是阻塞调用，在线程池中执行
+配置了 QUOTE_GATEWAY 时基本信息和历史K线经本地网关获取
+TkAsyncioPump 在 Tk 主循环中驱动 asyncio 事件循环，协程完成后的回调直接在主线程执行
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from functools import partial
+from typing import Callable, Coroutine, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import aiohttp
+except ImportError:  # 未安装时使用线程池 + requests，首次请求时告警
+    aiohttp = None
+
+from config import QUOTE_GATEWAY, REQUEST_TIMEOUT
+from data_fetcher import StockDataFetcher, TENCENT_BATCH_SIZE, success_log
+from profiling import profiled
+
+# 同时在途的请求数上限
+MAX_IN_FLIGHT = 200
+
+
+def _decode(body: bytes, charset: Optional[str]) -> str:
+    """响应头未声明编码时先按 UTF-8，失败再按 GBK（腾讯行情接口）"""
+    if charset:
+        return body.decode(charset, errors="replace")
+    try:
+        return body.decode("utf-8")
+    except UnicodeDecodeError:
+        return body.decode("gbk", errors="replace")
+
+
+class AsyncStockDataFetcher:
+    """
+    协程版数据获取器，须在同一个事件循环中使用
+
+    日志、指标和 AkShare 备用方案由内部的 StockDataFetcher 提供；
+    使用完毕后 await close()（或 async with）关闭 HTTP 会话
+    """
+
+    def __init__(self, proxy_host: str = None, proxy_port: int = None, metrics=None,
+                 max_in_flight: int = MAX_IN_FLIGHT, gateway: str = QUOTE_GATEWAY):
+        self.sync = StockDataFetcher(proxy_host=proxy_host, proxy_port=proxy_port, metrics=metrics)
+        self.gateway = gateway.rstrip("/")
+        self.metrics = self.sync.metrics
+        self.logger = self.sync.logger
+        self.max_in_flight = max_in_flight
+        self._session = None
+        self._semaphore = None
+        self._semaphore_loop = None
+        self._warned = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    # ---- 请求 ----
+
+    async def _get(self, endpoint: str, url: str, params: Optional[Dict] = None) -> Tuple[int, str]:
+        """发起GET请求并记录延迟与字节数，返回 (状态码, 文本)"""
+        # 信号量绑定事件循环，换了循环（例如多次 asyncio.run）时重建
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._semaphore_loop = loop
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                if aiohttp is not None:
+                    if self._session is None:
+                        self._session = aiohttp.ClientSession(
+                            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+                    async with self._session.get(url, params=params) as response:
+                        body = await response.read()
+                        status = response.status
+                        text = _decode(body, response.charset)
+                else:
+                    if not self._warned:
+                        self._warned = True
+                        self.logger.warning("未安装 aiohttp，异步请求退回线程池执行，并发受线程数限制"
+                                            "（pip install -r requirements.txt）")
+                    response = await asyncio.get_running_loop().run_in_executor(
+                        None, partial(self.sync.session.get, url, params=params, timeout=REQUEST_TIMEOUT))
+                    body, status, text = response.content or b"", response.status_code, response.text
+            except Exception:
+                self.metrics.record_request(endpoint, time.perf_counter() - start, ok=False)
+                raise
+            self.metrics.record_request(endpoint, time.perf_counter() - start,
+                                        nbytes=len(body), ok=status == 200)
+            return status, text
+
+    async def _in_thread(self, func: Callable, *args):
+        """阻塞调用（AkShare 备用方案）放到线程池"""
+        return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args))
+
+    # ---- 接口 ----
+
+    async def _get_tencent_data(self, stock_code: str, trace=None) -> Optional[Dict]:
+        """从腾讯API获取实时数据"""
+        try:
+            symbol = StockDataFetcher._tencent_symbol(stock_code)
+            status, text = await self._get("tencent.quote", f"{self.sync.quote_url}{symbol}")
+            if trace is not None:
+                trace.mark("response_received")
+            if status == 200:
+                with profiled("parse.tencent_quote"):
+                    result = StockDataFetcher._parse_tencent_quote(text, symbol, stock_code)
+                if trace is not None:
+                    trace.mark("parse_done")
+                return result
+        except Exception as e:
+            self.logger.warning("腾讯API获取失败: %s", str(e)[:80], extra={"symbol": stock_code})
+        return None
+
+    async def get_tencent_batch(self, stock_codes: List[str]) -> Dict[str, Dict]:
+        """多只股票合并请求腾讯实时行情，各批次并发"""
+        async def fetch_chunk(chunk):
+            symbols = {StockDataFetcher._tencent_symbol(code): code for code in chunk}
+            results = {}
+            try:
+                status, text = await self._get("tencent.quote_batch", f"{self.sync.quote_url}{','.join(symbols)}")
+                if status != 200:
+                    return results
+                with profiled("parse.tencent_quote_batch"):
+                    for line in text.split(';'):
+                        line = line.strip()
+                        if not line.startswith('v_'):
+                            continue
+                        symbol = line[2:line.find('=')]
+                        if symbol in symbols:
+                            quote = StockDataFetcher._parse_tencent_quote(line, symbol, symbols[symbol])
+                            if quote:
+                                results[symbols[symbol]] = quote
+            except Exception as e:
+                self.logger.warning("腾讯API批量获取失败: %s", str(e)[:80], extra={"symbols": len(chunk)})
+            return results
+
+        merged = {}
+        chunks = [stock_codes[i:i + TENCENT_BATCH_SIZE] for i in range(0, len(stock_codes), TENCENT_BATCH_SIZE)]
+        for results in await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)):
+            merged.update(results)
+        return merged
+
+    async def _gateway_api(self, endpoint: str, path: str, **params):
+        status, text = await self._get(f"gateway.{endpoint}", f"{self.gateway}{path}", params=params)
+        if status != 200:
+            raise ConnectionError(f"HTTP {status}")
+        return json.loads(text)
+
+    async def get_stock_info(self, stock_code: str) -> Optional[Dict]:
+        """获取股票基本信息"""
+        if self.gateway:
+            try:
+                return await self._gateway_api("info", "/api/info", code=stock_code)
+            except Exception as e:
+                self.logger.warning("网关基本信息获取失败: %s", str(e)[:80], extra={"symbol": stock_code})
+                return None
+
+        tencent_data = await self._get_tencent_data(stock_code)
+        if tencent_data:
+            success_log.record("基本信息", stock_code)
+            return tencent_data
+
+        result = await self._in_thread(self.sync._akshare_stock_info, stock_code)
+        if result:
+            return result
+        self.logger.error("获取股票 %s 信息失败", stock_code, extra={"symbol": stock_code})
+        return None
+
+    async def get_realtime_price(self, stock_code: str, trace=None) -> Optional[Dict]:
+        """获取股票实时价格"""
+        tencent_data = await self._get_tencent_data(stock_code, trace)
+        if tencent_data:
+            tencent_data['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            success_log.record("实时价格", stock_code)
+            return tencent_data
+
+        result = await self._in_thread(self.sync._akshare_realtime_price, stock_code, trace)
+        if result:
+            return result
+        self.logger.error("获取股票 %s 实时价格失败", stock_code, extra={"symbol": stock_code})
+        return None
+
+    async def get_historical_data(self, stock_code: str, period: str = "daily",
+                                  start_date: str = None, end_date: str = None,
+                                  count: int = 320) -> Optional[pd.DataFrame]:
+        """获取股票历史数据（返回 end_date 及之前最多 count 根K线）"""
+        if self.gateway:
+            from quote_gateway import history_frame
+            try:
+                return history_frame(await self._gateway_api("history", "/api/history", code=stock_code,
+                                                             count=count, end=end_date or ""))
+            except Exception as e:
+                self.logger.warning("网关历史数据获取失败: %s", str(e)[:80], extra={"symbol": stock_code})
+                return None
+
+        try:
+            symbol, url, params = StockDataFetcher._kline_request(stock_code, start_date, end_date, count)
+            status, text = await self._get("tencent.kline", url, params=params)
+            if status == 200:
+                with profiled("parse.kline_json"):
+                    df = StockDataFetcher._parse_kline_json(json.loads(text), symbol, stock_code, limit=count)
+                if df is not None:
+                    success_log.record("历史数据", stock_code)
+                    return df
+        except Exception as e:
+            self.logger.warning("腾讯API历史数据获取失败: %s", str(e)[:80], extra={"symbol": stock_code})
+
+        df = await self._in_thread(self.sync._akshare_historical_data, stock_code, period, start_date, end_date)
+        if df is not None:
+            return df
+        self.logger.error("获取股票 %s 历史数据失败", stock_code, extra={"symbol": stock_code})
+        return None
+
+    async def get_multiple_stocks_realtime(self, stock_codes: List[str]) -> Dict[str, Dict]:
+        """批量获取实时价格：先合并请求腾讯API，缺失的股票再并发走单只接口"""
+        results = {}
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for code, quote in (await self.get_tencent_batch(stock_codes)).items():
+            quote['timestamp'] = timestamp
+            success_log.record("实时价格", code)
+            results[code] = quote
+
+        missing = [code for code in stock_codes if code not in results]
+        for code, price_data in zip(missing, await asyncio.gather(*(self.get_realtime_price(c) for c in missing))):
+            if price_data:
+                results[code] = price_data
+        # 保持输入顺序
+        return {code: results[code] for code in stock_codes if code in results}
+
+    async def get_multiple_stocks_historical(self, stock_codes: List[str], **kwargs) -> Dict[str, pd.DataFrame]:
+        """并发获取多只股票历史数据"""
+        frames = await asyncio.gather(*(self.get_historical_data(code, **kwargs) for code in stock_codes))
+        return {code: df for code, df in zip(stock_codes, frames) if df is not None}
+
+
+class TkAsyncioPump:
+    """
+    在 Tk 主循环中驱动 asyncio 事件循环：每次 after 回调处理一轮已就绪的事件，不阻塞界面
+
+    协程在主线程执行，完成回调可以直接操作 Tk 控件；有任务时按 busy_ms 轮转，空闲时放慢到 idle_ms
+    """
+
+    def __init__(self, root, busy_ms: int = 10, idle_ms: int = 100):
+        self.root = root
+        self.busy_ms = busy_ms
+        self.idle_ms = idle_ms
+        self.loop = asyncio.new_event_loop()
+        self._tasks = set()
+        self._after_id = None
+        self._running = False
+        self.start()
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._after_id = self.root.after(self.idle_ms, self._tick)
+
+    def stop(self):
+        """取消所有任务并关闭事件循环"""
+        self._running = False
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            self.loop.run_until_complete(asyncio.gather(*self._tasks, return_exceptions=True))
+        self.loop.close()
+
+    def _tick(self):
+        if not self._running:
+            return
+        # stop() 排在已就绪回调之后：run_forever 只处理一轮事件（网络就绪检查不等待）
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+        try:
+            self._after_id = self.root.after(self.busy_ms if self._tasks else self.idle_ms, self._tick)
+        except Exception:
+            # 窗口已销毁
+            self._running = False
+
+    def submit(self, coro: Coroutine, on_done: Optional[Callable] = None,
+               on_error: Optional[Callable[[BaseException], None]] = None) -> asyncio.Task:
+        """在事件循环中执行协程（主线程调用），完成后在主线程调用 on_done(结果)，取消时不回调"""
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+
+        def done(t: asyncio.Task):
+            self._tasks.discard(t)
+            if t.cancelled():
+                return
+            error = t.exception()
+            if error is not None:
+                if on_error is not None:
+                    on_error(error)
+                else:
+                    print(f"异步任务出错: {error}")
+            elif on_done is not None:
+                on_done(t.result())
+
+        task.add_done_callback(done)
+        return task
+
+
+_pump = None
+
+
+def get_pump(root) -> TkAsyncioPump:
+    """进程内共用的事件循环驱动器（绑定到第一个调用者的 Tk 主循环）"""
+    global _pump
+    if _pump is None or not _pump._running:
+        _pump = TkAsyncioPump(root)
+    return _pump
@@ -0,0 +1,167 @@
+"""
+批量生成K线图（无界面）
+按股票分发到进程池，每个子进程独立获取数据并用 Agg 后端出图，最后生成 index.html 汇总页
+用法: python main.py --mode render --codes 601127 002594 --format png --workers 8
+"""
+
+import html
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import DATA_DIR
+
+CHART_DIR = os.path.join(DATA_DIR, "charts")
+CHART_FORMATS = ("png", "svg")
+DEFAULT_BARS = 120
+
+# 子进程内复用的数据获取器和本地存储
+_fetcher = None
+_store = None
+
+
+def _init_worker(proxy_host: Optional[str], proxy_port: Optional[int]):
+    """子进程初始化：只使用 Agg，不加载任何 Tk 相关模块"""
+    global _fetcher, _store
+    import matplotlib
+    matplotlib.use("Agg")
+    from font_utils import setup_cjk_font
+    setup_cjk_font()
+
+    from data_fetcher import StockDataFetcher
+    from local_store import LocalBarStore
+    _fetcher = StockDataFetcher(proxy_host=proxy_host, proxy_port=proxy_port)
+    _store = LocalBarStore()
+
+
+def render_symbol(stock_code: str, out_dir: str, fmt: str = "png", bars: int = DEFAULT_BARS,
+                  dpi: int = 100) -> Dict:
+    """获取单只股票K线并出图（在子进程中执行），网络失败时使用本地存储"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from kline_renderer import draw_kline_figure
+
+    started = time.perf_counter()
+    result = {"code": stock_code, "file": None, "error": None}
+    try:
+        # 采集进程写入的本地K线足够新时不请求网络
+        df = _store.load_recent(stock_code, limit=bars, metrics=_fetcher.metrics)
+        if df is None:
+            df = _fetcher.get_historical_data(stock_code, count=max(bars, 1))
+            if df is not None and not df.empty:
+                _store.merge(stock_code, df)
+            else:
+                df = _store.load(stock_code, limit=bars)
+        if df is None or df.empty:
+            raise ValueError("无K线数据")
+
+        df = df.tail(bars).reset_index(drop=True)
+        last = df.iloc[-1]
+        title = f"{stock_code}  {str(last['日期'])[:10]}  收盘 {float(last['收盘']):.2f}"
+
+        fig = Figure(figsize=(10, 6), dpi=dpi, facecolor='white')
+        FigureCanvasAgg(fig)
+        draw_kline_figure(fig, df, title=title)
+        filename = f"{stock_code}.{fmt}"
+        fig.savefig(os.path.join(out_dir, filename), format=fmt)
+
+        first_close = float(df.iloc[0]['收盘'])
+        result.update({
+            "file": filename,
+            "date": str(last['日期'])[:10],
+            "close": float(last['收盘']),
+            "period_change": (float(last['收盘']) / first_close - 1) * 100 if first_close else 0.0,
+            "bars": len(df),
+        })
+    except Exception as e:
+        result["error"] = str(e)[:200]
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def render_watchlist(stock_codes: List[str], out_dir: Optional[str] = None, fmt: str = "png",
+                     bars: int = DEFAULT_BARS, workers: Optional[int] = None,
+                     proxy_host: Optional[str] = None, proxy_port: Optional[int] = None,
+                     progress=None) -> Dict:
+    """
+    并行渲染整个自选股列表
+
+    Args:
+        out_dir: 输出目录，默认 data/charts/<日期时间>
+        workers: 进程数，默认 CPU 核数
+        progress: 每完成一只调用 progress(已完成数, 总数, 结果)
+
+    Returns:
+        {'out_dir', 'index', 'results', 'seconds'}
+    """
+    if fmt not in CHART_FORMATS:
+        raise ValueError(f"不支持的图片格式: {fmt}，可选: {', '.join(CHART_FORMATS)}")
+
+    out_dir = out_dir or os.path.join(CHART_DIR, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(out_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(proxy_host, proxy_port)) as pool:
+        futures = [pool.submit(render_symbol, code, out_dir, fmt, bars) for code in stock_codes]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            if progress is not None:
+                progress(done, len(futures), result)
+
+    # 汇总页按输入顺序排列
+    order = {code: i for i, code in enumerate(stock_codes)}
+    results.sort(key=lambda r: order.get(r["code"], len(order)))
+    index_path = write_index(results, out_dir)
+    return {"out_dir": out_dir, "index": index_path, "results": results,
+            "seconds": time.perf_counter() - started}
+
+
+def write_index(results: List[Dict], out_dir: str) -> str:
+    """生成汇总页：每只股票一张缩略图，失败的股票列出原因"""
+    cards = []
+    for r in results:
+        code = html.escape(r["code"])
+        if r.get("file"):
+            color = "#d00" if r["period_change"] >= 0 else "#080"
+            cards.append(
+                f'<figure><a href="{html.escape(r["file"])}"><img src="{html.escape(r["file"])}" '
+                f'alt="{code}" loading="lazy"></a>'
+                f'<figcaption><b>{code}</b> {html.escape(r["date"])} 收盘 {r["close"]:.2f} '
+                f'<span style="color:{color}">{r["period_change"]:+.2f}%</span>（{r["bars"]} 根）</figcaption></figure>'
+            )
+        else:
+            cards.append(f'<figure class="error"><figcaption><b>{code}</b> 失败: '
+                         f'{html.escape(r.get("error") or "")}</figcaption></figure>')
+
+    ok = sum(1 for r in results if r.get("file"))
+    page = f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<title>K线图汇总 {datetime.now().strftime('%Y-%m-%d %H:%M')}</title>
+<style>
+body {{ font-family: sans-serif; margin: 16px; }}
+.grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(420px, 1fr)); gap: 12px; }}
+figure {{ margin: 0; border: 1px solid #ddd; padding: 6px; }}
+figure img {{ width: 100%; }}
+figure.error {{ color: #900; }}
+</style>
+</head>
+<body>
+<h1>K线图汇总</h1>
+<p>生成时间 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}，成功 {ok}/{len(results)}</p>
+<div class="grid">
+{chr(10).join(cards)}
+</div>
+</body>
+</html>
+"""
+    path = os.path.join(out_dir, "index.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(page)
+    return path
@@ -0,0 +1,423 @@
+"""
+性能基准测试
+离线回放 benchmarks/fixtures 下录制的腾讯接口响应，覆盖 抓取 / 解析 / 存储 / 绘图 热点路径
+
+用法:
+    python benchmark.py                         # 运行全部基准，结果写入 benchmarks/results/<label>.json
+    python benchmark.py --label v1.2.0          # 指定结果标签（建议使用发布版本号）
+    python benchmark.py --compare               # 与仓库内的参考结果 benchmarks/results/baseline.json 对比
+    python benchmark.py --compare v1.1.0        # 与历史结果对比，超过阈值即判定为回归
+    python benchmark.py --only parse render     # 只运行名称包含关键字的基准
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import matplotlib
+matplotlib.use("Agg")  # 无界面后端，必须在导入任何 UI 模块之前设置
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from data_fetcher import StockDataFetcher
+from viewport import ViewportManager
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+RESULT_DIR = os.path.join(BENCH_DIR, "results")
+# 随仓库提交的参考结果标签，发布前用 --label baseline 重新生成
+BASELINE_LABEL = "baseline"
+
+FIXTURE_SYMBOL = "sh601127"
+
+
+class RecordedResponse:
+    """录制响应（模拟 requests.Response 的常用属性）"""
+
+    def __init__(self, text: str, status_code: int = 200):
+        self.text = text
+        self.status_code = status_code
+        self.content = text.encode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class RecordedSession:
+    """离线会话：按URL返回录制的腾讯接口响应，任意股票代码复用同一份样本"""
+
+    def __init__(self):
+        with open(os.path.join(FIXTURE_DIR, f"tencent_quote_{FIXTURE_SYMBOL}.txt"), encoding="utf-8") as f:
+            self.quote_text = f.read()
+        with open(os.path.join(FIXTURE_DIR, f"kline_{FIXTURE_SYMBOL}.json"), encoding="utf-8") as f:
+            self.kline_text = f.read()
+
+    def get(self, url, params=None, timeout=None):
+        if "qt.gtimg.cn" in url:
+            symbols = url.split("q=", 1)[1].split(",")
+            text = "".join(self.quote_text.replace(FIXTURE_SYMBOL, s) for s in symbols)
+            return RecordedResponse(text)
+        if "fqkline" in url:
+            symbol = params['param'].split(",", 1)[0]
+            return RecordedResponse(self.kline_text.replace(FIXTURE_SYMBOL, symbol))
+        return RecordedResponse("", status_code=404)
+
+
+class _Var:
+    """替代 tk.StringVar，仅用于无界面绘图基准"""
+
+    def __init__(self, value: str = "--"):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+def make_fetcher() -> StockDataFetcher:
+    """创建使用录制响应的数据获取器"""
+    fetcher = StockDataFetcher()
+    fetcher.session = RecordedSession()
+    return fetcher
+
+
+def load_fixture_kline() -> pd.DataFrame:
+    """加载录制的K线数据"""
+    return make_fetcher().get_historical_data(FIXTURE_SYMBOL[2:])
+
+
+def make_real_kline_ui(df: pd.DataFrame):
+    """无界面构造 RealKlineUI（跳过 Tk 组件创建）"""
+    from real_kline_ui import RealKlineUI
+
+    ui = RealKlineUI.__new__(RealKlineUI)
+    ui.current_stock = FIXTURE_SYMBOL[2:]
+    ui.current_data = df
+    ui._lod_cache = None
+    ui._chart_dates = None
+    ui._bar_artists = []
+    ui.info_labels = {"name": _Var("赛力斯")}
+    ui.status_var = _Var()
+    ui.fig = Figure(figsize=(10, 8), dpi=100)
+    ui.ax_kline = ui.fig.add_subplot(2, 1, 1)
+    ui.ax_volume = ui.fig.add_subplot(2, 1, 2)
+    ui.canvas = FigureCanvasAgg(ui.fig)
+    ui.viewport = ViewportManager(ui.canvas, (ui.ax_kline, ui.ax_volume), ui.redraw_viewport)
+    ui.viewport.reset(len(df))
+    return ui
+
+
+def make_advanced_kline_ui(df: pd.DataFrame):
+    """无界面构造 AdvancedKlineUI"""
+    from advanced_kline_ui import AdvancedKlineUI
+
+    ui = AdvancedKlineUI.__new__(AdvancedKlineUI)
+    ui.current_stock = FIXTURE_SYMBOL[2:]
+    ui.update_interval = 5
+    ui.kline_data = df.tail(30)
+    ui.fig = Figure(figsize=(12, 8), dpi=100)
+    ui.ax_main = ui.fig.add_subplot(3, 1, (1, 2))
+    ui.ax_volume = ui.fig.add_subplot(3, 1, 3)
+    ui.canvas = FigureCanvasAgg(ui.fig)
+    return ui
+
+
+def make_realtime_kline_ui(df: pd.DataFrame):
+    """无界面构造 RealtimeKlineUI，并附带 100 个实时价格点"""
+    from realtime_kline_ui import RealtimeKlineUI
+
+    ui = RealtimeKlineUI.__new__(RealtimeKlineUI)
+    ui.current_stock = FIXTURE_SYMBOL[2:]
+    ui.kline_data = df.tail(50)
+    last_date = pd.to_datetime(ui.kline_data.iloc[-1]['日期'])
+    last_close = float(ui.kline_data.iloc[-1]['收盘'])
+    ui.price_timestamps = [last_date + pd.Timedelta(minutes=i) for i in range(100)]
+    ui.realtime_prices = [last_close * (1 + 0.001 * (i % 7 - 3)) for i in range(100)]
+    ui.status_var = _Var()
+    ui.fig = Figure(figsize=(10, 8), dpi=100)
+    ui.ax1 = ui.fig.add_subplot(2, 1, 1)
+    ui.ax2 = ui.fig.add_subplot(2, 1, 2)
+    ui.canvas = FigureCanvasAgg(ui.fig)
+    ui.init_chart_cache()
+    return ui
+
+
+def make_grid_monitor_ui(df: pd.DataFrame, count: int = 64):
+    """无界面构造 GridMonitorUI，count 个面板共用录制的K线"""
+    from grid_monitor_ui import GridMonitorUI
+
+    ui = GridMonitorUI.__new__(GridMonitorUI)
+    ui.panels = {}
+    ui._dirty_panels = set()
+    ui._rounds = 0
+    ui.status_var = _Var()
+    ui.scheduler = _ImmediateScheduler()
+    ui.fig = Figure(figsize=(14, 8), dpi=100)
+    ui.canvas = FigureCanvasAgg(ui.fig)
+    ui.canvas.mpl_connect('draw_event', ui.on_draw)
+    ui.stock_codes = [f"{600000 + i}" for i in range(count)]
+    ui.build_panels(ui.stock_codes)
+    for panel in ui.panels.values():
+        panel.set_history(df)
+    ui.redraw_all()
+    return ui
+
+
+class _ImmediateScheduler:
+    """替代 RenderScheduler：标记即执行，用于无界面基准"""
+
+    def mark_dirty(self, key, callback, *args):
+        callback(*args)
+
+    def cancel(self, key):
+        pass
+
+
+def make_long_history(n: int = 1200) -> pd.DataFrame:
+    """将录制的K线首尾拼接成 n 根，用于大数据量绘制基准"""
+    df = load_fixture_kline()
+    repeats = int(np.ceil(n / len(df)))
+    return pd.concat([df] * repeats, ignore_index=True).head(n)
+
+
+def render_long_history(df: pd.DataFrame, fig: Figure, canvas=None):
+    """用批量渲染器绘制长历史K线，可选光栅化"""
+    from kline_renderer import ohlcv_arrays, draw_candlesticks, draw_volume
+
+    ax_kline, ax_volume = fig.axes
+    ax_kline.clear()
+    ax_volume.clear()
+    x = np.arange(len(df))
+    opens, highs, lows, closes, volumes = ohlcv_arrays(df)
+    draw_candlesticks(ax_kline, x, opens, highs, lows, closes)
+    draw_volume(ax_volume, x, volumes, opens, closes)
+    if canvas is not None:
+        canvas.draw()
+
+
+def build_benchmarks() -> Dict[str, Callable[[], object]]:
+    """构造全部基准用例，返回 名称 -> 无参可调用对象"""
+    fetcher = make_fetcher()
+    session = fetcher.session
+    quote_text = session.quote_text
+    kline_json = json.loads(session.kline_text)
+    kline_df = load_fixture_kline()
+    batch_codes = [f"{600000 + i}" for i in range(100)]
+
+    store_dir = tempfile.mkdtemp(prefix="stock_bench_")
+    data_fetcher.DATA_DIR = store_dir
+    realtime_df = pd.DataFrame(list(fetcher.get_multiple_stocks_realtime(batch_codes).values()))
+
+    # 协程版获取器共用录制的会话（未安装 aiohttp 时走线程池）
+    from async_fetcher import AsyncStockDataFetcher
+    async_fetcher = AsyncStockDataFetcher()
+    async_fetcher.sync = fetcher
+
+    real_ui = make_real_kline_ui(kline_df)
+    advanced_ui = make_advanced_kline_ui(kline_df)
+    realtime_ui = make_realtime_kline_ui(kline_df)
+
+    long_df = make_long_history(1200)
+    long_fig = Figure(figsize=(10, 8), dpi=100)
+    long_fig.add_subplot(2, 1, 1)
+    long_fig.add_subplot(2, 1, 2)
+    long_canvas = FigureCanvasAgg(long_fig)
+
+    # 64 面板监控墙：每轮 8 只股票价格变化
+    grid_ui = make_grid_monitor_ui(kline_df, 64)
+    grid_quote = StockDataFetcher._parse_tencent_quote(quote_text, FIXTURE_SYMBOL, FIXTURE_SYMBOL[2:])
+    grid_ticks = iter(range(10 ** 9))
+
+    def grid_tick():
+        tick = next(grid_ticks)
+        last_close = float(kline_df.iloc[-1]['收盘'])
+        quotes = {}
+        for code in grid_ui.stock_codes[(tick % 8) * 8:(tick % 8) * 8 + 8]:
+            quotes[code] = dict(grid_quote, code=code, quote_time='',
+                                price=round(last_close * (1 + 0.001 * (tick % 5 - 2)), 2), volume=tick)
+        grid_ui.apply_quotes(quotes)
+
+    # 价格流水：一帧内突发 1000 笔，按条件筛选后格式化可见的 20 行
+    from price_stream import PriceRingBuffer
+    stream = PriceRingBuffer(2000)
+    burst = [(None, 10 + i * 0.01, (i % 9 - 4) * 0.3, i, batch_codes[i % 100]) for i in range(1000)]
+
+    def stream_burst():
+        stream.extend(burst)
+        matches = stream.select(direction="上涨", min_change=0.5)
+        return [stream.format_row(i, True) for i in matches[:20]]
+
+    # 约10年日线，走 RealKlineUI 的 LOD 降采样路径
+    decade_ui = make_real_kline_ui(make_long_history(2500))
+    # 在10年数据上放大到最近120根后反复平移
+    pan_ui = make_real_kline_ui(make_long_history(2500))
+    pan_ui.draw_real_chart()
+    pan_ui.viewport.zoom(120 / 2500, 2500)
+    pan_steps = iter(np.tile(np.r_[np.full(20, -3.0), np.full(20, 3.0)], 10 ** 6))
+
+    return {
+        "parse.tencent_quote": lambda: StockDataFetcher._parse_tencent_quote(
+            quote_text, FIXTURE_SYMBOL, FIXTURE_SYMBOL[2:]),
+        "parse.kline_json_to_dataframe": lambda: StockDataFetcher._parse_kline_json(
+            kline_json, FIXTURE_SYMBOL, FIXTURE_SYMBOL[2:]),
+        "fetch.get_historical_data": lambda: fetcher.get_historical_data(FIXTURE_SYMBOL[2:]),
+        "fetch.batch_realtime_100": lambda: fetcher.get_multiple_stocks_realtime(batch_codes),
+        "fetch.batch_historical_20": lambda: fetcher.get_multiple_stocks_historical(batch_codes[:20]),
+        "fetch.async_batch_historical_20": lambda: asyncio.run(
+            async_fetcher.get_multiple_stocks_historical(batch_codes[:20])),
+        "store.save_to_csv_historical": lambda: fetcher.save_to_csv(kline_df, "bench_historical.csv"),
+        "store.save_to_csv_realtime_100": lambda: fetcher.save_to_csv(realtime_df, "bench_realtime.csv"),
+        "render.real_kline_ui.draw_real_chart": real_ui.draw_real_chart,
+        "render.advanced_kline_ui.draw_kline_chart": lambda: (
+            advanced_ui.draw_kline_chart(), advanced_ui.canvas.draw()),
+        "render.realtime_kline_ui.update_chart_full": lambda: (
+            realtime_ui.invalidate_static_layers(), realtime_ui.update_chart()),
+        "render.realtime_kline_ui.update_chart_tick": lambda: (
+            realtime_ui.realtime_prices.append(realtime_ui.realtime_prices[-1] * 1.0001),
+            realtime_ui.realtime_prices.pop(0), realtime_ui.update_chart()),
+        "render.kline_renderer.build_1200_bars": lambda: render_long_history(long_df, long_fig),
+        "render.kline_renderer.draw_1200_bars": lambda: render_long_history(long_df, long_fig, long_canvas),
+        "render.real_kline_ui.draw_2500_bars_lod": decade_ui.draw_real_chart,
+        "render.grid_monitor.redraw_all_64": grid_ui.redraw_all,
+        "render.grid_monitor.tick_64_changed_8": grid_tick,
+        "stream.price_stream.burst_1000": stream_burst,
+        "render.real_kline_ui.pan_viewport_2500": lambda: pan_ui.viewport.pan(next(pan_steps)),
+    }
+
+
+def measure(func: Callable[[], object], repeat: int, warmup: int = 1) -> Dict[str, float]:
+    """多次运行并统计耗时（毫秒）"""
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": round(samples[0], 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.mean(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def environment_info() -> Dict[str, str]:
+    """记录运行环境，便于跨版本对比时排除环境差异"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "matplotlib": matplotlib.__version__,
+        "commit": commit,
+    }
+
+
+def compare_results(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """对比中位数耗时，返回回归项描述列表"""
+    regressions = []
+    print(f"\n{'基准':<45} {'基线(ms)':>10} {'当前(ms)':>10} {'变化':>8}")
+    print("-" * 78)
+    for name, stats in current["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if not base:
+            print(f"{name:<45} {'--':>10} {stats['median_ms']:>10.3f} {'新增':>8}")
+            continue
+        ratio = stats["median_ms"] / base["median_ms"] - 1 if base["median_ms"] else 0.0
+        flag = " ⚠️" if ratio > threshold else ""
+        print(f"{name:<45} {base['median_ms']:>10.3f} {stats['median_ms']:>10.3f} {ratio:>+7.1%}{flag}")
+        if ratio > threshold:
+            regressions.append(f"{name}: {base['median_ms']:.3f}ms -> {stats['median_ms']:.3f}ms ({ratio:+.1%})")
+    return regressions
+
+
+def load_result(label: str) -> Optional[Dict]:
+    """读取已保存的基准结果"""
+    path = os.path.join(RESULT_DIR, f"{label}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    """基准测试入口"""
+    parser = argparse.ArgumentParser(description='股票数据工具性能基准测试')
+    parser.add_argument('--label', default=datetime.now().strftime('%Y%m%d_%H%M%S'),
+                        help='结果标签，建议使用发布版本号')
+    parser.add_argument('--repeat', type=int, default=20, help='每个基准的重复次数')
+    parser.add_argument('--only', nargs='*', help='只运行名称包含这些关键字的基准')
+    parser.add_argument('--compare', nargs='?', const=BASELINE_LABEL,
+                        help=f'与指定标签的历史结果对比，不带标签时使用 {BASELINE_LABEL}')
+    parser.add_argument('--threshold', type=float, default=0.2, help='中位数耗时增幅超过该比例视为回归')
+    parser.add_argument('--no-save', action='store_true', help='不保存本次结果')
+    args = parser.parse_args()
+
+    # 基准只关注计算开销，关闭逐条INFO日志
+    logging.disable(logging.INFO)
+    # 无界面环境通常缺少中文字体，忽略缺字告警
+    warnings.filterwarnings("ignore", message="Glyph .* missing from font")
+
+    benchmarks = build_benchmarks()
+    if args.only:
+        benchmarks = {k: v for k, v in benchmarks.items() if any(key in k for key in args.only)}
+
+    results = {"label": args.label, "timestamp": datetime.now().isoformat(timespec="seconds"),
+               "environment": environment_info(), "benchmarks": {}}
+
+    print(f"{'基准':<45} {'中位数(ms)':>12} {'P95(ms)':>10}")
+    print("-" * 70)
+    for name, func in benchmarks.items():
+        stats = measure(func, args.repeat)
+        results["benchmarks"][name] = stats
+        print(f"{name:<45} {stats['median_ms']:>12.3f} {stats['p95_ms']:>10.3f}")
+
+    if not args.no_save:
+        os.makedirs(RESULT_DIR, exist_ok=True)
+        path = os.path.join(RESULT_DIR, f"{args.label}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存到 {path}")
+
+    if args.compare:
+        baseline = load_result(args.compare)
+        if baseline is None:
+            print(f"❌ 未找到基线结果: {args.compare}")
+            sys.exit(2)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ 检测到 {len(regressions)} 项性能回归:")
+            for item in regressions:
+                print(f"  - {item}")
+            sys.exit(1)
+        print("\n✅ 未检测到性能回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+后台K线采集（main.py --daemon）
+按交易时段持续把关注列表（或全市场）的日K线写入本地存储 LocalBarStore：
+- 盘中每 interval 秒刷新一次当日K线，收盘后再补一次最终K线，夜间和休市日等到下一个交易时段
+- 检查点记录每只股票已写入的最后日期和已定稿的交易日，重启后只补缺失部分，已定稿的股票不再请求
+- PID 锁文件保证同一数据目录只有一个采集进程；收到 SIGINT/SIGTERM 时写完检查点再退出
+"""
+
+import json
+import logging
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from config import DATA_DIR
+from local_store import CHECKPOINT_FILE, LocalBarStore
+from trading_calendar import SESSIONS, get_calendar
+
+logger = logging.getLogger(__name__)
+
+PID_FILE = os.path.join(DATA_DIR, "collector.pid")
+UNIVERSE_FILE = os.path.join(DATA_DIR, "universe.json")
+# 盘中刷新间隔（秒）
+DEFAULT_INTERVAL = 60
+DEFAULT_WORKERS = 4
+# 首次采集的K线根数
+HISTORY_BARS = 320
+# 每处理这么多只股票写一次检查点
+CHECKPOINT_EVERY = 50
+
+
+class PidLock:
+    """PID 锁文件：已有存活进程持有时 acquire() 返回 False，进程已退出的残留文件自动清理"""
+
+    def __init__(self, path: str = PID_FILE):
+        self.path = path
+        self.held = False
+
+    def acquire(self) -> bool:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self.owner_alive():
+                    return False
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(str(os.getpid()))
+            self.held = True
+            return True
+        return False
+
+    def owner(self) -> Optional[int]:
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def owner_alive(self) -> bool:
+        pid = self.owner()
+        if pid is None:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def release(self):
+        if self.held and self.owner() == os.getpid():
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        self.held = False
+
+
+def load_universe(refresh: bool = False) -> List[str]:
+    """全市场A股代码（AkShare，缓存到 data/universe.json），获取失败时使用缓存"""
+    if not refresh:
+        try:
+            with open(UNIVERSE_FILE, encoding="utf-8") as f:
+                raw = json.load(f)
+            if raw.get("date") == date.today().isoformat():
+                return raw["codes"]
+        except (OSError, ValueError, KeyError):
+            pass
+    try:
+        import akshare
+        codes = sorted(str(code).zfill(6) for code in akshare.stock_info_a_code_name()["code"])
+        os.makedirs(os.path.dirname(UNIVERSE_FILE), exist_ok=True)
+        with open(UNIVERSE_FILE, "w", encoding="utf-8") as f:
+            json.dump({"date": date.today().isoformat(), "codes": codes}, f)
+        return codes
+    except Exception as e:
+        logger.warning("全市场代码获取失败: %s", str(e)[:80])
+    try:
+        with open(UNIVERSE_FILE, encoding="utf-8") as f:
+            return json.load(f)["codes"]
+    except (OSError, ValueError, KeyError):
+        return []
+
+
+class Collector:
+    """
+    K线采集循环，run() 阻塞到 stop() 或收到退出信号
+
+    检查点格式: {"codes": {代码: {"last_date": 最后K线日期, "final": 已定稿的交易日, "updated": 写入时间}}}
+    """
+
+    def __init__(self, codes: List[str], interval: float = DEFAULT_INTERVAL, store: LocalBarStore = None,
+                 fetcher=None, calendar=None, checkpoint_file: str = CHECKPOINT_FILE,
+                 workers: int = DEFAULT_WORKERS):
+        self.codes = list(dict.fromkeys(codes))
+        self.interval = interval
+        self.store = store or LocalBarStore()
+        if fetcher is None:
+            from data_fetcher import StockDataFetcher
+            fetcher = StockDataFetcher()
+        self.fetcher = fetcher
+        self.calendar = calendar or get_calendar()
+        self.checkpoint_file = checkpoint_file
+        self.workers = workers
+        self.state: Dict[str, Dict] = self._read_checkpoint()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.cycles = 0
+
+    # ---- 检查点 ----
+
+    def _read_checkpoint(self) -> Dict[str, Dict]:
+        try:
+            with open(self.checkpoint_file, encoding="utf-8") as f:
+                return json.load(f).get("codes", {})
+        except (OSError, ValueError):
+            return {}
+
+    def save_checkpoint(self):
+        """原子写入检查点（先写临时文件再替换），中途被杀也不会留下损坏的文件"""
+        with self._lock:
+            payload = json.dumps({"saved": datetime.now().isoformat(timespec="seconds"),
+                                  "codes": self.state}, ensure_ascii=False)
+        os.makedirs(os.path.dirname(self.checkpoint_file) or ".", exist_ok=True)
+        tmp = f"{self.checkpoint_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp, self.checkpoint_file)
+
+    # ---- 采集 ----
+
+    def intraday(self, now: datetime) -> bool:
+        """交易日开盘到收盘之间（含午休），当日K线还会变化"""
+        phase = self.calendar.phase(now)
+        if phase in ("auction", "continuous"):
+            return True
+        return phase == "break" and SESSIONS[0][0] <= now.time() < SESSIONS[-1][1]
+
+    def pending(self, now: datetime) -> List[str]:
+        """本轮需要请求的股票：盘中全部刷新，收盘后跳过已定稿到最近收盘日的股票"""
+        if self.intraday(now):
+            return list(self.codes)
+        closed_day = self.calendar.last_close(now).date().isoformat()
+        return [code for code in self.codes if self.state.get(code, {}).get("final") != closed_day]
+
+    def bars_needed(self, code: str, today: date) -> int:
+        """按检查点估算需要的K线根数：首次取完整历史，之后只补缺失的交易日"""
+        last = self.state.get(code, {}).get("last_date")
+        if not last:
+            return HISTORY_BARS
+        gap = (today - date.fromisoformat(last)).days
+        return min(HISTORY_BARS, max(2, gap + 2))
+
+    def collect_one(self, code: str, now: datetime) -> bool:
+        df = self.fetcher.get_historical_data(code, count=self.bars_needed(code, now.date()))
+        if df is None or df.empty:
+            return False
+        self.store.merge(code, df)
+        last_date = str(df['日期'].iloc[-1])[:10]
+        entry = {"last_date": last_date, "updated": now.isoformat(timespec="seconds")}
+        if not self.intraday(now):
+            # 收盘后取到的K线不会再变
+            entry["final"] = self.calendar.last_close(now).date().isoformat()
+        with self._lock:
+            self.state[code] = {**self.state.get(code, {}), **entry}
+        return True
+
+    def run_cycle(self) -> Dict[str, int]:
+        """采集一轮，返回 {"requested": 请求数, "ok": 成功数}"""
+        now = datetime.now()
+        codes = self.pending(now)
+        ok = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="collector") as pool:
+            futures = [pool.submit(self._collect_safe, code, now) for code in codes]
+            for i, future in enumerate(futures, 1):
+                if self._stop.is_set():
+                    for rest in futures[i:]:
+                        rest.cancel()
+                    break
+                ok += future.result()
+                if i % CHECKPOINT_EVERY == 0:
+                    self.save_checkpoint()
+        self.save_checkpoint()
+        self.cycles += 1
+        return {"requested": len(codes), "ok": ok}
+
+    def _collect_safe(self, code: str, now: datetime) -> bool:
+        if self._stop.is_set():
+            return False
+        try:
+            return self.collect_one(code, now)
+        except Exception as e:
+            logger.warning("采集失败: %s", str(e)[:80], extra={"symbol": code})
+            return False
+
+    def next_delay(self) -> float:
+        """距下一轮的秒数：盘中按 interval，收盘后补一次，非交易时段等到下一个交易时段"""
+        return self.calendar.poll_delay(self.interval)
+
+    def run(self):
+        """采集循环；检查点在每轮结束和退出时写入"""
+        while not self._stop.is_set():
+            result = self.run_cycle()
+            delay = self.next_delay()
+            logger.info("采集第 %d 轮: 成功 %d/%d，%.0f 秒后下一轮",
+                        self.cycles, result["ok"], result["requested"], delay)
+            self._stop.wait(delay)
+
+    def stop(self, *_):
+        self._stop.set()
+
+    def install_signal_handlers(self):
+        """SIGINT/SIGTERM 时结束当前请求后退出（只能在主线程调用）"""
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.stop)
+
+
+def run_daemon(codes: List[str], interval: float = DEFAULT_INTERVAL, workers: int = DEFAULT_WORKERS,
+               pid_file: str = PID_FILE) -> int:
+    """main.py --daemon 的入口，返回退出码"""
+    lock = PidLock(pid_file)
+    if not lock.acquire():
+        print(f"❌ 采集进程已在运行 (PID {lock.owner()})，锁文件: {pid_file}")
+        return 1
+    try:
+        collector = Collector(codes, interval=interval, workers=workers)
+        collector.install_signal_handlers()
+        print(f"🛰  采集进程已启动 (PID {os.getpid()}): {len(collector.codes)} 只股票，盘中每 {interval:g} 秒")
+        collector.run()
+        print("采集进程已退出，检查点已保存")
+        return 0
+    finally:
+        lock.release()
@@ -16,6 +16,18 @@ LOG_DIR = "logs"
 REQUEST_TIMEOUT = 10  # 请求超时时间（秒）
 RETRY_TIMES = 3       # 重试次数
 RETRY_DELAY = 1       # 重试间隔（秒）
+# 腾讯实时行情接口前缀，测试时可指向本地替身服务器（见 sharded_collector.py fake-server）
+TENCENT_QUOTE_URL = "https://qt.gtimg.cn/q="
 
-# 数据更新频率（分钟）
+# 交易日盘前、午休、盘后的行情轮询间隔（分钟），夜间和休市日不轮询
 UPDATE_INTERVAL = 5
+
+# 图表在后台线程光栅化，主线程只贴图（需要 Pillow，不可用时自动退回直接绘制）
+OFFSCREEN_RENDER = True
+
+# 多股监控墙在独立子进程中获取和解析数据，经共享内存交给界面（见 ingest_process.py）
+INGEST_PROCESS = False
+
+# 本地行情网关地址（例如 "http://127.0.0.1:8765"，由 python main.py --gateway-port 8765 启动），
+# 填写后各界面的实时行情从网关订阅，不再各自请求腾讯接口
+QUOTE_GATEWAY = ""
@@ -4,20 +4,37 @@
 使用AkShare获取历史数据
 """
 
-import akshare as ak
 import pandas as pd
 import requests
 import logging
+import time
 from datetime import datetime
 from typing import List, Dict, Optional
 import os
 
 from config import *
+from metrics import REGISTRY, MetricsRegistry
+from log_utils import setup_logging, SuccessAggregator
+from profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+# 腾讯行情单次请求的最大股票数（URL 长度限制）
+TENCENT_BATCH_SIZE = 60
+# 逐只股票的成功日志按时间窗口聚合，避免在轮询热路径上逐条写盘
+success_log = SuccessAggregator(logger)
+
+
+def _akshare():
+    """AkShare 只在腾讯接口失败时用到，导入耗时较长，首次调用时再导入"""
+    import akshare
+    return akshare
 
 class StockDataFetcher:
     """股票数据获取器 - 支持多数据源"""
     
-    def __init__(self, proxy_host: str = None, proxy_port: int = None):
+    def __init__(self, proxy_host: str = None, proxy_port: int = None,
+                 metrics: MetricsRegistry = None, quote_url: str = None):
         """初始化数据获取器"""
         self.setup_logging()
         self.ensure_directories()
@@ -25,90 +42,191 @@ class StockDataFetcher:
         self.proxy_host = proxy_host
         self.proxy_port = proxy_port
         self.session = requests.Session()
+        self.quote_url = quote_url or TENCENT_QUOTE_URL
+        # 默认使用进程级共享的指标注册表
+        self.metrics = metrics or REGISTRY
         
     def setup_logging(self):
-        """设置日志"""
-        os.makedirs(LOG_DIR, exist_ok=True)
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(f'{LOG_DIR}/stock_fetcher.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
-        self.logger = logging.getLogger(__name__)
+        """设置日志（进程内只配置一次，写入由后台线程完成）"""
+        setup_logging()
+        self.logger = logger
         
     def ensure_directories(self):
         """确保必要的目录存在"""
         os.makedirs(DATA_DIR, exist_ok=True)
         os.makedirs(LOG_DIR, exist_ok=True)
+        
+    def get_metrics(self) -> Dict:
+        """获取数据源指标快照：延迟分位数、字节数、成功/失败/降级次数、缓存命中"""
+        return self.metrics.snapshot()
+        
+    def _timed_get(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """发起GET请求并记录延迟与字节数，非200状态计为失败"""
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, **kwargs)
+        except Exception:
+            self.metrics.record_request(endpoint, time.perf_counter() - start, ok=False)
+            raise
+        self.metrics.record_request(endpoint, time.perf_counter() - start,
+                                    nbytes=len(response.content or b""),
+                                    ok=response.status_code == 200)
+        return response
+        
+    def _timed_akshare(self, endpoint: str, func_name: str, **kwargs):
+        """调用AkShare接口并记录延迟，返回空结果计为失败"""
+        start = time.perf_counter()
+        try:
+            result = getattr(_akshare(), func_name)(**kwargs)
+        except Exception:
+            self.metrics.record_request(endpoint, time.perf_counter() - start, ok=False)
+            raise
+        ok = result is not None and not result.empty
+        self.metrics.record_request(endpoint, time.perf_counter() - start, ok=ok)
+        return result
             
-    def _get_tencent_data(self, stock_code: str) -> Optional[Dict]:
-        """从腾讯API获取实时数据"""
+    @profiled("fetch._get_tencent_data")
+    def _get_tencent_data(self, stock_code: str, trace=None) -> Optional[Dict]:
+        """从腾讯API获取实时数据，trace 为 latency_trace.UpdateTrace 时记录响应/解析时间点"""
         try:
             # 腾讯API格式: sh=上海, sz=深圳
             prefix = "sh" if stock_code.startswith("6") else "sz"
             symbol = f"{prefix}{stock_code}"
             
-            url = f"https://qt.gtimg.cn/q={symbol}"
-            response = self.session.get(url, timeout=10)
+            url = f"{self.quote_url}{symbol}"
+            response = self._timed_get("tencent.quote", url, timeout=10)
+            if trace is not None:
+                trace.mark("response_received")
             
-            if response.status_code == 200 and f"v_{symbol}" in response.text:
-                # 解析腾讯API响应格式
-                text = response.text
-                start = text.find('"') + 1
-                end = text.rfind('"')
-                data_str = text[start:end]
-                
-                parts = data_str.split('~')
-                if len(parts) > 5:
-                    return {
-                        'code': stock_code,
-                        'name': parts[1],
-                        'price': float(parts[3]) if parts[3] else 0,
-                        'change': float(parts[32]) if len(parts) > 32 and parts[32] else 0,
-                    }
+            if response.status_code == 200:
+                with profiled("parse.tencent_quote"):
+                    result = self._parse_tencent_quote(response.text, symbol, stock_code)
+                if trace is not None:
+                    trace.mark("parse_done")
+                return result
         except Exception as e:
-            self.logger.warning(f"腾讯API获取失败: {str(e)[:80]}")
+            self.logger.warning("腾讯API获取失败: %s", str(e)[:80], extra={"symbol": stock_code})
+        
+        return None
+        
+    @staticmethod
+    def _parse_tencent_quote(text: str, symbol: str, stock_code: str) -> Optional[Dict]:
+        """解析腾讯实时行情响应文本: v_sh600000="1~名称~代码~现价~..." """
+        if f"v_{symbol}" not in text:
+            return None
+            
+        start = text.find('"') + 1
+        end = text.rfind('"')
+        data_str = text[start:end]
         
+        parts = data_str.split('~')
+        if len(parts) > 5:
+            return {
+                'code': stock_code,
+                'name': parts[1],
+                'price': float(parts[3]) if parts[3] else 0,
+                'change': float(parts[32]) if len(parts) > 32 and parts[32] else 0,
+                'change_amount': float(parts[31]) if len(parts) > 31 and parts[31] else 0,
+                'volume': float(parts[6]) if parts[6] else 0,
+                # 买一/卖一价
+                'bid': float(parts[9]) if len(parts) > 9 and parts[9] else 0,
+                'ask': float(parts[19]) if len(parts) > 19 and parts[19] else 0,
+                # 行情时间 YYYYMMDDHHMMSS
+                'quote_time': parts[30] if len(parts) > 30 else '',
+            }
         return None
         
+    @staticmethod
+    def _tencent_symbol(stock_code: str) -> str:
+        """股票代码转腾讯格式: sh=上海, sz=深圳"""
+        return f"{'sh' if stock_code.startswith('6') else 'sz'}{stock_code}"
+        
+    @profiled("fetch.get_tencent_batch")
+    def get_tencent_batch(self, stock_codes: List[str], trace=None) -> Dict[str, Dict]:
+        """
+        一次请求获取多只股票的腾讯实时行情（每 TENCENT_BATCH_SIZE 只一个请求），trace 记录首个响应到达的时间
+
+        没取到的股票不走逐只备用方案，适合全市场采集；界面使用 get_multiple_stocks_realtime
+        """
+        results = {}
+        for i in range(0, len(stock_codes), TENCENT_BATCH_SIZE):
+            chunk = stock_codes[i:i + TENCENT_BATCH_SIZE]
+            symbols = {self._tencent_symbol(code): code for code in chunk}
+            try:
+                url = f"{self.quote_url}{','.join(symbols)}"
+                response = self._timed_get("tencent.quote_batch", url, timeout=10)
+                if trace is not None:
+                    trace.mark("response_received")
+                if response.status_code != 200:
+                    continue
+                # 响应每行一只股票: v_sh600000="...";
+                with profiled("parse.tencent_quote_batch"):
+                    for line in response.text.split(';'):
+                        line = line.strip()
+                        if not line.startswith('v_'):
+                            continue
+                        symbol = line[2:line.find('=')]
+                        if symbol in symbols:
+                            quote = self._parse_tencent_quote(line, symbol, symbols[symbol])
+                            if quote:
+                                results[symbols[symbol]] = quote
+            except Exception as e:
+                self.logger.warning("腾讯API批量获取失败: %s", str(e)[:80], extra={"symbols": len(chunk)})
+        return results
+        
     def get_stock_info(self, stock_code: str) -> Optional[Dict]:
         """获取股票基本信息"""
         # 先尝试腾讯API
         tencent_data = self._get_tencent_data(stock_code)
         if tencent_data:
-            self.logger.info(f"成功获取股票 {stock_code} 基本信息")
+            success_log.record("基本信息", stock_code)
             return tencent_data
         
         # 再尝试AkShare
+        result = self._akshare_stock_info(stock_code)
+        if result:
+            return result
+        
+        self.logger.error("获取股票 %s 信息失败", stock_code, extra={"symbol": stock_code})
+        return None
+        
+    def _akshare_stock_info(self, stock_code: str) -> Optional[Dict]:
+        """基本信息备用方案：AkShare（阻塞调用，异步获取器在线程池中执行）"""
+        self.metrics.record_fallback("stock_info")
         try:
-            stock_info = ak.stock_individual_info_em(symbol=stock_code)
+            stock_info = self._timed_akshare("akshare.info", "stock_individual_info_em", symbol=stock_code)
             if stock_info is not None and not stock_info.empty:
                 result = {}
                 for _, row in stock_info.iterrows():
                     result[row['item']] = row['value']
-                self.logger.info(f"成功获取股票 {stock_code} 基本信息")
+                success_log.record("基本信息", stock_code)
                 return result
         except Exception as e:
-            self.logger.warning(f"AkShare获取失败: {str(e)[:80]}")
-        
-        self.logger.error(f"获取股票 {stock_code} 信息失败")
+            self.logger.warning("AkShare获取失败: %s", str(e)[:80], extra={"symbol": stock_code})
         return None
         
-    def get_realtime_price(self, stock_code: str) -> Optional[Dict]:
+    def get_realtime_price(self, stock_code: str, trace=None) -> Optional[Dict]:
         """获取股票实时价格"""
         # 先尝试腾讯API
-        tencent_data = self._get_tencent_data(stock_code)
+        tencent_data = self._get_tencent_data(stock_code, trace)
         if tencent_data:
             tencent_data['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self.logger.info(f"成功获取股票 {stock_code} 实时价格")
+            success_log.record("实时价格", stock_code)
             return tencent_data
         
         # 再尝试AkShare
+        result = self._akshare_realtime_price(stock_code, trace)
+        if result:
+            return result
+        
+        self.logger.error("获取股票 %s 实时价格失败", stock_code, extra={"symbol": stock_code})
+        return None
+        
+    def _akshare_realtime_price(self, stock_code: str, trace=None) -> Optional[Dict]:
+        """实时价格备用方案：AkShare 全市场快照"""
+        self.metrics.record_fallback("realtime_price")
         try:
-            df = ak.stock_zh_a_spot_em()
+            df = self._timed_akshare("akshare.spot", "stock_zh_a_spot_em")
             stock_data = df[df['代码'] == stock_code]
             
             if not stock_data.empty:
@@ -120,74 +238,53 @@ class StockDataFetcher:
                     'change': float(row['涨跌幅']),
                     'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 }
-                self.logger.info(f"成功获取股票 {stock_code} 实时价格")
+                if trace is not None:
+                    trace.source = "akshare"
+                    trace.mark("response_received")
+                    trace.mark("parse_done")
+                success_log.record("实时价格", stock_code)
                 return result
         except Exception as e:
-            self.logger.warning(f"AkShare实时价格获取失败: {str(e)[:80]}")
-        
-        self.logger.error(f"获取股票 {stock_code} 实时价格失败")
+            self.logger.warning("AkShare实时价格获取失败: %s", str(e)[:80], extra={"symbol": stock_code})
         return None
         
+    @profiled("fetch.get_historical_data")
     def get_historical_data(self, stock_code: str, period: str = "daily", 
-                          start_date: str = None, end_date: str = None) -> Optional[pd.DataFrame]:
-        """获取股票历史数据 - 使用腾讯API"""
+                          start_date: str = None, end_date: str = None,
+                          count: int = 320) -> Optional[pd.DataFrame]:
+        """获取股票历史数据 - 使用腾讯API（返回 end_date 及之前最多 count 根K线）"""
         try:
-            # 腾讯API格式: sh=上海, sz=深圳
-            prefix = "sh" if stock_code.startswith("6") else "sz"
-            symbol = f"{prefix}{stock_code}"
-            
-            # 腾讯API: 获取最近的K线数据
-            # 参数: code=股票代码, begin=开始日期, end=结束日期, fqt=复权类型(0不复权)
-            url = f"https://web.ifzq.gtimg.cn/appstock/app/fqkline/get"
-            params = {
-                'param': f'{symbol},day,,,320,qfq'
-            }
-            
-            response = self.session.get(url, params=params, timeout=10)
+            symbol, url, params = self._kline_request(stock_code, start_date, end_date, count)
+            response = self._timed_get("tencent.kline", url, params=params, timeout=10)
             if response.status_code == 200:
-                import json
-                data = response.json()
-                
-                if data.get('code') == 0 and data.get('data'):
-                    stock_data = data['data'].get(symbol, {})
-                    # 腾讯API返回qfqday (复权数据)
-                    day_data = stock_data.get('qfqday', []) or stock_data.get('day', [])
-                    
-                    if day_data:
-                        # 解析腾讯API数据格式: [日期, 开, 收, 高, 低, 成交量, 成交额]
-                        records = []
-                        for item in day_data[-320:]:  # 最多320条
-                            try:
-                                records.append({
-                                    '日期': item[0],
-                                    '开盘': float(item[1]),
-                                    '收盘': float(item[2]),
-                                    '最高': float(item[3]),
-                                    '最低': float(item[4]),
-                                    '成交量': int(float(item[5])),
-                                    '成交额': 0,
-                                })
-                            except (ValueError, IndexError, TypeError):
-                                continue
-                        
-                        if records:
-                            df = pd.DataFrame(records)
-                            df['股票代码'] = stock_code
-                            # 计算涨跌幅
-                            df['涨跌幅'] = ((df['收盘'] - df['开盘']) / df['开盘'] * 100).round(2)
-                            self.logger.info(f"成功获取股票 {stock_code} 历史数据，共 {len(df)} 条")
-                            return df
+                with profiled("parse.kline_json"):
+                    df = self._parse_kline_json(response.json(), symbol, stock_code, limit=count)
+                if df is not None:
+                    success_log.record("历史数据", stock_code)
+                    return df
         except Exception as e:
-            self.logger.warning(f"腾讯API历史数据获取失败: {str(e)[:80]}")
+            self.logger.warning("腾讯API历史数据获取失败: %s", str(e)[:80], extra={"symbol": stock_code})
         
         # 备用方案：尝试AkShare
+        df = self._akshare_historical_data(stock_code, period, start_date, end_date)
+        if df is not None:
+            return df
+        
+        self.logger.error("获取股票 %s 历史数据失败", stock_code, extra={"symbol": stock_code})
+        return None
+        
+    def _akshare_historical_data(self, stock_code: str, period: str = "daily",
+                                 start_date: str = None, end_date: str = None) -> Optional[pd.DataFrame]:
+        """历史数据备用方案：AkShare，未指定开始日期时取一年"""
+        self.metrics.record_fallback("historical_data")
         try:
-            if not end_date:
-                end_date = datetime.now().strftime('%Y%m%d')
+            end_date = pd.to_datetime(end_date or datetime.now()).strftime('%Y%m%d')
             if not start_date:
-                start_date = (datetime.now().replace(year=datetime.now().year-1)).strftime('%Y%m%d')
+                start_date = (pd.to_datetime(end_date) - pd.DateOffset(years=1)).strftime('%Y%m%d')
             
-            df = ak.stock_zh_a_hist(
+            df = self._timed_akshare(
+                "akshare.hist",
+                "stock_zh_a_hist",
                 symbol=stock_code,
                 period=period,
                 start_date=start_date,
@@ -200,31 +297,93 @@ class StockDataFetcher:
                 if len(df.columns) <= len(column_names):
                     df.columns = column_names[:len(df.columns)]
                 df['股票代码'] = stock_code
-                self.logger.info(f"成功获取股票 {stock_code} 历史数据(AkShare)，共 {len(df)} 条")
+                success_log.record("历史数据(AkShare)", stock_code)
                 return df
         except Exception as e:
-            self.logger.warning(f"AkShare历史数据获取失败: {str(e)[:80]}")
-        
-        self.logger.error(f"获取股票 {stock_code} 历史数据失败")
+            self.logger.warning("AkShare历史数据获取失败: %s", str(e)[:80], extra={"symbol": stock_code})
         return None
         
+    @staticmethod
+    def _kline_request(stock_code: str, start_date: str = None, end_date: str = None,
+                       count: int = 320):
+        """腾讯K线请求: 返回 (腾讯代码, URL, 查询参数)"""
+        # 腾讯API格式: sh=上海, sz=深圳
+        prefix = "sh" if stock_code.startswith("6") else "sz"
+        symbol = f"{prefix}{stock_code}"
+        
+        # 腾讯API: 获取最近的K线数据
+        # 参数: 代码,周期,开始日期,结束日期,根数,复权类型（日期为空表示不限）
+        url = f"https://web.ifzq.gtimg.cn/appstock/app/fqkline/get"
+        begin = pd.to_datetime(start_date).strftime('%Y-%m-%d') if start_date else ''
+        end = pd.to_datetime(end_date).strftime('%Y-%m-%d') if end_date else ''
+        params = {
+            'param': f'{symbol},day,{begin},{end},{count},qfq'
+        }
+        return symbol, url, params
+        
+    @staticmethod
+    def _parse_kline_json(data: Dict, symbol: str, stock_code: str, limit: int = 320) -> Optional[pd.DataFrame]:
+        """将腾讯K线JSON转换为DataFrame"""
+        if data.get('code') != 0 or not data.get('data'):
+            return None
+            
+        stock_data = data['data'].get(symbol, {})
+        # 腾讯API返回qfqday (复权数据)
+        day_data = stock_data.get('qfqday', []) or stock_data.get('day', [])
+        if not day_data:
+            return None
+            
+        # 解析腾讯API数据格式: [日期, 开, 收, 高, 低, 成交量, 成交额]
+        records = []
+        for item in day_data[-limit:]:
+            try:
+                records.append({
+                    '日期': item[0],
+                    '开盘': float(item[1]),
+                    '收盘': float(item[2]),
+                    '最高': float(item[3]),
+                    '最低': float(item[4]),
+                    '成交量': int(float(item[5])),
+                    '成交额': 0,
+                })
+            except (ValueError, IndexError, TypeError):
+                continue
+        
+        if not records:
+            return None
+            
+        df = pd.DataFrame(records)
+        df['股票代码'] = stock_code
+        # 计算涨跌幅
+        df['涨跌幅'] = ((df['收盘'] - df['开盘']) / df['开盘'] * 100).round(2)
+        return df
+        
     def save_to_csv(self, data: pd.DataFrame, filename: str):
         """保存数据到CSV文件"""
         try:
             filepath = os.path.join(DATA_DIR, filename)
             data.to_csv(filepath, index=False, encoding='utf-8')
-            self.logger.info(f"数据已保存到 {filepath}")
+            self.logger.info("数据已保存到 %s", filepath)
         except Exception as e:
-            self.logger.error(f"保存数据失败: {e}")
+            self.logger.error("保存数据失败: %s", e)
             
-    def get_multiple_stocks_realtime(self, stock_codes: List[str]) -> Dict[str, Dict]:
-        """批量获取实时价格"""
+    def get_multiple_stocks_realtime(self, stock_codes: List[str], trace=None) -> Dict[str, Dict]:
+        """批量获取实时价格：先合并请求腾讯API，缺失的股票再逐只走备用方案"""
         results = {}
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for code, quote in self.get_tencent_batch(stock_codes, trace).items():
+            quote['timestamp'] = timestamp
+            success_log.record("实时价格", code)
+            results[code] = quote
+        
         for code in stock_codes:
+            if code in results:
+                continue
             price_data = self.get_realtime_price(code)
             if price_data:
                 results[code] = price_data
-        return results
+        # 保持输入顺序
+        return {code: results[code] for code in stock_codes if code in results}
         
     def get_multiple_stocks_historical(self, stock_codes: List[str]) -> Dict[str, pd.DataFrame]:
         """批量获取历史数据"""
@@ -234,3 +393,11 @@ class StockDataFetcher:
             if hist_data is not None:
                 results[code] = hist_data
         return results
+
+
+def create_fetcher(proxy_host: str = None, proxy_port: int = None) -> StockDataFetcher:
+    """界面使用的数据获取器：配置了 QUOTE_GATEWAY 时经本地网关获取，否则直接访问数据源"""
+    if QUOTE_GATEWAY:
+        from quote_gateway import GatewayStockDataFetcher
+        return GatewayStockDataFetcher(QUOTE_GATEWAY)
+    return StockDataFetcher(proxy_host=proxy_host, proxy_port=proxy_port)
@@ -0,0 +1,82 @@
+"""
+matplotlib 中文字体设置
+只把本机实际安装的中文字体写入 font.sans-serif，避免每段文字都对不存在的 SimHei/微软雅黑做回退查找；
+解析结果缓存到 data/font_cache.json，之后启动直接使用，不再遍历字体列表
+"""
+
+import json
+import os
+
+from config import DATA_DIR
+
+FONT_CACHE_FILE = os.path.join(DATA_DIR, "font_cache.json")
+
+# 按优先级排列的候选中文字体（Windows / macOS / Linux）
+CJK_FONT_CANDIDATES = [
+    "SimHei",
+    "Microsoft YaHei",
+    "PingFang SC",
+    "Heiti SC",
+    "Noto Sans CJK SC",
+    "Noto Sans CJK JP",
+    "Source Han Sans SC",
+    "WenQuanYi Micro Hei",
+    "WenQuanYi Zen Hei",
+    "Arial Unicode MS",
+]
+FALLBACK_FONT = "DejaVu Sans"
+
+# 本进程内已解析的字体（None 表示尚未解析，"" 表示没有可用的中文字体）
+_resolved = None
+
+
+def _load_cache(version: str):
+    try:
+        with open(FONT_CACHE_FILE, encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # 字体文件被卸载或 matplotlib 升级后重新解析
+    if cached.get("matplotlib") != version or not os.path.exists(cached.get("path", "")):
+        return None
+    return cached.get("family")
+
+
+def _save_cache(version: str, family: str, path: str):
+    try:
+        os.makedirs(os.path.dirname(FONT_CACHE_FILE), exist_ok=True)
+        with open(FONT_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump({"matplotlib": version, "family": family, "path": path}, f, ensure_ascii=False)
+    except OSError:
+        pass
+
+
+def resolve_cjk_font() -> str:
+    """返回本机可用的中文字体名，没有则返回空字符串"""
+    global _resolved
+    if _resolved is not None:
+        return _resolved
+
+    import matplotlib
+    version = matplotlib.__version__
+    family = _load_cache(version)
+    if family is None:
+        from matplotlib import font_manager
+        installed = {}
+        for entry in font_manager.fontManager.ttflist:
+            installed.setdefault(entry.name, entry.fname)
+        family = next((name for name in CJK_FONT_CANDIDATES if name in installed), "")
+        if family:
+            _save_cache(version, family, installed[family])
+
+    _resolved = family
+    return family
+
+
+def setup_cjk_font():
+    """设置 matplotlib 中文字体和负号显示，可重复调用"""
+    import matplotlib
+    family = resolve_cjk_font()
+    matplotlib.rcParams['font.sans-serif'] = [family, FALLBACK_FONT] if family else [FALLBACK_FONT]
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    return family
@@ -0,0 +1,441 @@
+"""
+多股监控墙
+N 个小K线面板共用一张图和一个刷新调度器：
+- 每个周期只发一次批量行情请求
+- 历史K线作为静态图层只在整图重绘时绘制，之后每个面板缓存自己的背景
+- 行情变化的面板只恢复自己的背景、重绘最后一根K线和价格文字并局部 blit
+"""
+
+import asyncio
+import math
+import threading
+from typing import Dict, List, Optional
+
+import tkinter as tk
+from tkinter import ttk, messagebox
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.patches import Rectangle
+from matplotlib.ticker import NullLocator
+import numpy as np
+
+from font_utils import setup_cjk_font
+setup_cjk_font()
+
+from config import STOCK_CODES, INGEST_PROCESS
+from async_fetcher import AsyncStockDataFetcher, get_pump
+from kline_renderer import ohlcv_arrays, draw_candlesticks, UP_COLOR, DOWN_COLOR
+from profiling import profiled
+from quote_hub import get_hub
+from update_engine import UpdateEngine
+from render_scheduler import RenderScheduler
+
+# 每个面板显示的K线根数
+PANEL_BARS = 30
+# 价格纵轴余量比例，实时价格在余量内波动时无需整图重绘
+PANEL_Y_PAD = 0.08
+# 读取数据子进程通知的间隔（毫秒）
+INGEST_POLL_MS = 100
+
+
+class GridPanel:
+    """单只股票的小K线面板：静态历史K线 + 动画的最后一根K线和价格文字"""
+
+    def __init__(self, code: str):
+        self.code = code
+        self.name = ""
+        self.ax = None
+        self.background = None
+        self.live = {}
+        self.static = []
+        # 最近 PANEL_BARS 根K线，最后一根随行情更新
+        self.dates: List[str] = []
+        self.ohlc = np.empty((0, 4))
+        self.quote: Optional[Dict] = None
+
+    def set_history(self, df):
+        opens, highs, lows, closes, _ = ohlcv_arrays(df.tail(PANEL_BARS))
+        self.ohlc = np.column_stack([opens, highs, lows, closes])
+        self.dates = [str(d)[:10].replace('-', '') for d in df.tail(PANEL_BARS)['日期']]
+
+    def set_bars(self, bars: np.ndarray):
+        """
+        从共享内存读出的K线 [日期, 开, 高, 低, 收, 量] 设置历史
+
+        bars 须是面板独占的副本（SharedBook.read_bars），ohlc 直接引用其中的列，最后一根随行情修改
+        """
+        bars = bars[-PANEL_BARS:]
+        self.ohlc = bars[:, 1:5]
+        self.dates = [f"{int(d):08d}" for d in bars[:, 0]]
+
+    def apply_quote(self, quote: Dict) -> str:
+        """
+        合并最新行情到最后一根K线
+
+        Returns:
+            'none' 无变化 / 'live' 只需局部刷新 / 'full' 需要重绘静态图层（新交易日或超出纵轴范围）
+        """
+        previous = self.quote
+        self.quote = quote
+        self.name = quote.get('name', self.name)
+        if previous is not None and previous.get('price') == quote.get('price') \
+                and previous.get('volume') == quote.get('volume'):
+            return 'none'
+        if not len(self.ohlc):
+            return 'none'
+
+        price = float(quote['price'])
+        quote_date = quote.get('quote_time', '')[:8]
+        result = 'live'
+        if quote_date and self.dates and quote_date > self.dates[-1]:
+            # 新交易日：追加一根K线，最早一根移出窗口
+            self.ohlc = np.vstack([self.ohlc, [price, price, price, price]])[-PANEL_BARS:]
+            self.dates = (self.dates + [quote_date])[-PANEL_BARS:]
+            result = 'full'
+        else:
+            bar = self.ohlc[-1]
+            bar[3] = price
+            bar[1] = max(bar[1], price)
+            bar[2] = min(bar[2], price)
+
+        if self.ax is not None:
+            low, high = self.ax.get_ylim()
+            if not low <= price <= high:
+                result = 'full'
+        return result
+
+    def price_text(self) -> str:
+        if self.quote is None:
+            return self.code
+        return f"{self.code} {self.name}  {self.quote['price']:.2f}  {self.quote.get('change', 0):+.2f}%"
+
+    def draw_static(self, ax):
+        """绘制静态图层（最后一根之外的K线）并创建动画图元；只替换自己的图元，不清空坐标轴"""
+        self.ax = ax
+        for artist in self.static + list(self.live.values()):
+            if artist.axes is not None:
+                artist.remove()
+        self.static = []
+
+        n = len(self.ohlc)
+        if n:
+            o, h, l, c = self.ohlc.T
+            artists = draw_candlesticks(ax, np.arange(n - 1), o[:-1], h[:-1], l[:-1], c[:-1],
+                                        width=0.7, wick_width=0.6, edge_width=0.3, autoscale=False)
+            self.static.extend(artists.values())
+            low, high = np.nanmin(l), np.nanmax(h)
+            pad = (high - low) * PANEL_Y_PAD or high * 0.01 or 1.0
+            ax.set_ylim(low - pad, high + pad)
+            # 面板不画刻度，区间最高/最低价直接标在右侧
+            self.static.append(ax.text(0.98, 0.97, f"{high:.2f}", transform=ax.transAxes,
+                                       ha='right', va='top', fontsize=6, color='gray'))
+            self.static.append(ax.text(0.98, 0.03, f"{low:.2f}", transform=ax.transAxes,
+                                       ha='right', va='bottom', fontsize=6, color='gray'))
+
+        self.live = {
+            'wick': Line2D([], [], color='black', linewidth=0.6),
+            'body': Rectangle((0, 0), 0.7, 0, linewidth=0.3),
+            'text': ax.text(0.02, 0.97, '', transform=ax.transAxes, ha='left', va='top', fontsize=7,
+                            bbox=dict(boxstyle='square,pad=0.15', facecolor='white', edgecolor='none', alpha=0.8)),
+        }
+        ax.add_line(self.live['wick'])
+        ax.add_patch(self.live['body'])
+        for artist in self.live.values():
+            artist.set_animated(True)
+        self.update_live()
+
+    def update_live(self):
+        """更新最后一根K线和价格文字"""
+        if not self.live:
+            return
+        self.live['text'].set_text(self.price_text())
+        if not len(self.ohlc):
+            return
+        o, h, l, c = self.ohlc[-1]
+        x = len(self.ohlc) - 1
+        up = c >= o
+        self.live['wick'].set_data([x, x], [l, h])
+        body = self.live['body']
+        body.set_xy((x - 0.35, min(o, c)))
+        body.set_height(max(abs(c - o), 1e-6))
+        body.set_facecolor(UP_COLOR if up else DOWN_COLOR)
+        body.set_edgecolor(UP_COLOR if up else DOWN_COLOR)
+        self.live['text'].set_color(UP_COLOR if self.quote and self.quote.get('change', 0) >= 0 else DOWN_COLOR)
+
+    @staticmethod
+    def style_axes(ax):
+        """所有面板共用的坐标轴模板：无刻度、细边框，避免为每个面板生成刻度对象"""
+        ax.xaxis.set_major_locator(NullLocator())
+        ax.yaxis.set_major_locator(NullLocator())
+        ax.set_xlim(-1, PANEL_BARS)
+        for spine in ax.spines.values():
+            spine.set_linewidth(0.5)
+            spine.set_color('#BBBBBB')
+
+    def draw_live(self, figure):
+        for artist in self.live.values():
+            figure.draw_artist(artist)
+
+
+class GridMonitorUI:
+    """多股监控墙页面，可作为独立窗口或嵌入 Notebook 页签"""
+
+    def __init__(self, root, stock_codes: Optional[List[str]] = None, update_interval: int = 5):
+        self.root = root
+        try:
+            self.root.title("多股监控墙")
+            self.root.geometry("1400x900")
+        except Exception:
+            pass
+
+        # 历史K线用协程并发获取，事件循环由 Tk 主循环驱动
+        self.fetcher = AsyncStockDataFetcher()
+        self.pump = get_pump(self.root)
+        # 启用 INGEST_PROCESS 时由子进程获取数据，界面只读共享内存
+        self.use_ingest = INGEST_PROCESS
+        self.ingest = None
+        self.stock_codes = list(stock_codes or STOCK_CODES)
+        self.update_interval = update_interval
+        self.panels: Dict[str, GridPanel] = {}
+        # 本帧需要局部刷新的面板（只在主线程读写）
+        self._dirty_panels = set()
+        # 尚未落到界面的行情（轮询线程写入，主线程取走），多轮未处理时按股票合并
+        self._pending_quotes: Dict[str, Dict] = {}
+        self._quotes_lock = threading.Lock()
+        self._rounds = 0
+
+        self.scheduler = RenderScheduler(self.root)
+        # 历史加载和订阅按启动代号管理，停止或重新开始时一并取消
+        self.engine = UpdateEngine(self.scheduler, max_workers=1, name="grid")
+        self.create_widgets()
+        # 窗口（或所在标签页）销毁时关闭 HTTP 会话
+        self.root.bind("<Destroy>", self.on_destroy, add="+")
+
+    def create_widgets(self):
+        """创建界面组件"""
+        control_frame = ttk.Frame(self.root, padding=8)
+        control_frame.pack(fill="x")
+
+        ttk.Label(control_frame, text="股票代码:").pack(side="left")
+        self.codes_var = tk.StringVar(value=",".join(self.stock_codes))
+        ttk.Entry(control_frame, textvariable=self.codes_var, width=60).pack(side="left", padx=(5, 10))
+
+        ttk.Label(control_frame, text="更新间隔(秒):").pack(side="left")
+        self.interval_var = tk.StringVar(value=str(self.update_interval))
+        ttk.Combobox(control_frame, textvariable=self.interval_var, values=["3", "5", "10", "30"],
+                     width=5, state="readonly").pack(side="left", padx=(5, 10))
+
+        self.start_btn = ttk.Button(control_frame, text="开始监控", command=self.start_monitor)
+        self.start_btn.pack(side="left", padx=5)
+        self.stop_btn = ttk.Button(control_frame, text="停止", command=self.stop_monitor, state="disabled")
+        self.stop_btn.pack(side="left", padx=5)
+
+        self.status_var = tk.StringVar(value="就绪")
+        ttk.Label(control_frame, textvariable=self.status_var, foreground="blue").pack(side="right")
+
+        self.fig = Figure(figsize=(14, 8), dpi=100, facecolor='white')
+        self.canvas = FigureCanvasTkAgg(self.fig, self.root)
+        self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        # 整图重绘后（包括窗口缩放）重新缓存各面板背景
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+
+    # ---- 布局与绘制 ----
+
+    def build_panels(self, stock_codes: List[str]):
+        """按股票数量排布网格，复用已有面板的数据"""
+        self.panels = {code: self.panels.get(code) or GridPanel(code) for code in stock_codes}
+        self.fig.clear()
+        count = max(len(stock_codes), 1)
+        cols = math.ceil(math.sqrt(count * 16 / 9))
+        rows = math.ceil(count / cols)
+        # 所有面板共用同一套网格参数，不做 tight_layout
+        self.fig.subplots_adjust(left=0.03, right=0.995, bottom=0.01, top=0.995, wspace=0.25, hspace=0.08)
+        for i, code in enumerate(stock_codes):
+            panel = self.panels[code]
+            panel.ax = self.fig.add_subplot(rows, cols, i + 1)
+            panel.static, panel.live, panel.background = [], {}, None
+            GridPanel.style_axes(panel.ax)
+
+    @profiled("draw.GridMonitorUI.redraw_all")
+    def redraw_all(self):
+        """整图重绘：绘制所有面板的静态图层，draw_event 中缓存背景"""
+        self._dirty_panels.clear()
+        for panel in self.panels.values():
+            panel.draw_static(panel.ax)
+        self.canvas.draw()
+
+    def on_draw(self, event):
+        """缓存每个面板的背景并画上动画图元"""
+        for panel in self.panels.values():
+            if panel.ax is None:
+                continue
+            panel.background = self.canvas.copy_from_bbox(panel.ax.bbox)
+            panel.draw_live(self.fig)
+
+    @profiled("draw.GridMonitorUI.refresh_panels")
+    def refresh_panels(self):
+        """只局部刷新行情有变化的面板"""
+        codes, self._dirty_panels = self._dirty_panels, set()
+        for code in codes:
+            panel = self.panels.get(code)
+            if panel is None or panel.background is None:
+                continue
+            self.canvas.restore_region(panel.background)
+            panel.update_live()
+            panel.draw_live(self.fig)
+            self.canvas.blit(panel.ax.bbox)
+
+    def on_quotes(self, token, quotes: Dict[str, Dict]):
+        """QuoteHub 回调（轮询线程）：每轮只含部分股票，先合并再投递，界面落后时不丢前一轮的面板"""
+        with self._quotes_lock:
+            self._pending_quotes.update(quotes)
+        self.engine.post(token, "quotes", self.drain_quotes)
+
+    def drain_quotes(self) -> int:
+        """主线程取走合并后的行情并应用"""
+        with self._quotes_lock:
+            quotes, self._pending_quotes = self._pending_quotes, {}
+        return self.apply_quotes(quotes)
+
+    def apply_quotes(self, quotes: Dict[str, Dict]) -> int:
+        """主线程合并一轮行情，按需标记局部刷新或整图重绘，返回有变化的面板数"""
+        changed = 0
+        full = False
+        for code, quote in quotes.items():
+            panel = self.panels.get(code)
+            if panel is None:
+                continue
+            result = panel.apply_quote(quote)
+            if result == 'none':
+                continue
+            changed += 1
+            if result == 'full':
+                full = True
+            else:
+                self._dirty_panels.add(code)
+
+        if full:
+            self.scheduler.cancel("panels")
+            self.scheduler.mark_dirty("full", self.redraw_all)
+        elif changed:
+            self.scheduler.mark_dirty("panels", self.refresh_panels)
+
+        self._rounds += 1
+        self.update_status(f"第 {self._rounds} 轮: {len(quotes)}/{len(self.panels)} 只有行情，{changed} 只变化")
+        return changed
+
+    # ---- 数据 ----
+
+    def start_monitor(self):
+        """开始监控"""
+        codes = [c.strip() for c in self.codes_var.get().replace('，', ',').split(',') if c.strip()]
+        if not codes:
+            messagebox.showwarning("输入错误", "请输入股票代码")
+            return
+        try:
+            self.update_interval = max(1, int(self.interval_var.get()))
+        except ValueError:
+            pass
+
+        self.stock_codes = list(dict.fromkeys(codes))
+        self.build_panels(self.stock_codes)
+        # 新的一代任务：上一次启动尚未完成的历史加载和订阅全部作废
+        token = self.engine.start()
+        self.start_btn.config(state="disabled")
+        self.stop_btn.config(state="normal")
+        codes = list(self.stock_codes)
+        if self.use_ingest:
+            self.start_ingest(token, codes)
+            return
+        task = self.pump.submit(self.load_history(token, codes),
+                                on_done=lambda _: self.subscribe_quotes(token, codes))
+        self.engine.attach(token, task.cancel)
+
+    def stop_monitor(self):
+        """停止监控（订阅随代号一起关闭），HTTP 会话在下次开始时重新建立"""
+        self.engine.stop()
+        self.pump.submit(self.fetcher.close())
+        self.start_btn.config(state="normal")
+        self.stop_btn.config(state="disabled")
+        self.update_status("已停止")
+
+    def on_destroy(self, event):
+        """窗口销毁：停止后台任务并同步关闭 HTTP 会话（此时主循环已不再驱动事件循环）"""
+        if event.widget is not self.root:
+            return
+        self.engine.shutdown()
+        if not self.pump.loop.is_closed() and not self.pump.loop.is_running():
+            self.pump.loop.run_until_complete(self.fetcher.close())
+
+    async def load_history(self, token, stock_codes: List[str]):
+        """并发加载各面板的历史K线：在主线程的事件循环中执行，每只股票一个协程"""
+        async def load(code):
+            df = await self.fetcher.get_historical_data(code, count=PANEL_BARS)
+            if not token.cancelled and df is not None and not df.empty and code in self.panels:
+                self.panels[code].set_history(df)
+
+        self.update_status(f"加载 {len(stock_codes)} 只股票的历史数据...")
+        await asyncio.gather(*(load(code) for code in stock_codes))
+
+    def subscribe_quotes(self, token, stock_codes: List[str]):
+        """历史K线加载完成后向 QuoteHub 订阅，行情每个周期随其他视图一起批量请求"""
+        if token.cancelled:
+            return
+        self.scheduler.mark_dirty("full", self.redraw_all)
+        with self._quotes_lock:
+            self._pending_quotes.clear()
+        subscription = get_hub().subscribe(
+            stock_codes, lambda quotes: self.on_quotes(token, quotes), interval=self.update_interval)
+        self.engine.attach(token, subscription.close)
+
+    def start_ingest(self, token, stock_codes: List[str]):
+        """启动数据子进程，停止或重新开始时随代号一起关闭"""
+        from ingest_process import IngestProcess
+
+        self.update_status(f"数据进程加载 {len(stock_codes)} 只股票...")
+        self.ingest = IngestProcess(stock_codes, max_bars=PANEL_BARS, interval=self.update_interval)
+        self.engine.attach(token, self.ingest.close)
+        self.root.after(INGEST_POLL_MS, self.poll_ingest, token, self.ingest)
+
+    def poll_ingest(self, token, ingest):
+        """读取子进程通知，从共享内存取出K线和行情；多轮行情只合并最新一轮"""
+        if token.cancelled:
+            return
+        book = ingest.book
+        quotes, names = {}, {}
+        reloaded = False
+        for event in ingest.poll():
+            if event[0] == "bars":
+                for i in event[1]:
+                    panel = self.panels.get(book.codes[i])
+                    if panel is not None:
+                        panel.set_bars(book.read_bars(i, PANEL_BARS))
+                reloaded = True
+            elif event[0] == "quotes":
+                names.update(event[2])
+                for i in event[1]:
+                    quotes[book.codes[i]] = book.read_quote(i)
+            elif event[0] == "error":
+                self.update_status(event[1])
+        if reloaded:
+            self.scheduler.mark_dirty("full", self.redraw_all)
+        for i, name in names.items():
+            if book.codes[i] in quotes:
+                quotes[book.codes[i]]['name'] = name
+        if quotes:
+            self.apply_quotes(quotes)
+        self.root.after(INGEST_POLL_MS, self.poll_ingest, token, ingest)
+
+    def update_status(self, message):
+        self.status_var.set(message)
+
+
+def main():
+    root = tk.Tk()
+    GridMonitorUI(root)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
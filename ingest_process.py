@@ -0,0 +1,248 @@
+"""
+独立的数据获取/解析进程
+子进程负责请求、JSON 解析和 DataFrame 构造，把K线和行情写进共享内存中的 NumPy 数组，
+再通过队列发一条很小的通知；界面进程在共享内存的视图上按顺序锁只复制要显示的一段K线，
+批量加载时的解析不会和 Tk、matplotlib 抢 GIL
+
+共享内存布局（一个 SharedMemory 块，按股票顺序排列）:
+- bars:     float64 [股票数, max_bars, BAR_FIELDS]，按日期升序，右侧无效部分为 NaN
+- counts:   int64   [股票数]，每只股票的有效K线根数
+- quotes:   float64 [股票数, QUOTE_FIELDS]
+- versions: int64   [股票数]，写入期间为奇数（顺序锁），读取方据此判断是否读到写了一半的数据
+"""
+
+import asyncio
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# K线字段: 日期为 YYYYMMDD 数值
+BAR_FIELDS = ("date", "open", "high", "low", "close", "volume")
+# 行情字段: 行情时间为 YYYYMMDDHHMMSS 数值
+QUOTE_FIELDS = ("price", "change", "change_amount", "volume", "quote_time")
+DEFAULT_MAX_BARS = 320
+# 子进程退出的等待时间（秒）
+JOIN_TIMEOUT = 3.0
+
+
+class SharedBook:
+    """共享内存中的K线与行情表，写入方和读取方各自用同一个布局打开"""
+
+    def __init__(self, codes: List[str], max_bars: int = DEFAULT_MAX_BARS, name: Optional[str] = None):
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.max_bars = max_bars
+        n = len(self.codes)
+        shapes = [("bars", np.float64, (n, max_bars, len(BAR_FIELDS))),
+                  ("counts", np.int64, (n,)),
+                  ("quotes", np.float64, (n, len(QUOTE_FIELDS))),
+                  ("versions", np.int64, (n,))]
+        size = sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for _, dtype, shape in shapes)
+
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+
+        offset = 0
+        for attr, dtype, shape in shapes:
+            array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            setattr(self, attr, array)
+            offset += array.nbytes
+        if self.owner:
+            self.bars.fill(np.nan)
+            self.quotes.fill(np.nan)
+            self.counts.fill(0)
+            self.versions.fill(0)
+
+    def close(self):
+        """释放视图并关闭共享内存，创建方同时删除"""
+        self.bars = self.counts = self.quotes = self.versions = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    # ---- 写入（子进程） ----
+
+    def write_bars(self, i: int, df):
+        """写入一只股票的历史K线（取最后 max_bars 根）"""
+        df = df.tail(self.max_bars)
+        rows = len(df)
+        values = np.column_stack([
+            df['日期'].astype(str).str[:10].str.replace('-', '').astype(float).to_numpy(),
+            df['开盘'].to_numpy(float), df['最高'].to_numpy(float), df['最低'].to_numpy(float),
+            df['收盘'].to_numpy(float), df['成交量'].to_numpy(float),
+        ])
+        self.versions[i] += 1
+        self.bars[i, :rows] = values
+        self.bars[i, rows:] = np.nan
+        self.counts[i] = rows
+        self.versions[i] += 1
+
+    def write_quote(self, i: int, quote: Dict):
+        row = [float(quote.get(field) or 0) if field != "quote_time"
+               else float(quote.get(field) or "nan") for field in QUOTE_FIELDS]
+        self.versions[i] += 1
+        self.quotes[i] = row
+        self.versions[i] += 1
+
+    # ---- 读取（界面进程） ----
+
+    def bar_view(self, i: int, last: Optional[int] = None) -> np.ndarray:
+        """第 i 只股票有效K线（可只取最后 last 根）的只读视图，不复制；子进程重新加载历史时内容会变化"""
+        count = int(self.counts[i])
+        start = 0 if last is None else max(0, count - last)
+        view = self.bars[i, start:count]
+        view.flags.writeable = False
+        return view
+
+    def read_bars(self, i: int, last: Optional[int] = None) -> np.ndarray:
+        """按顺序锁读取第 i 只股票K线（可只取最后 last 根）的一致副本，只复制这一段"""
+        return self._consistent(i, lambda: self.bar_view(i, last).copy())
+
+    def read_quote(self, i: int) -> Dict:
+        """按顺序锁读取第 i 只股票的行情，返回与 StockDataFetcher 相同字段的字典"""
+        row = self._consistent(i, lambda: self.quotes[i].copy())
+        quote = dict(zip(QUOTE_FIELDS, row.tolist()))
+        quote['code'] = self.codes[i]
+        quote['quote_time'] = '' if np.isnan(row[-1]) else f"{int(row[-1]):014d}"
+        return quote
+
+    def _consistent(self, i: int, read):
+        while True:
+            before = int(self.versions[i])
+            if before % 2 == 0:
+                value = read()
+                if int(self.versions[i]) == before:
+                    return value
+            time.sleep(0)
+
+
+def _worker(name: str, codes: List[str], max_bars: int, interval: float, commands, notify):
+    """子进程入口：加载历史K线，然后经子进程内的 QuoteHub 轮询行情"""
+    from async_fetcher import AsyncStockDataFetcher
+    from quote_hub import QuoteHub
+
+    book = SharedBook(codes, max_bars, name=name)
+    names: Dict[str, str] = {}
+
+    def load_history(targets: List[str]):
+        async def load():
+            async with AsyncStockDataFetcher() as fetcher:
+                return await fetcher.get_multiple_stocks_historical(targets, count=max_bars)
+        try:
+            frames = asyncio.run(load())
+        except Exception as e:
+            notify.put(("error", f"历史数据加载失败: {e}"))
+            return
+        loaded = []
+        for code, df in frames.items():
+            if df is not None and not df.empty:
+                book.write_bars(book.index[code], df)
+                loaded.append(book.index[code])
+        notify.put(("bars", loaded))
+
+    def on_quotes(quotes: Dict[str, Dict]):
+        changed, new_names = [], {}
+        for code, quote in quotes.items():
+            i = book.index.get(code)
+            if i is None:
+                continue
+            book.write_quote(i, quote)
+            changed.append(i)
+            if quote.get('name') and names.get(code) != quote['name']:
+                names[code] = new_names[i] = quote['name']
+        notify.put(("quotes", changed, new_names))
+
+    hub = QuoteHub()
+    subscription = None
+    try:
+        load_history(codes)
+        subscription = hub.subscribe(codes, on_quotes, interval=interval)
+        while True:
+            command = commands.get()
+            if command[0] == "stop":
+                break
+            if command[0] == "reload":
+                load_history(codes)
+            elif command[0] == "interval":
+                subscription.set_interval(command[1])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if subscription is not None:
+            subscription.close()
+        hub.close()
+        book.close()
+
+
+class IngestProcess:
+    """
+    界面进程一侧的句柄：创建共享内存、启动子进程、读取通知
+
+    poll() 不阻塞，应在主线程定时调用（例如 root.after），返回本次收到的通知：
+    ("bars", [序号...]) 历史K线已写入 / ("quotes", [序号...], {序号: 名称}) 行情已写入 /
+    ("error", 消息)
+    """
+
+    def __init__(self, codes: List[str], max_bars: int = DEFAULT_MAX_BARS, interval: float = 5.0):
+        self.book = SharedBook(codes, max_bars)
+        # spawn：子进程不继承界面进程的 Tk 和 matplotlib 状态
+        context = mp.get_context("spawn")
+        self.commands = context.Queue()
+        self.notify = context.Queue()
+        self.process = context.Process(
+            target=_worker, name="ingest",
+            args=(self.book.name, self.book.codes, max_bars, interval, self.commands, self.notify),
+            daemon=True)
+        self.process.start()
+
+    @property
+    def codes(self) -> List[str]:
+        return self.book.codes
+
+    def poll(self, limit: int = 100) -> List[Tuple]:
+        events = []
+        for _ in range(limit):
+            try:
+                events.append(self.notify.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def reload(self):
+        self.commands.put(("reload",))
+
+    def set_interval(self, interval: float):
+        self.commands.put(("interval", interval))
+
+    def close(self, wait: bool = False):
+        """
+        停止子进程并释放共享内存
+
+        默认只发出停止命令，等待子进程退出（最多 2×JOIN_TIMEOUT）和释放共享内存在后台线程进行，
+        界面线程可以直接调用；wait=True 时阻塞到完成
+        """
+        if self.process.is_alive():
+            self.commands.put(("stop",))
+        if wait:
+            self._reap()
+        else:
+            threading.Thread(target=self._reap, name="ingest-close", daemon=True).start()
+
+    def _reap(self):
+        self.process.join(JOIN_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(JOIN_TIMEOUT)
+        self.book.close()
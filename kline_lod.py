@@ -0,0 +1,116 @@
+"""
+K线多分辨率（LOD）降采样
+按像素宽度把相邻K线合并为一根：开=首根开盘，高=最高，低=最低，收=末根收盘，量=求和
+预先构建逐级减半的金字塔，查询任意区间时只需在最接近的层级上做少量合并，
+多年的完整历史也能以交互速度绘制，且保留真实的最高/最低点
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# 每根K线最少占用的像素宽度
+MIN_PIXELS_PER_BAR = 3
+
+
+def aggregate_ohlcv(starts: np.ndarray, counts: np.ndarray, opens, highs, lows, closes, volumes,
+                    bucket_size: int) -> Dict[str, np.ndarray]:
+    """
+    将连续的 bucket_size 根K线合并为一根
+
+    Args:
+        starts/counts: 每根K线覆盖的原始K线起始序号和根数
+        bucket_size: 每组合并的根数（最后一组可能不足）
+
+    Returns:
+        合并后的 starts/counts/open/high/low/close/volume 数组
+    """
+    n = len(opens)
+    if n == 0 or bucket_size <= 1:
+        return {'starts': starts, 'counts': counts, 'open': opens, 'high': highs,
+                'low': lows, 'close': closes, 'volume': volumes}
+
+    edges = np.arange(0, n, bucket_size)
+    last = np.minimum(edges + bucket_size, n) - 1
+    return {
+        'starts': starts[edges],
+        'counts': np.add.reduceat(counts, edges),
+        'open': opens[edges],
+        # fmax/fmin 忽略 NaN，缺失数据不会吞掉整组的极值
+        'high': np.fmax.reduceat(highs, edges),
+        'low': np.fmin.reduceat(lows, edges),
+        'close': closes[last],
+        'volume': np.add.reduceat(np.nan_to_num(volumes), edges),
+    }
+
+
+class OHLCPyramid:
+    """K线金字塔：第0层为原始K线，之后每层按 factor 根合并"""
+
+    def __init__(self, opens, highs, lows, closes, volumes, factor: int = 2, min_bars: int = 32):
+        n = len(opens)
+        self.factor = factor
+        self.size = n
+
+        base = {
+            'starts': np.arange(n),
+            'counts': np.ones(n, dtype=np.int64),
+            'open': np.asarray(opens, dtype=float),
+            'high': np.asarray(highs, dtype=float),
+            'low': np.asarray(lows, dtype=float),
+            'close': np.asarray(closes, dtype=float),
+            'volume': np.asarray(volumes, dtype=float),
+        }
+        self.levels: List[Dict[str, np.ndarray]] = [base]
+        while len(self.levels[-1]['open']) > min_bars:
+            prev = self.levels[-1]
+            self.levels.append(aggregate_ohlcv(prev['starts'], prev['counts'], prev['open'], prev['high'],
+                                               prev['low'], prev['close'], prev['volume'], factor))
+
+    def query(self, start: int, end: int, max_bars: int) -> Dict[str, np.ndarray]:
+        """
+        查询原始序号 [start, end) 区间，返回不超过 max_bars 根的K线
+
+        返回的 x 为每根合并K线覆盖区间的中心（原始序号坐标），width 为对应宽度，
+        可直接传给 kline_renderer 的绘制函数
+        """
+        start = max(0, int(start))
+        end = min(self.size, int(end))
+        max_bars = max(1, int(max_bars))
+        span = max(0, end - start)
+
+        # 选择满足根数要求的最细层级
+        level_index = 0
+        while level_index + 1 < len(self.levels) and span / self.factor ** level_index > max_bars:
+            level_index += 1
+        level = self.levels[level_index]
+
+        # 截取覆盖区间的部分（按起始序号二分查找）
+        starts = level['starts']
+        lo = max(0, np.searchsorted(starts, start, side='right') - 1)
+        hi = np.searchsorted(starts, end, side='left')
+        part = {key: values[lo:hi] for key, values in level.items()}
+
+        # 层级粒度不够时在该层上再合并一次
+        count = len(part['open'])
+        if count > max_bars:
+            part = aggregate_ohlcv(part['starts'], part['counts'], part['open'], part['high'],
+                                   part['low'], part['close'], part['volume'],
+                                   int(np.ceil(count / max_bars)))
+
+        counts = part['counts'].astype(float)
+        part['x'] = part['starts'] + (counts - 1) / 2
+        part['width'] = counts * 0.8
+        part['level'] = level_index
+        return part
+
+
+def max_bars_for_axes(ax, min_pixels: int = MIN_PIXELS_PER_BAR, default: Optional[int] = 300) -> int:
+    """按坐标轴当前像素宽度计算可清晰显示的最大K线根数"""
+    try:
+        width = ax.get_window_extent().width
+    except Exception:
+        return default
+    if not width or width <= 1:
+        return default
+    return max(1, int(width / min_pixels))
@@ -0,0 +1,231 @@
+"""
+K线批量绘制
+影线、实体、十字星、成交量各用一个集合对象绘制，避免逐根K线创建 plot()/Rectangle
+"""
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import to_rgba_array
+
+# 中国习惯：红涨绿跌
+UP_COLOR = '#FF0000'
+DOWN_COLOR = '#00AA00'
+UP_EDGE_COLOR = '#CC0000'
+DOWN_EDGE_COLOR = '#008800'
+
+
+def ohlcv_arrays(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """从K线DataFrame提取 开/高/低/收/量 浮点数组，无法转换的值为 NaN"""
+    columns = ('开盘', '最高', '最低', '收盘', '成交量')
+    return tuple(
+        pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float) if col in df.columns
+        else np.full(len(df), np.nan)
+        for col in columns
+    )
+
+
+def _pick_colors(mask: np.ndarray, true_color, false_color) -> np.ndarray:
+    """按布尔掩码选择颜色，直接生成 RGBA 数组，避免逐个解析颜色字符串"""
+    palette = to_rgba_array([false_color, true_color])
+    return palette[mask.astype(np.intp)]
+
+
+def draw_candlesticks(ax, x: Sequence[float], opens, highs, lows, closes,
+                      width: float = 0.8,
+                      up_color: str = UP_COLOR, down_color: str = DOWN_COLOR,
+                      up_edge_color: Optional[str] = UP_EDGE_COLOR,
+                      down_edge_color: Optional[str] = DOWN_EDGE_COLOR,
+                      wick_color: str = 'black', wick_width: float = 1.0,
+                      alpha: float = 0.8, edge_width: float = 0.5,
+                      doji_threshold: Optional[float] = 0.01,
+                      autoscale: bool = True) -> Dict[str, object]:
+    """
+    批量绘制K线
+
+    Args:
+        ax: 目标坐标轴
+        x: 每根K线的横坐标
+        opens/highs/lows/closes: 价格数组
+        width: 实体宽度（横坐标单位），可为每根K线单独指定的数组
+        doji_threshold: 实体高度不超过该值时画成横线（十字星），None 表示始终画实体
+        autoscale: 是否按新数据更新坐标范围
+
+    Returns:
+        {'wicks': LineCollection, 'bodies': PolyCollection, 'dojis': LineCollection}
+    """
+    x = np.asarray(x, dtype=float)
+    o, h, l, c = (np.asarray(a, dtype=float) for a in (opens, highs, lows, closes))
+
+    half = np.broadcast_to(np.asarray(width, dtype=float) / 2, x.shape)
+
+    valid = ~(np.isnan(x) | np.isnan(o) | np.isnan(h) | np.isnan(l) | np.isnan(c))
+    x, o, h, l, c, half = x[valid], o[valid], h[valid], l[valid], c[valid], half[valid]
+
+    rising = c >= o
+
+    # 上下影线：每根一条竖线段
+    wick_segments = np.stack([np.column_stack([x, l]), np.column_stack([x, h])], axis=1)
+    wicks = LineCollection(wick_segments, colors=wick_color, linewidths=wick_width,
+                           capstyle='round')
+
+    # 实体：每根一个矩形
+    bottom = np.minimum(o, c)
+    top = np.maximum(o, c)
+    is_body = np.ones(len(x), dtype=bool) if doji_threshold is None else (top - bottom) > doji_threshold
+
+    bx, bb, bt, bh = x[is_body], bottom[is_body], top[is_body], half[is_body]
+    body_verts = np.stack([
+        np.column_stack([bx - bh, bb]),
+        np.column_stack([bx - bh, bt]),
+        np.column_stack([bx + bh, bt]),
+        np.column_stack([bx + bh, bb]),
+    ], axis=1)
+    face = _pick_colors(rising[is_body], up_color, down_color)
+    if up_edge_color is None or down_edge_color is None:
+        edge = face
+    else:
+        edge = _pick_colors(rising[is_body], up_edge_color, down_edge_color)
+    bodies = PolyCollection(body_verts, facecolors=face, edgecolors=edge,
+                            linewidths=edge_width, alpha=alpha)
+
+    # 十字星：开盘价≈收盘价，画一条横线
+    is_doji = ~is_body
+    dx, dc, dh = x[is_doji], c[is_doji], half[is_doji]
+    doji_segments = np.stack([np.column_stack([dx - dh, dc]), np.column_stack([dx + dh, dc])], axis=1)
+    dojis = LineCollection(doji_segments, colors=_pick_colors(rising[is_doji], up_color, down_color),
+                           linewidths=2)
+
+    # 数据范围直接由数组计算，比逐个路径求包围盒快得多
+    ax.add_collection(wicks, autolim=False)
+    ax.add_collection(bodies, autolim=False)
+    ax.add_collection(dojis, autolim=False)
+    if autoscale and len(x):
+        ax.update_datalim([((x - half).min(), l.min()), ((x + half).max(), h.max())])
+        ax.autoscale_view()
+
+    return {'wicks': wicks, 'bodies': bodies, 'dojis': dojis}
+
+
+def draw_volume(ax, x: Sequence[float], volumes, opens=None, closes=None,
+                width: float = 0.8, color: Optional[str] = None,
+                up_color: str = UP_COLOR, down_color: str = DOWN_COLOR,
+                alpha: float = 0.7, autoscale: bool = True) -> PolyCollection:
+    """
+    一次性绘制成交量柱（单个 PolyCollection，代替 ax.bar 的逐柱 Rectangle）
+
+    未指定 color 时按涨跌着色，无法判断涨跌的柱使用灰色；width 可为数组
+    """
+    x = np.asarray(x, dtype=float)
+    volumes = np.nan_to_num(np.asarray(volumes, dtype=float))
+
+    if color is not None:
+        colors = color
+    else:
+        o = np.asarray(opens, dtype=float)
+        c = np.asarray(closes, dtype=float)
+        colors = _pick_colors(c >= o, up_color, down_color)
+        colors[np.isnan(o) | np.isnan(c)] = to_rgba_array('#CCCCCC')[0]
+
+    half = np.broadcast_to(np.asarray(width, dtype=float) / 2, x.shape)
+    zeros = np.zeros(len(x))
+    verts = np.stack([
+        np.column_stack([x - half, zeros]),
+        np.column_stack([x - half, volumes]),
+        np.column_stack([x + half, volumes]),
+        np.column_stack([x + half, zeros]),
+    ], axis=1)
+    bars = PolyCollection(verts, facecolors=colors, edgecolors='none', alpha=alpha)
+
+    ax.add_collection(bars, autolim=False)
+    if autoscale and len(x):
+        ax.update_datalim([((x - half).min(), 0), ((x + half).max(), volumes.max())])
+        # 与 ax.bar 一致：成交量轴从 0 开始
+        ax.set_ylim(bottom=0, top=max(float(volumes.max()) * 1.05, 1.0))
+        ax.autoscale_view(scaley=False)
+    return bars
+
+
+def draw_kline_figure(fig, df: pd.DataFrame, title: Optional[str] = None) -> Tuple[object, object]:
+    """
+    在空白 Figure 上绘制完整的K线+成交量图（不依赖 Tk，可用于 Agg 批量出图）
+
+    Returns:
+        (K线坐标轴, 成交量坐标轴)
+    """
+    from matplotlib.ticker import FuncFormatter, MaxNLocator
+
+    fig.clear()
+    grid = fig.add_gridspec(4, 1, hspace=0.05)
+    ax_kline = fig.add_subplot(grid[:3, 0])
+    ax_volume = fig.add_subplot(grid[3, 0], sharex=ax_kline)
+
+    x = np.arange(len(df))
+    opens, highs, lows, closes, volumes = ohlcv_arrays(df)
+    draw_candlesticks(ax_kline, x, opens, highs, lows, closes)
+    draw_volume(ax_volume, x, volumes, opens, closes)
+
+    # 横坐标为K线序号，刻度标签映射为日期
+    dates = pd.to_datetime(df['日期'], errors='coerce').dt.strftime('%Y-%m-%d').tolist() if '日期' in df.columns else []
+
+    def format_date(value, pos=None):
+        index = int(round(value))
+        return dates[index] if 0 <= index < len(dates) and isinstance(dates[index], str) else ''
+
+    ax_volume.xaxis.set_major_locator(MaxNLocator(nbins=6, integer=True))
+    ax_volume.xaxis.set_major_formatter(FuncFormatter(format_date))
+    ax_volume.yaxis.set_major_formatter(FuncFormatter(lambda v, p: f'{v:,.0f}'))
+    ax_kline.tick_params(axis='x', labelbottom=False)
+    ax_kline.set_xlim(-1, max(len(df), 1))
+
+    if title:
+        ax_kline.set_title(title, fontsize=12, fontweight='bold')
+    ax_kline.grid(True, alpha=0.3, linestyle='--')
+    ax_volume.grid(True, alpha=0.3, linestyle='--')
+    return ax_kline, ax_volume
+
+
+class BlitManager:
+    """
+    局部刷新管理器
+
+    整图重绘（draw_event）后缓存背景，之后只恢复背景并重绘少量动画图元，
+    再 blit 到屏幕，单次更新开销与图表复杂度无关
+    """
+
+    def __init__(self, canvas, artists=()):
+        self.canvas = canvas
+        self.background = None
+        self.artists = []
+        for artist in artists:
+            self.add_artist(artist)
+        self.cid = canvas.mpl_connect('draw_event', self.on_draw)
+
+    def add_artist(self, artist):
+        """加入动画图元（不参与整图绘制，只在 blit 时绘制）"""
+        artist.set_animated(True)
+        self.artists.append(artist)
+
+    def clear_artists(self):
+        self.artists = []
+
+    def on_draw(self, event):
+        """整图重绘后缓存背景（也会在窗口缩放后触发）"""
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self.artists:
+            if artist.axes is not None:
+                self.canvas.figure.draw_artist(artist)
+
+    def update(self, bbox=None):
+        """恢复背景、重绘动画图元并 blit；尚无背景时退化为整图重绘"""
+        if self.background is None:
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self._draw_animated()
+        self.canvas.blit(bbox or self.canvas.figure.bbox)
@@ -0,0 +1,107 @@
+"""
+端到端延迟追踪
+记录每次行情更新从发起请求到画布刷新的各阶段时间点，用于状态栏实时显示和导出CSV时间线
+"""
+
+import csv
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# 阶段顺序：发起请求 -> 收到响应 -> 解析完成 -> 投递到Tk -> 绘制完成 -> 画布刷新
+STAGES = ("request_start", "response_received", "parse_done", "queued", "draw_done", "canvas_flushed")
+
+# 相邻阶段的显示名称
+SEGMENT_NAMES = {
+    "response_received": "网络",
+    "parse_done": "解析",
+    "queued": "投递",
+    "draw_done": "绘制",
+    "canvas_flushed": "刷新",
+}
+
+_seq = itertools.count(1)
+
+
+class UpdateTrace:
+    """单次更新的时间线"""
+
+    def __init__(self, symbol: str, source: str = "tencent"):
+        self.seq = next(_seq)
+        self.symbol = symbol
+        self.source = source
+        self.started_at = datetime.now()
+        self.stamps: Dict[str, float] = {}
+
+    def mark(self, stage: str):
+        """记录阶段时间点（重复标记以首次为准）"""
+        self.stamps.setdefault(stage, time.perf_counter())
+
+    def segments(self) -> Dict[str, float]:
+        """相邻已记录阶段之间的耗时（毫秒），键为后一个阶段"""
+        result = {}
+        prev = None
+        for stage in STAGES:
+            if stage not in self.stamps:
+                continue
+            if prev is not None:
+                result[stage] = (self.stamps[stage] - self.stamps[prev]) * 1000
+            prev = stage
+        return result
+
+    def total_ms(self) -> float:
+        marked = [self.stamps[s] for s in STAGES if s in self.stamps]
+        return (marked[-1] - marked[0]) * 1000 if len(marked) > 1 else 0.0
+
+    def format_status(self) -> str:
+        """状态栏显示文本，例如: 网络 85ms | 解析 1ms | 投递 40ms | 绘制 120ms | 刷新 30ms | 合计 276ms"""
+        parts = [f"{SEGMENT_NAMES[s]} {ms:.0f}ms" for s, ms in self.segments().items()]
+        parts.append(f"合计 {self.total_ms():.0f}ms")
+        if self.source != "tencent":
+            parts.append(f"({self.source})")
+        return " | ".join(parts)
+
+
+class TraceRecorder:
+    """保存最近的更新时间线，支持导出CSV"""
+
+    def __init__(self, maxlen: int = 2000):
+        self._lock = threading.Lock()
+        self._traces = deque(maxlen=maxlen)
+
+    def add(self, trace: UpdateTrace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def latest(self) -> Optional[UpdateTrace]:
+        with self._lock:
+            return self._traces[-1] if self._traces else None
+
+    def traces(self) -> List[UpdateTrace]:
+        with self._lock:
+            return list(self._traces)
+
+    def export_csv(self, path: str) -> int:
+        """导出时间线CSV：每行一次更新，包含各阶段相对起点的毫秒数和阶段耗时，返回行数"""
+        traces = self.traces()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["seq", "symbol", "source", "start_time"]
+                            + [f"{s}_ms" for s in STAGES]
+                            + [f"{s}_delta_ms" for s in STAGES[1:]]
+                            + ["total_ms"])
+            for trace in traces:
+                origin = trace.stamps.get(STAGES[0])
+                offsets = [
+                    f"{(trace.stamps[s] - origin) * 1000:.3f}" if origin is not None and s in trace.stamps else ""
+                    for s in STAGES
+                ]
+                segments = trace.segments()
+                deltas = [f"{segments[s]:.3f}" if s in segments else "" for s in STAGES[1:]]
+                writer.writerow([trace.seq, trace.symbol, trace.source,
+                                 trace.started_at.isoformat(timespec="milliseconds")]
+                                + offsets + deltas + [f"{trace.total_ms():.3f}"])
+        return len(traces)
@@ -0,0 +1,140 @@
+"""
+本地K线存储
+每只股票一个CSV文件（data/bars/{代码}.csv），按日期去重合并，
+图表向左翻页时优先从这里读取更早的K线，缺失部分再走网络；
+采集进程（main.py --daemon）运行时各界面可以直接读取这里的最新K线
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+
+from config import DATA_DIR
+
+BARS_DIR = os.path.join(DATA_DIR, "bars")
+# 采集进程的检查点，记录每只股票最近一次由采集进程写入的时间
+CHECKPOINT_FILE = os.path.join(DATA_DIR, "collector_state.json")
+# 盘中采集进程在这么多秒内采集过即视为最新（采集进程默认每 60 秒刷新一次）
+FRESH_SECONDS = 120
+
+
+class LocalBarStore:
+    """按股票代码保存日K线"""
+
+    def __init__(self, root: str = BARS_DIR, checkpoint_file: str = CHECKPOINT_FILE):
+        self.root = root
+        self.checkpoint_file = checkpoint_file
+        self._lock = threading.Lock()
+        # (检查点文件修改时间, 各股票的检查点记录)
+        self._checkpoint = (None, {})
+
+    def _path(self, stock_code: str) -> str:
+        return os.path.join(self.root, f"{stock_code}.csv")
+
+    def load(self, stock_code: str, end_date: Optional[str] = None,
+             limit: Optional[int] = None) -> pd.DataFrame:
+        """
+        读取本地K线（按日期升序）
+
+        Args:
+            end_date: 只返回早于该日期（不含）的K线
+            limit: 只返回最后 limit 根
+        """
+        path = self._path(stock_code)
+        with self._lock:
+            if not os.path.exists(path):
+                return pd.DataFrame()
+            df = pd.read_csv(path, dtype={'股票代码': str})
+
+        if end_date is not None and not df.empty:
+            df = df[df['日期'] < _normalize_date(end_date)]
+        if limit is not None:
+            df = df.tail(limit)
+        return df.reset_index(drop=True)
+
+    def load_recent(self, stock_code: str, limit: Optional[int] = None,
+                    max_age: float = FRESH_SECONDS, metrics=None) -> Optional[pd.DataFrame]:
+        """
+        本地K线足够新时直接返回，否则返回 None（由调用方走网络）
+
+        是否足够新看采集进程检查点中的写入时间，而不是文件修改时间（界面翻页加载历史时也会写入同一文件）：
+        盘中 max_age 秒内采集过；非交易时段在最近一个交易时段结束之后采集过
+        """
+        from trading_calendar import get_calendar
+
+        fresh = False
+        updated = self.collected_at(stock_code)
+        if updated is not None:
+            now = datetime.now()
+            calendar = get_calendar()
+            if calendar.phase(now) in ("auction", "continuous"):
+                fresh = (now - updated).total_seconds() <= max_age
+            else:
+                fresh = updated >= _last_session_end(calendar, now)
+
+        df = self.load(stock_code, limit=limit) if fresh else None
+        hit = df is not None and not df.empty
+        if metrics is not None:
+            metrics.record_cache("local_bars", hit)
+        return df if hit else None
+
+    def collected_at(self, stock_code: str) -> Optional[datetime]:
+        """采集进程最近一次写入该股票的时间，没有记录时返回 None"""
+        try:
+            modified = os.path.getmtime(self.checkpoint_file)
+        except OSError:
+            return None
+        if self._checkpoint[0] != modified:
+            try:
+                with open(self.checkpoint_file, encoding="utf-8") as f:
+                    codes = json.load(f).get("codes", {})
+            except (OSError, ValueError):
+                codes = {}
+            self._checkpoint = (modified, codes)
+        try:
+            return datetime.fromisoformat(self._checkpoint[1][stock_code]["updated"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def merge(self, stock_code: str, df: pd.DataFrame) -> int:
+        """合并新K线到本地文件（同一日期以新数据为准），返回合并后的总根数"""
+        if df is None or df.empty or '日期' not in df.columns:
+            return 0
+
+        incoming = df.copy()
+        incoming['日期'] = pd.to_datetime(incoming['日期']).dt.strftime('%Y-%m-%d')
+        path = self._path(stock_code)
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            if os.path.exists(path):
+                existing = pd.read_csv(path, dtype={'股票代码': str})
+                incoming = pd.concat([existing, incoming], ignore_index=True)
+            merged = (incoming.drop_duplicates(subset='日期', keep='last')
+                      .sort_values('日期')
+                      .reset_index(drop=True))
+            # 先写临时文件再替换，采集进程写入时其他进程不会读到半个文件
+            tmp = f"{path}.{os.getpid()}.tmp"
+            merged.to_csv(tmp, index=False, encoding='utf-8')
+            os.replace(tmp, path)
+        return len(merged)
+
+
+def _last_session_end(calendar, now: datetime) -> datetime:
+    """最近一个已结束的交易时段的结束时间（午休时为上午收盘，收盘后为当日收盘）"""
+    from trading_calendar import SESSIONS
+
+    if calendar.is_trading_day(now.date()):
+        ends = [datetime.combine(now.date(), end) for _, end, _ in SESSIONS]
+        ended = [end for end in ends if end <= now]
+        if ended:
+            return ended[-1]
+    return calendar.last_close(now)
+
+
+def _normalize_date(value) -> str:
+    """统一为 YYYY-MM-DD 字符串，便于与文件中的日期直接比较"""
+    return pd.to_datetime(value).strftime('%Y-%m-%d')
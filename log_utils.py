@@ -0,0 +1,165 @@
+"""
+日志工具
+进程级一次性配置的异步日志管道：调用线程只负责入队，文件/控制台写入由后台 QueueListener 完成
+- 文件输出为结构化 JSON 行，控制台保持可读文本
+- 逐只股票的成功日志按时间窗口聚合输出
+- 同类告警按时间窗口限流，被抑制的条数附在下一条输出中
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from config import LOG_DIR
+
+# 成功日志聚合输出间隔（秒）
+SUCCESS_SUMMARY_INTERVAL = 30
+# 告警限流：每个时间窗口（秒）内同类告警最多输出的条数
+WARNING_RATE_LIMIT = 5
+WARNING_RATE_WINDOW = 60
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_setup_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_aggregators = []
+
+
+class JsonFormatter(logging.Formatter):
+    """将日志记录格式化为单行 JSON，extra 字段原样保留"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """WARNING 及以上级别按 (logger, 消息模板) 限流"""
+
+    def __init__(self, limit: int = WARNING_RATE_LIMIT, window: float = WARNING_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        # key -> [窗口开始时间, 窗口内已输出条数, 被抑制条数]
+        self._state: Dict[Tuple[str, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._state[key] = [now, 1, 0]
+            elif state[1] < self.limit:
+                state[1] += 1
+                suppressed = 0
+            else:
+                state[2] += 1
+                return False
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class SuccessAggregator:
+    """按类别聚合成功日志，每个时间窗口只输出一条汇总"""
+
+    def __init__(self, logger: logging.Logger, interval: float = SUCCESS_SUMMARY_INTERVAL):
+        self.logger = logger
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._symbols: Dict[str, set] = defaultdict(set)
+        self._last_flush = time.monotonic()
+        _aggregators.append(self)
+
+    def record(self, kind: str, symbol: str):
+        """记录一次成功，到达聚合间隔时输出汇总"""
+        with self._lock:
+            self._counts[kind] += 1
+            self._symbols[kind].add(symbol)
+            if time.monotonic() - self._last_flush < self.interval:
+                return
+            summary = self._drain()
+        self._emit(summary)
+
+    def flush(self):
+        """立即输出当前窗口的汇总"""
+        with self._lock:
+            summary = self._drain()
+        self._emit(summary)
+
+    def _drain(self) -> Dict[str, Tuple[int, int]]:
+        summary = {kind: (n, len(self._symbols[kind])) for kind, n in self._counts.items()}
+        self._counts.clear()
+        self._symbols.clear()
+        self._last_flush = time.monotonic()
+        return summary
+
+    def _emit(self, summary: Dict[str, Tuple[int, int]]):
+        for kind, (count, symbols) in summary.items():
+            self.logger.info("成功获取%s %d 次（%d 只股票）", kind, count, symbols,
+                             extra={"kind": kind, "count": count, "symbols": symbols})
+
+
+def setup_logging(level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """配置进程级异步日志管道，重复调用直接返回已有的监听器"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        os.makedirs(LOG_DIR, exist_ok=True)
+
+        file_handler = logging.FileHandler(f'{LOG_DIR}/stock_fetcher.log', encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(RateLimitFilter())
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler,
+                                                   respect_handler_level=True)
+        _listener.start()
+        atexit.register(_shutdown)
+        return _listener
+
+
+def _shutdown():
+    """进程退出时输出未满窗口的汇总，并等待队列中的日志写完"""
+    for aggregator in _aggregators:
+        aggregator.flush()
+    if _listener is not None:
+        _listener.stop()
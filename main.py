@@ -5,32 +5,69 @@
 
 import argparse
 import sys
+import time
 from datetime import datetime
-from data_fetcher import StockDataFetcher
 from config import STOCK_CODES
+from metrics import start_metrics_server
+import profiling
 
 def main():
     """主程序入口"""
     parser = argparse.ArgumentParser(description='股票数据获取工具')
-    parser.add_argument('--mode', choices=['realtime', 'historical', 'both'], 
-                       default='realtime', help='数据获取模式')
+    parser.add_argument('--mode', choices=['realtime', 'historical', 'both', 'render'], 
+                       default='realtime', help='数据获取模式（render=批量生成K线图）')
     parser.add_argument('--codes', nargs='*', 
                        help='股票代码列表（空格分隔），不指定则使用配置文件中的默认列表')
     parser.add_argument('--start', help='历史数据开始日期 (YYYYMMDD)')
     parser.add_argument('--end', help='历史数据结束日期 (YYYYMMDD)')
     parser.add_argument('--save', action='store_true', help='保存数据到文件')
+    parser.add_argument('--stats', action='store_true', help='结束时输出各数据源的延迟/成功率/降级统计')
+    parser.add_argument('--profile', choices=profiling.PROFILE_MODES,
+                       help='开启性能剖析: timing=关键路径耗时, sample=栈采样火焰图, cprofile=cProfile')
+    parser.add_argument('--metrics-port', type=int,
+                       help='在本地该端口提供 Prometheus 指标接口 (http://127.0.0.1:PORT/metrics)')
+    parser.add_argument('--format', choices=['png', 'svg'], default='png', help='render 模式的图片格式')
+    parser.add_argument('--out', help='render 模式的输出目录（默认 data/charts/<时间>）')
+    parser.add_argument('--workers', type=int, help='render 模式的进程数（默认 CPU 核数）；daemon 模式的采集线程数（默认 4）')
+    parser.add_argument('--bars', type=int, default=120, help='render 模式每张图的K线根数')
+    parser.add_argument('--daemon', action='store_true',
+                       help='后台采集模式：按交易时段持续把日K线写入本地存储 data/bars/')
+    parser.add_argument('--universe', choices=['watchlist', 'all'], default='watchlist',
+                       help='daemon 模式的股票范围: watchlist=--codes 或配置文件列表, all=全市场')
+    parser.add_argument('--interval', type=float, default=60, help='daemon 模式盘中刷新间隔（秒）')
+    parser.add_argument('--gateway-port', type=int,
+                       help='在本地该端口启动行情网关，多个界面共用一路上游行情 (见 quote_gateway.py)')
     
     args = parser.parse_args()
     
+    if args.profile:
+        profiling.start_session(args.profile)
+    
+    if args.metrics_port:
+        start_metrics_server(port=args.metrics_port)
+        print(f"📡 指标接口: http://127.0.0.1:{args.metrics_port}/metrics")
+    
     # 确定要获取的股票代码
     stock_codes = args.codes if args.codes else STOCK_CODES
     
+    if args.daemon:
+        sys.exit(run_daemon(stock_codes, args))
+    
+    if args.gateway_port:
+        run_gateway(args.gateway_port)
+        return
+    
+    if args.mode == 'render':
+        render_charts(stock_codes, args)
+        return
+    
     print(f"开始获取股票数据...")
     print(f"目标股票: {', '.join(stock_codes)}")
     print(f"获取模式: {args.mode}")
     print("-" * 50)
     
-    # 初始化数据获取器
+    # 初始化数据获取器（pandas 等导入较慢，无参数启动界面时不导入）
+    from data_fetcher import StockDataFetcher
     fetcher = StockDataFetcher()
     
     if args.mode in ['realtime', 'both']:
@@ -42,7 +79,7 @@ def main():
             print(f"{'股票代码':<8} {'股票名称':<12} {'最新价':<10} {'涨跌幅':<10} {'成交量':<15}")
             print("-" * 65)
             for code, data in realtime_data.items():
-                volume_str = f"{data['volume']:,.0f}"
+                volume_str = f"{data.get('volume', 0):,.0f}"
                 change_str = f"{data['change']:+.2f}%"
                 print(f"{code:<8} {data['name']:<12} {data['price']:<10.2f} {change_str:<10} {volume_str:<15}")
                 
@@ -71,6 +108,60 @@ def main():
             print("❌ 未获取到历史数据")
     
     print("\n✅ 数据获取完成！")
+    
+    if args.stats:
+        print()
+        print(fetcher.metrics.format_report())
+    
+    if args.metrics_port:
+        print("\n指标接口保持运行中，按 Ctrl+C 退出")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+def render_charts(stock_codes, args):
+    """批量生成K线图和汇总页"""
+    from batch_render import render_watchlist
+
+    print(f"开始批量出图: {len(stock_codes)} 只股票, 格式 {args.format}")
+    
+    def progress(done, total, result):
+        status = f"✅ {result['file']}" if result.get('file') else f"❌ {result.get('error')}"
+        print(f"[{done}/{total}] {result['code']} {status} ({result['seconds']:.2f}s)")
+    
+    summary = render_watchlist(stock_codes, out_dir=args.out, fmt=args.format, bars=args.bars,
+                               workers=args.workers, progress=progress)
+    ok = sum(1 for r in summary['results'] if r.get('file'))
+    print(f"\n✅ 出图完成: 成功 {ok}/{len(stock_codes)}，耗时 {summary['seconds']:.1f} 秒")
+    print(f"汇总页: {summary['index']}")
+
+def run_daemon(stock_codes, args):
+    """后台采集，直到 Ctrl+C 或 SIGTERM"""
+    from collector import DEFAULT_WORKERS, load_universe, run_daemon as run_collector
+
+    if args.universe == 'all':
+        stock_codes = load_universe()
+        if not stock_codes:
+            print("❌ 未获取到全市场股票列表")
+            return 1
+    return run_collector(stock_codes, interval=args.interval, workers=args.workers or DEFAULT_WORKERS)
+
+def run_gateway(port):
+    """前台运行行情网关，直到 Ctrl+C"""
+    from quote_gateway import start_gateway
+
+    gateway = start_gateway(port=port)
+    print(f"📡 行情网关: http://127.0.0.1:{port}  (SSE: /stream?codes=600000,000001)")
+    print("按 Ctrl+C 退出")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gateway.close()
 
 def demo():
     """演示函数，展示各种功能的使用方法"""
@@ -78,6 +169,7 @@ def demo():
     print("=" * 50)
     
     # 初始化数据获取器
+    from data_fetcher import StockDataFetcher
     fetcher = StockDataFetcher()
     
     # 演示1: 获取单只股票实时价格（网络环境可能不支持）
@@ -111,6 +203,11 @@ def demo():
         print(display_data.to_string(index=False, justify='center'))
 
 if __name__ == "__main__":
+    # 仅带 --profile 参数时同样启动统一 UI，并开启剖析
+    if len(sys.argv) == 3 and sys.argv[1] == '--profile':
+        profiling.start_session(sys.argv[2])
+        del sys.argv[1:]
+    
     if len(sys.argv) > 1:
         # 带参数：走命令行数据获取流程
         main()
@@ -0,0 +1,213 @@
+"""
+数据获取层指标统计
+记录各数据源接口的延迟分布、传输字节数、成功/失败/降级次数与缓存命中
+支持文本报告、进程内查询和本地 Prometheus 文本格式接口
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# Prometheus 直方图桶边界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 计算分位数时保留的最近样本数
+RESERVOIR_SIZE = 2048
+
+
+class LatencyHistogram:
+    """延迟直方图：累计分桶计数 + 最近样本用于分位数"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.samples = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def percentile(self, q: float) -> float:
+        """返回最近样本的分位数（秒），q 取值 0-100"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def cumulative_buckets(self) -> List[int]:
+        result = []
+        running = 0
+        for n in self.buckets:
+            running += n
+            result.append(running)
+        return result
+
+
+class MetricsRegistry:
+    """线程安全的指标注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清空全部指标"""
+        with self._lock:
+            self.started_at = time.time()
+            self.latency: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+            self.bytes: Dict[str, int] = defaultdict(int)
+            self.success: Dict[str, int] = defaultdict(int)
+            self.errors: Dict[str, int] = defaultdict(int)
+            self.fallbacks: Dict[str, int] = defaultdict(int)
+            self.cache_hits: Dict[str, int] = defaultdict(int)
+            self.cache_misses: Dict[str, int] = defaultdict(int)
+
+    def record_request(self, endpoint: str, seconds: float, nbytes: int = 0, ok: bool = True):
+        """记录一次接口请求"""
+        with self._lock:
+            self.latency[endpoint].observe(seconds)
+            self.bytes[endpoint] += nbytes
+            if ok:
+                self.success[endpoint] += 1
+            else:
+                self.errors[endpoint] += 1
+
+    def record_fallback(self, operation: str):
+        """记录一次主数据源失败后切换到备用数据源"""
+        with self._lock:
+            self.fallbacks[operation] += 1
+
+    def record_cache(self, name: str, hit: bool):
+        """记录一次缓存查询"""
+        with self._lock:
+            if hit:
+                self.cache_hits[name] += 1
+            else:
+                self.cache_misses[name] += 1
+
+    def snapshot(self) -> Dict:
+        """返回当前指标快照（延迟单位：毫秒）"""
+        with self._lock:
+            endpoints = {}
+            for name in sorted(set(self.latency) | set(self.errors)):
+                hist = self.latency[name]
+                endpoints[name] = {
+                    'count': hist.count,
+                    'success': self.success[name],
+                    'errors': self.errors[name],
+                    'bytes': self.bytes[name],
+                    'avg_ms': hist.total / hist.count * 1000 if hist.count else 0.0,
+                    'p50_ms': hist.percentile(50) * 1000,
+                    'p95_ms': hist.percentile(95) * 1000,
+                    'p99_ms': hist.percentile(99) * 1000,
+                }
+            caches = {}
+            for name in sorted(set(self.cache_hits) | set(self.cache_misses)):
+                hits, misses = self.cache_hits[name], self.cache_misses[name]
+                caches[name] = {
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+                }
+            return {
+                'uptime_seconds': time.time() - self.started_at,
+                'endpoints': endpoints,
+                'fallbacks': dict(self.fallbacks),
+                'caches': caches,
+            }
+
+    def format_report(self) -> str:
+        """格式化为终端可读的统计报告"""
+        snap = self.snapshot()
+        lines = [f"📊 数据获取统计 (运行 {snap['uptime_seconds']:.1f} 秒)", "-" * 96]
+        lines.append(f"{'接口':<18} {'请求':>6} {'成功':>6} {'失败':>6} {'字节':>12} "
+                     f"{'平均ms':>9} {'P50ms':>9} {'P95ms':>9} {'P99ms':>9}")
+        lines.append("-" * 96)
+        for name, ep in snap['endpoints'].items():
+            lines.append(f"{name:<18} {ep['count']:>6} {ep['success']:>6} {ep['errors']:>6} {ep['bytes']:>12,} "
+                         f"{ep['avg_ms']:>9.1f} {ep['p50_ms']:>9.1f} {ep['p95_ms']:>9.1f} {ep['p99_ms']:>9.1f}")
+        if not snap['endpoints']:
+            lines.append("  暂无请求记录")
+
+        lines.append("")
+        lines.append("降级次数（腾讯 -> AkShare）:")
+        if snap['fallbacks']:
+            for op, n in sorted(snap['fallbacks'].items()):
+                lines.append(f"  {op:<20} {n}")
+        else:
+            lines.append("  无")
+
+        lines.append("缓存命中:")
+        if snap['caches']:
+            for name, c in snap['caches'].items():
+                lines.append(f"  {name:<20} 命中 {c['hits']} / 未命中 {c['misses']} ({c['hit_rate']:.1%})")
+        else:
+            lines.append("  无")
+        return "\n".join(lines)
+
+    def to_prometheus(self) -> str:
+        """导出 Prometheus 文本格式"""
+        with self._lock:
+            out = [
+                "# HELP stock_fetch_latency_seconds 数据源接口请求延迟",
+                "# TYPE stock_fetch_latency_seconds histogram",
+            ]
+            for name, hist in sorted(self.latency.items()):
+                for bound, n in zip(LATENCY_BUCKETS, hist.cumulative_buckets()):
+                    out.append(f'stock_fetch_latency_seconds_bucket{{endpoint="{name}",le="{bound}"}} {n}')
+                out.append(f'stock_fetch_latency_seconds_bucket{{endpoint="{name}",le="+Inf"}} {hist.count}')
+                out.append(f'stock_fetch_latency_seconds_sum{{endpoint="{name}"}} {hist.total:.6f}')
+                out.append(f'stock_fetch_latency_seconds_count{{endpoint="{name}"}} {hist.count}')
+
+            counters = [
+                ("stock_fetch_bytes_total", "接口响应字节数", "endpoint", self.bytes),
+                ("stock_fetch_success_total", "接口成功次数", "endpoint", self.success),
+                ("stock_fetch_errors_total", "接口失败次数", "endpoint", self.errors),
+                ("stock_fetch_fallback_total", "降级到备用数据源次数", "operation", self.fallbacks),
+                ("stock_fetch_cache_hits_total", "缓存命中次数", "cache", self.cache_hits),
+                ("stock_fetch_cache_misses_total", "缓存未命中次数", "cache", self.cache_misses),
+            ]
+            for metric, help_text, label, values in counters:
+                out.append(f"# HELP {metric} {help_text}")
+                out.append(f"# TYPE {metric} counter")
+                for key, n in sorted(values.items()):
+                    out.append(f'{metric}{{{label}="{key}"}} {n}')
+            return "\n".join(out) + "\n"
+
+
+# 进程级默认注册表，所有 StockDataFetcher 实例共享
+REGISTRY = MetricsRegistry()
+
+
+def start_metrics_server(registry: Optional[MetricsRegistry] = None,
+                         host: str = "127.0.0.1", port: int = 9108) -> ThreadingHTTPServer:
+    """在后台线程启动本地 Prometheus 指标接口（GET /metrics）"""
+    registry = registry or REGISTRY
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,109 @@
+"""
+后台线程渲染图表
+图形在工作线程中用 Agg 绘制并光栅化为 RGBA 缓冲区，Tk 主线程只负责把成品图像贴到 PhotoImage，
+重绘再重也不会卡住输入、切换页签和行情处理
+"""
+
+import threading
+from typing import Callable, Optional
+
+import tkinter as tk
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+try:
+    from PIL import Image, ImageTk
+except ImportError:  # Pillow 未安装或缺少 Tk 支持时调用方退回 FigureCanvasTkAgg
+    Image = ImageTk = None
+
+
+def is_available() -> bool:
+    """当前环境是否支持后台渲染"""
+    return ImageTk is not None
+
+
+class OffscreenChart:
+    """
+    持有一个只在工作线程中绘制的 Figure，显示在 tk.Canvas 上（图像不会反过来撑大控件）
+
+    render() 可在任意线程调用；工作线程忙时新请求覆盖尚未开始的旧请求，
+    成品图像经 RenderScheduler 投递到主线程，同样只显示最新一帧
+    """
+
+    def __init__(self, parent, figure, scheduler, key: str = "offscreen_chart"):
+        if not is_available():
+            raise RuntimeError("后台渲染需要 Pillow (PIL.ImageTk)")
+
+        self.figure = figure
+        self.canvas = FigureCanvasAgg(figure)
+        self.scheduler = scheduler
+        self.key = key
+
+        self.widget = tk.Canvas(parent, bg="white", highlightthickness=0)
+        self.widget.pack(fill="both", expand=True)
+        self.widget.bind("<Configure>", self._on_configure)
+        self._image_id = self.widget.create_image(0, 0, anchor="nw")
+        self._photo = None
+
+        self._cond = threading.Condition()
+        self._pending = None
+        self._last_job = None
+        self._size = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="offscreen-render", daemon=True)
+        self._thread.start()
+
+    def render(self, draw_func: Callable, *args, on_done: Optional[Callable[[], None]] = None):
+        """请求重绘：工作线程中执行 draw_func(*args) 后光栅化，显示后在主线程调用 on_done()"""
+        with self._cond:
+            self._pending = (draw_func, args, on_done)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _on_configure(self, event):
+        """控件尺寸变化：按新尺寸重绘上一帧"""
+        size = (event.width, event.height)
+        if size == self._size or event.width <= 1 or event.height <= 1:
+            return
+        with self._cond:
+            self._size = size
+            if self._pending is None and self._last_job is not None:
+                self._pending = self._last_job
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                job, self._pending = self._pending, None
+                size = self._size
+
+            draw_func, args, on_done = job
+            try:
+                if size is not None:
+                    dpi = self.figure.dpi
+                    self.figure.set_size_inches(size[0] / dpi, size[1] / dpi, forward=False)
+                draw_func(*args)
+                self.canvas.draw()
+                width, height = self.canvas.get_width_height()
+                rgba = bytes(self.canvas.buffer_rgba())
+            except Exception as e:
+                print(f"后台渲染错误: {e}")
+                continue
+
+            self._last_job = (draw_func, args, None)
+            self.scheduler.mark_dirty(self.key, self._present, rgba, width, height, on_done)
+
+    def _present(self, rgba: bytes, width: int, height: int, on_done):
+        """主线程：把光栅化结果贴到 PhotoImage"""
+        image = Image.frombuffer("RGBA", (width, height), rgba, "raw", "RGBA", 0, 1)
+        self._photo = ImageTk.PhotoImage(image)
+        self.widget.itemconfigure(self._image_id, image=self._photo)
+        if on_done is not None:
+            on_done()
@@ -0,0 +1,278 @@
+"""
+价格流水控件
+逐笔价格写入固定容量的环形缓冲区，界面只绘制可见的几行：
+- 新数据可批量写入，每帧最多刷新一次，突发行情下每帧开销与积压笔数无关
+- 行图元预先创建并复用，刷新和滚动只改文字，不做列表插入删除
+- 可按股票代码、涨跌方向、最小涨跌幅过滤
+"""
+
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import tkinter as tk
+from tkinter import ttk
+import tkinter.font as tkfont
+
+from render_scheduler import RenderScheduler
+
+DEFAULT_CAPACITY = 2000
+UP_COLOR = "red"
+DOWN_COLOR = "green"
+FLAT_COLOR = "black"
+
+# 过滤方向
+DIRECTIONS = ("全部", "上涨", "下跌")
+
+
+def _timestamp(when) -> float:
+    if when is None:
+        return datetime.now().timestamp()
+    if isinstance(when, datetime):
+        return when.timestamp()
+    return float(when)
+
+
+class PriceRingBuffer:
+    """
+    固定容量的价格环形缓冲区，写满后覆盖最旧记录；可在任意线程写入
+
+    每条记录带一个递增序号，界面用它在新数据到来时保持滚动位置
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.seqs = np.full(capacity, -1, dtype=np.int64)
+        self.times = np.zeros(capacity)
+        self.prices = np.zeros(capacity)
+        self.changes = np.zeros(capacity)
+        self.volumes = np.zeros(capacity)
+        self.codes = np.empty(capacity, dtype=object)
+        self.head = 0
+        self.count = 0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, price: float, change_percent: float, volume: float = 0.0,
+               code: str = "", when=None):
+        self.extend([(when, price, change_percent, volume, code)])
+
+    def extend(self, records: Iterable[Tuple]) -> int:
+        """批量写入 (时间, 价格, 涨跌幅%, 成交量, 代码)，时间可为 datetime、时间戳或 None（当前时间）"""
+        records = list(records)
+        n = len(records)
+        if not n:
+            return 0
+        # 一次写入超过容量时只保留最新的部分，序号仍按全部笔数递增
+        kept = records[-self.capacity:]
+        whens, prices, changes, volumes, codes = zip(*kept)
+
+        with self._lock:
+            first_seq = self.total + n - len(kept)
+            idx = (self.head + np.arange(len(kept))) % self.capacity
+            self.seqs[idx] = np.arange(first_seq, first_seq + len(kept))
+            self.times[idx] = [_timestamp(w) for w in whens]
+            self.prices[idx] = prices
+            self.changes[idx] = changes
+            self.volumes[idx] = [v or 0 for v in volumes]
+            self.codes[idx] = codes
+            self.head = (self.head + len(kept)) % self.capacity
+            self.count = min(self.capacity, self.count + len(kept))
+            self.total += n
+        return n
+
+    def clear(self):
+        with self._lock:
+            self.seqs[:] = -1
+            self.head = 0
+            self.count = 0
+
+    def select(self, code: Optional[str] = None, direction: str = "全部",
+               min_change: float = 0.0) -> np.ndarray:
+        """按条件筛选，返回从新到旧的缓冲区下标（开销只与容量有关）"""
+        with self._lock:
+            idx = (self.head - 1 - np.arange(self.count)) % self.capacity
+        mask = None
+        if code:
+            mask = self.codes[idx] == code
+        if direction != "全部" or min_change > 0:
+            changes = self.changes[idx]
+            cond = np.abs(changes) >= min_change
+            if direction == "上涨":
+                cond &= changes > 0
+            elif direction == "下跌":
+                cond &= changes < 0
+            mask = cond if mask is None else mask & cond
+        return idx if mask is None else idx[mask]
+
+    def format_row(self, i: int, show_code: bool = False) -> Tuple[str, str]:
+        """单条记录的显示文字和颜色"""
+        change = self.changes[i]
+        text = (f"{datetime.fromtimestamp(self.times[i]).strftime('%H:%M:%S')} "
+                f"{self.prices[i]:>8.2f} {change:+6.2f}%")
+        if show_code:
+            text = f"{self.codes[i]:<7}{text}"
+        color = UP_COLOR if change > 0 else DOWN_COLOR if change < 0 else FLAT_COLOR
+        return text, color
+
+
+class PriceStreamView:
+    """
+    虚拟化的价格流水列表（最新在上），替代逐条 insert/delete 的 Listbox
+
+    push()/extend() 可在任意线程调用，刷新经 RenderScheduler 合并到下一帧；
+    视图停在顶端时跟随最新记录，向下滚动后新数据到来画面保持不动
+    """
+
+    def __init__(self, parent, capacity: int = DEFAULT_CAPACITY, height: int = 12,
+                 font=("Courier", 9), scheduler: Optional[RenderScheduler] = None,
+                 key: str = "price_stream", show_code: bool = False, show_filter: bool = False):
+        self.buffer = PriceRingBuffer(capacity)
+        self.show_code = show_code
+        self.key = key
+
+        self.code_filter = None
+        self.direction = "全部"
+        self.min_change = 0.0
+
+        # 顶行的记录序号，None 表示跟随最新
+        self._anchor = None
+        self._start = 0
+        self._matches = np.empty(0, dtype=np.int64)
+        self._rows: List[int] = []
+        self._row_cache: List[Tuple[str, str]] = []
+
+        self.frame = ttk.Frame(parent)
+        if show_filter:
+            self.create_filter_bar()
+
+        body = ttk.Frame(self.frame)
+        body.pack(fill="both", expand=True)
+        self.font = tkfont.Font(font=font)
+        self.row_height = self.font.metrics("linespace") + 1
+        self.canvas = tk.Canvas(body, height=height * self.row_height, bg="white",
+                                highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(body, orient="vertical", command=self.on_scrollbar)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.canvas.bind("<Configure>", lambda e: self.refresh())
+        self.canvas.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1))
+        self.canvas.bind("<Button-4>", lambda e: self.scroll(-1))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll(1))
+
+        self.scheduler = scheduler or RenderScheduler(self.canvas)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def create_filter_bar(self):
+        """方向和最小涨跌幅过滤"""
+        bar = ttk.Frame(self.frame)
+        bar.pack(fill="x", pady=(0, 3))
+
+        self.direction_var = tk.StringVar(value=self.direction)
+        direction_box = ttk.Combobox(bar, textvariable=self.direction_var, values=DIRECTIONS,
+                                     width=5, state="readonly")
+        direction_box.pack(side="left")
+        direction_box.bind("<<ComboboxSelected>>", lambda e: self.apply_filter_bar())
+
+        ttk.Label(bar, text="幅度≥").pack(side="left", padx=(6, 0))
+        self.min_change_var = tk.StringVar(value="0")
+        change_box = ttk.Combobox(bar, textvariable=self.min_change_var,
+                                  values=["0", "0.5", "1", "2", "5"], width=4)
+        change_box.pack(side="left")
+        change_box.bind("<<ComboboxSelected>>", lambda e: self.apply_filter_bar())
+        change_box.bind("<Return>", lambda e: self.apply_filter_bar())
+        ttk.Label(bar, text="%").pack(side="left")
+
+    def apply_filter_bar(self):
+        try:
+            min_change = float(self.min_change_var.get() or 0)
+        except ValueError:
+            min_change = 0.0
+        self.set_filter(code=self.code_filter, direction=self.direction_var.get(), min_change=min_change)
+
+    # ---- 数据 ----
+
+    def push(self, price: float, change_percent: float, volume: float = 0.0, code: str = "", when=None):
+        self.extend([(when, price, change_percent, volume, code)])
+
+    def extend(self, records: Iterable[Tuple]):
+        if self.buffer.extend(records):
+            self.scheduler.mark_dirty(self.key, self.refresh)
+
+    def clear(self):
+        self.buffer.clear()
+        self._anchor = None
+        self.scheduler.mark_dirty(self.key, self.refresh)
+
+    def set_filter(self, code: Optional[str] = None, direction: str = "全部", min_change: float = 0.0):
+        """更换过滤条件并回到最新记录"""
+        self.code_filter = code
+        self.direction = direction
+        self.min_change = max(0.0, min_change)
+        self._anchor = None
+        self.refresh()
+
+    # ---- 绘制 ----
+
+    def visible_rows(self) -> int:
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def refresh(self):
+        """只绘制可见行（主线程）"""
+        rows = self.visible_rows()
+        self._matches = self.buffer.select(self.code_filter, self.direction, self.min_change)
+        total = len(self._matches)
+
+        start = 0
+        if self._anchor is not None:
+            # 序号比顶行新的记录都排在上方，跳过它们保持画面不动
+            start = int(np.count_nonzero(self.buffer.seqs[self._matches] > self._anchor))
+        self._start = min(start, max(0, total - rows))
+        if self._start == 0:
+            self._anchor = None
+
+        self._ensure_rows(rows)
+        for r in range(rows):
+            pos = self._start + r
+            row = self.buffer.format_row(self._matches[pos], self.show_code) if pos < total else ("", FLAT_COLOR)
+            if row != self._row_cache[r]:
+                self.canvas.itemconfigure(self._rows[r], text=row[0], fill=row[1])
+                self._row_cache[r] = row
+
+        if total:
+            self.scrollbar.set(self._start / total, min(1.0, (self._start + rows) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _ensure_rows(self, rows: int):
+        """行图元池与可见行数一致，多余的删除，不足的补齐"""
+        while len(self._rows) > rows:
+            self.canvas.delete(self._rows.pop())
+            self._row_cache.pop()
+        while len(self._rows) < rows:
+            y = len(self._rows) * self.row_height + 1
+            self._rows.append(self.canvas.create_text(4, y, anchor="nw", font=self.font, text=""))
+            self._row_cache.append(("", FLAT_COLOR))
+
+    def scroll_to(self, start: int):
+        total = len(self._matches)
+        start = min(max(0, start), max(0, total - self.visible_rows()))
+        self._anchor = int(self.buffer.seqs[self._matches[start]]) if start > 0 else None
+        self.refresh()
+
+    def scroll(self, rows: int):
+        self.scroll_to(self._start + rows)
+
+    def on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self.scroll_to(int(float(args[0]) * len(self._matches)))
+        elif action == "scroll":
+            step = int(args[0]) * (self.visible_rows() if args[1] == "pages" else 1)
+            self.scroll(step)
@@ -0,0 +1,226 @@
+"""
+性能剖析工具（默认关闭）
+通过环境变量 STOCK_PROFILE 或命令行 --profile 开启:
+    timing   仅统计关键路径耗时（获取 / 解析 / 绘图）
+    sample   耗时统计 + 栈采样，输出折叠栈(.collapsed)和 speedscope JSON，可直接生成火焰图
+    cprofile 耗时统计 + 主线程 cProfile，输出 .prof 供 pstats / snakeviz 查看
+结果在进程退出时写入 logs/profiles/ 目录
+"""
+
+import atexit
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ContextDecorator
+from datetime import datetime
+from typing import Dict, Optional
+
+from config import LOG_DIR
+
+PROFILE_DIR = os.path.join(LOG_DIR, "profiles")
+PROFILE_MODES = ("timing", "sample", "cprofile")
+
+# 栈采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+
+
+class _TimingStats:
+    """各命名路径的调用次数与耗时统计"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.total: Dict[str, float] = defaultdict(float)
+        self.max: Dict[str, float] = defaultdict(float)
+
+    def add(self, name: str, seconds: float):
+        with self.lock:
+            self.calls[name] += 1
+            self.total[name] += seconds
+            if seconds > self.max[name]:
+                self.max[name] = seconds
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            return {
+                name: {
+                    'calls': self.calls[name],
+                    'total_ms': self.total[name] * 1000,
+                    'avg_ms': self.total[name] / self.calls[name] * 1000,
+                    'max_ms': self.max[name] * 1000,
+                }
+                for name in sorted(self.calls, key=lambda n: -self.total[n])
+            }
+
+
+class StackSampler:
+    """后台线程定时采集所有线程的调用栈"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def write_collapsed(self, path: str):
+        """输出 Brendan Gregg 折叠栈格式，可用 flamegraph.pl / speedscope 打开"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(";".join(s.replace(";", ":") for s in stack) + f" {count}\n")
+
+    def write_speedscope(self, path: str):
+        """输出 speedscope 采样格式 JSON"""
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            ids = []
+            for name in stack:
+                if name not in index:
+                    index[name] = len(frames)
+                    frames.append({"name": name})
+                ids.append(index[name])
+            samples.append(ids)
+            weights.append(count * self.interval * 1000)
+        doc = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": "stock-fast",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "exporter": "stock-fast profiling",
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False)
+
+
+_mode: Optional[str] = None
+_stats = _TimingStats()
+_sampler: Optional[StackSampler] = None
+_cprofiler: Optional[cProfile.Profile] = None
+_session_tag = ""
+
+
+class profiled(ContextDecorator):
+    """关键路径计时，可作为 with 语句或装饰器使用；未开启剖析时几乎无开销"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._local = threading.local()
+
+    def __enter__(self):
+        if _mode is not None:
+            starts = getattr(self._local, "starts", None)
+            if starts is None:
+                starts = self._local.starts = []
+            starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        if _mode is not None:
+            starts = getattr(self._local, "starts", None)
+            if starts:
+                _stats.add(self.name, time.perf_counter() - starts.pop())
+        return False
+
+
+def is_enabled() -> bool:
+    return _mode is not None
+
+
+def start_session(mode: str = "timing"):
+    """开启剖析会话，进程退出时自动写出结果"""
+    global _mode, _sampler, _cprofiler, _session_tag
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"未知剖析模式: {mode}，可选: {', '.join(PROFILE_MODES)}")
+    if _mode is not None:
+        return
+
+    _mode = mode
+    _session_tag = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if mode == "sample":
+        _sampler = StackSampler()
+        _sampler.start()
+    elif mode == "cprofile":
+        _cprofiler = cProfile.Profile()
+        _cprofiler.enable()
+    atexit.register(stop_session)
+
+
+def stop_session() -> Optional[str]:
+    """结束剖析会话并写出结果文件，返回结果文件前缀"""
+    global _mode, _sampler, _cprofiler
+    if _mode is None:
+        return None
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    prefix = os.path.join(PROFILE_DIR, f"profile_{_session_tag}")
+
+    if _sampler is not None:
+        _sampler.stop()
+        _sampler.write_collapsed(prefix + ".collapsed")
+        _sampler.write_speedscope(prefix + ".speedscope.json")
+        _sampler = None
+    if _cprofiler is not None:
+        _cprofiler.disable()
+        _cprofiler.dump_stats(prefix + ".prof")
+        _cprofiler = None
+
+    summary = _stats.summary()
+    with open(prefix + "_timings.json", "w", encoding="utf-8") as f:
+        json.dump({"mode": _mode, "timings": summary}, f, ensure_ascii=False, indent=2)
+
+    print(f"\n⏱  剖析结果已保存: {prefix}*")
+    for name, item in summary.items():
+        print(f"  {name:<40} {item['calls']:>6} 次  平均 {item['avg_ms']:>8.2f}ms  最大 {item['max_ms']:>8.2f}ms")
+
+    _mode = None
+    return prefix
+
+
+def start_from_env():
+    """根据环境变量 STOCK_PROFILE 开启剖析（1/true 视为 timing），无法识别的值只提示不开启"""
+    value = os.environ.get("STOCK_PROFILE", "").strip().lower()
+    if not value or value in ("0", "false", "off"):
+        return
+    mode = "timing" if value in ("1", "true", "on") else value
+    if mode not in PROFILE_MODES:
+        print(f"⚠️  忽略无效的 STOCK_PROFILE={value}，可选: 1, {', '.join(PROFILE_MODES)}")
+        return
+    start_session(mode)
+
+
+start_from_env()
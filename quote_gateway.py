@@ -0,0 +1,412 @@
+"""
+本地行情网关
+同一台机器上的多个界面共用一路上游行情：网关进程内只有一个 QuoteHub 轮询腾讯接口，
+各客户端通过 SSE 订阅自己的股票集合，只推送有变化的字段
+
+接口:
+- GET  /api/info?code=600000                     基本信息
+- GET  /api/history?code=600000&count=320&end=   历史K线（JSON 数组）
+- GET  /api/quotes?codes=600000,000001            最新行情快照
+- GET  /api/status                                客户端数、上游轮询统计
+- GET  /stream?codes=600000,000001&interval=5     SSE 行情推送，首条 event: hello 给出客户端编号，
+                                                  之后每条 data 为 {代码: {变化的字段}}，首次出现的股票为完整行情
+                                                  （已在轮询的股票连接后立即推送网关缓存的行情）
+- POST /api/clients/<编号>  {"codes": [...], "interval": 5}   修改该客户端的订阅
+
+界面端在 config.QUOTE_GATEWAY 中填写网关地址后，get_hub() 返回 RemoteQuoteHub，
+订阅接口不变，行情改为从网关接收；create_fetcher() 返回 GatewayStockDataFetcher，
+基本信息和历史K线也经网关获取（多股监控墙的 AsyncStockDataFetcher 同样走网关）
+"""
+
+import itertools
+import json
+import socket
+import threading
+import time
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import pandas as pd
+
+from config import REQUEST_TIMEOUT
+from data_fetcher import StockDataFetcher
+from quote_hub import DEFAULT_INTERVAL, QuoteHub, Subscription, quote_diff
+
+DEFAULT_PORT = 8765
+# 没有行情变化时的心跳间隔（秒），用于发现已断开的客户端
+HEARTBEAT_SECONDS = 15
+
+
+class ClientStream:
+    """一个 SSE 客户端：订阅和待推送的差异（多轮未发出时合并）"""
+
+    def __init__(self, client_id: int):
+        self.client_id = client_id
+        self.subscription: Optional[Subscription] = None
+        self._pending: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def on_quotes(self, diffs: Dict[str, Dict]):
+        """QuoteHub 回调（轮询线程，diff_only 订阅）：差异合并到待推送"""
+        with self._lock:
+            for code, diff in diffs.items():
+                self._pending.setdefault(code, {}).update(diff)
+            if self._pending:
+                self._ready.set()
+
+    def forget(self, codes: List[str]):
+        """退订的股票丢弃待推送的差异（QuoteHub 在重新订阅时再发完整行情）"""
+        with self._lock:
+            for code in codes:
+                self._pending.pop(code, None)
+
+    def next_update(self, timeout: float) -> Dict[str, Dict]:
+        """等待下一批差异，超时返回空字典（发心跳）"""
+        self._ready.wait(timeout)
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._ready.clear()
+        return pending
+
+
+class QuoteGateway:
+    """网关服务：一个上游 QuoteHub + 若干 SSE 客户端"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, fetcher=None, hub: QuoteHub = None):
+        if fetcher is None:
+            fetcher = StockDataFetcher()
+        self.fetcher = fetcher
+        # 网关自己的轮询器，不经过 get_hub()（界面端配置了网关地址时 get_hub 会指向网关本身）
+        self.hub = hub or QuoteHub(fetcher=fetcher)
+        self.clients: Dict[int, ClientStream] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.address = self.server.server_address
+
+    def start(self) -> "QuoteGateway":
+        threading.Thread(target=self.server.serve_forever, name="quote-gateway", daemon=True).start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self._lock:
+            clients = list(self.clients.values())
+        for client in clients:
+            self.close_client(client)
+        self.hub.close()
+
+    # ---- 客户端 ----
+
+    def open_client(self, codes: List[str], interval: float) -> ClientStream:
+        with self._lock:
+            client = ClientStream(next(self._ids))
+            self.clients[client.client_id] = client
+        # 已在轮询的股票先推送网关缓存的完整行情，不等上游下一轮
+        client.on_quotes(self.hub.latest(codes))
+        client.subscription = self.hub.subscribe(codes, client.on_quotes, interval=interval, diff_only=True)
+        return client
+
+    def update_client(self, client_id: int, codes: Optional[List[str]] = None,
+                      interval: Optional[float] = None) -> bool:
+        client = self.clients.get(client_id)
+        if client is None:
+            return False
+        if codes is not None:
+            client.forget([code for code in client.subscription.codes if code not in codes])
+        self.hub.update(client.subscription, codes=codes, interval=interval)
+        return True
+
+    def close_client(self, client: ClientStream):
+        with self._lock:
+            self.clients.pop(client.client_id, None)
+        if client.subscription is not None:
+            client.subscription.close()
+
+    def snapshot(self, codes: List[str]) -> Dict[str, Dict]:
+        """最新行情：已在轮询的股票取网关缓存，其余直接请求一次"""
+        latest = self.hub.latest(codes)
+        missing = [code for code in codes if code not in latest]
+        if missing:
+            for code, quote in self.fetcher.get_multiple_stocks_realtime(missing).items():
+                latest[code] = quote_diff(None, quote)
+        return {code: latest[code] for code in codes if code in latest}
+
+    def status(self) -> Dict:
+        return {"clients": len(self.clients), "symbols": len(self.hub.symbols()),
+                "upstream_cycles": self.hub.cycles, "symbols_requested": self.hub.symbols_requested}
+
+    # ---- HTTP ----
+
+    def _handler_class(self):
+        gateway = self
+
+        class GatewayHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                try:
+                    if url.path == "/stream":
+                        self.stream(_split_codes(query.get("codes")),
+                                    float(query.get("interval", DEFAULT_INTERVAL)))
+                    elif url.path == "/api/info":
+                        self.send_json(gateway.fetcher.get_stock_info(query["code"]))
+                    elif url.path == "/api/history":
+                        df = gateway.fetcher.get_historical_data(
+                            query["code"], end_date=query.get("end") or None,
+                            count=int(query.get("count", 320)))
+                        body = "[]" if df is None else df.to_json(orient="records", force_ascii=False)
+                        self.send_body(body.encode("utf-8"))
+                    elif url.path == "/api/quotes":
+                        self.send_json(gateway.snapshot(_split_codes(query.get("codes"))))
+                    elif url.path == "/api/status":
+                        self.send_json(gateway.status())
+                    else:
+                        self.send_error(404)
+                except (KeyError, ValueError) as e:
+                    self.send_error(400, explain=f"参数错误: {e}")
+
+            def do_POST(self):
+                parts = urlparse(self.path).path.strip("/").split("/")
+                if len(parts) != 3 or parts[:2] != ["api", "clients"] or not parts[2].isdigit():
+                    self.send_error(404)
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    codes = body.get("codes")
+                    ok = gateway.update_client(int(parts[2]), codes=None if codes is None else list(codes),
+                                               interval=body.get("interval"))
+                except (ValueError, AttributeError) as e:
+                    self.send_error(400, explain=f"参数错误: {e}")
+                    return
+                if ok:
+                    self.send_json({"ok": True})
+                else:
+                    self.send_error(404, explain="客户端不存在")
+
+            def stream(self, codes: List[str], interval: float):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                client = gateway.open_client(codes, interval)
+                try:
+                    self.write_event({"client": client.client_id}, event="hello")
+                    while True:
+                        update = client.next_update(HEARTBEAT_SECONDS)
+                        if update:
+                            self.write_event(update)
+                        else:
+                            self.wfile.write(b": ping\n\n")
+                            self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError, OSError):
+                    pass
+                finally:
+                    gateway.close_client(client)
+
+            def write_event(self, data, event: Optional[str] = None):
+                message = f"event: {event}\n" if event else ""
+                message += f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+                self.wfile.write(message.encode("utf-8"))
+                self.wfile.flush()
+
+            def send_json(self, data):
+                self.send_body(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+            def send_body(self, body: bytes):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return GatewayHandler
+
+
+def _split_codes(text: Optional[str]) -> List[str]:
+    if not text:
+        raise ValueError("缺少 codes")
+    return list(dict.fromkeys(code.strip() for code in text.split(",") if code.strip()))
+
+
+def start_gateway(host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> QuoteGateway:
+    """在后台线程启动行情网关"""
+    return QuoteGateway(host, port).start()
+
+
+# ---- 界面端 ----
+
+class GatewayStockDataFetcher(StockDataFetcher):
+    """经本地网关获取基本信息、历史K线和行情快照，接口与 StockDataFetcher 相同"""
+
+    def __init__(self, base_url: str, metrics=None):
+        super().__init__(metrics=metrics)
+        self.base_url = base_url.rstrip("/")
+
+    def _api(self, endpoint: str, path: str, **params):
+        response = self._timed_get(f"gateway.{endpoint}", f"{self.base_url}{path}",
+                                   params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def get_stock_info(self, stock_code: str) -> Optional[Dict]:
+        try:
+            return self._api("info", "/api/info", code=stock_code)
+        except Exception as e:
+            self.logger.warning("网关基本信息获取失败: %s", str(e)[:80], extra={"symbol": stock_code})
+            return None
+
+    def get_historical_data(self, stock_code: str, period: str = "daily",
+                            start_date: str = None, end_date: str = None,
+                            count: int = 320) -> Optional[pd.DataFrame]:
+        """网关只支持按 end_date 和 count 取日K线"""
+        try:
+            rows = self._api("history", "/api/history", code=stock_code, count=count, end=end_date or "")
+        except Exception as e:
+            self.logger.warning("网关历史数据获取失败: %s", str(e)[:80], extra={"symbol": stock_code})
+            return None
+        return history_frame(rows)
+
+    def get_realtime_price(self, stock_code: str, trace=None) -> Optional[Dict]:
+        return self.get_multiple_stocks_realtime([stock_code], trace).get(stock_code)
+
+    def get_multiple_stocks_realtime(self, stock_codes: List[str], trace=None) -> Dict[str, Dict]:
+        try:
+            quotes = self._api("quotes", "/api/quotes", codes=",".join(stock_codes))
+        except Exception as e:
+            self.logger.warning("网关行情获取失败: %s", str(e)[:80], extra={"symbols": len(stock_codes)})
+            return {}
+        if trace is not None:
+            trace.mark("response_received")
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        return {code: {**quote, 'timestamp': timestamp} for code, quote in quotes.items()}
+
+
+def history_frame(rows) -> Optional[pd.DataFrame]:
+    """网关 /api/history 返回的记录转为与 StockDataFetcher 相同的 DataFrame"""
+    if not rows:
+        return None
+    df = pd.DataFrame(rows)
+    if '股票代码' in df.columns:
+        df['股票代码'] = df['股票代码'].astype(str).str.zfill(6)
+    return df
+
+
+class RemoteQuoteHub:
+    """
+    与 QuoteHub 接口相同的网关客户端：每个订阅一条 SSE 连接，收到的差异合并成完整行情后分发
+
+    与 QuoteHub 一样只推送本轮有变化的股票，回调在接收线程中执行
+    """
+
+    def __init__(self, base_url: str):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._subs: Dict[Subscription, dict] = {}
+        self.cycles = 0
+
+    def subscribe(self, codes, target, interval: float = DEFAULT_INTERVAL,
+                  diff_only: bool = False) -> Subscription:
+        sub = Subscription(self, codes, target, interval, diff_only)
+        state = {"client": None, "connection": None, "closed": False}
+        with self._lock:
+            self._subs[sub] = state
+        threading.Thread(target=self._receive, args=(sub, state), name="gateway-stream", daemon=True).start()
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            state = self._subs.pop(sub, None)
+        if state is not None:
+            state["closed"] = True
+            _abort(state["connection"])
+
+    def update(self, sub: Subscription, codes=None, interval: Optional[float] = None):
+        if codes is not None:
+            sub.codes = list(dict.fromkeys(codes))
+        if interval is not None:
+            sub.interval = float(interval)
+        state = self._subs.get(sub)
+        if state is None or state["client"] is None:
+            return
+        try:
+            self.session.post(f"{self.base_url}/api/clients/{state['client']}",
+                              json={"codes": sub.codes, "interval": sub.interval}, timeout=5)
+        except Exception as e:
+            print(f"网关订阅更新失败: {e}")
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return list(dict.fromkeys(code for sub in self._subs for code in sub.codes))
+
+    def close(self):
+        for sub in list(self._subs):
+            self.unsubscribe(sub)
+
+    def _receive(self, sub: Subscription, state: dict):
+        """接收线程：断线后重连，重连时网关重新推送完整行情"""
+        quotes: Dict[str, Dict] = {}
+        address = urlparse(self.base_url)
+        while not state["closed"]:
+            connection = HTTPConnection(address.hostname, address.port or 80, timeout=HEARTBEAT_SECONDS * 3)
+            state["connection"] = connection
+            try:
+                query = urlencode({"codes": ",".join(sub.codes), "interval": sub.interval})
+                connection.request("GET", f"{address.path}/stream?{query}")
+                response = connection.getresponse()
+                if response.status != 200:
+                    raise ConnectionError(f"HTTP {response.status}")
+                event = None
+                # 逐行读取，收到一条事件立即处理
+                for raw in response:
+                    line = raw.decode("utf-8").rstrip("\r\n")
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:"):
+                        data = json.loads(line[5:])
+                        if event == "hello":
+                            state["client"] = data["client"]
+                        else:
+                            self._deliver(sub, quotes, data)
+                        event = None
+            except Exception as e:
+                if not state["closed"]:
+                    print(f"网关连接中断，稍后重连: {str(e)[:80]}")
+            finally:
+                connection.close()
+            if not state["closed"]:
+                time.sleep(1)
+
+    def _deliver(self, sub: Subscription, quotes: Dict[str, Dict], diffs: Dict[str, Dict]):
+        merged = {}
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        for code, diff in diffs.items():
+            quotes.setdefault(code, {}).update(diff)
+            merged[code] = diff if sub.diff_only else {**quotes[code], 'timestamp': timestamp,
+                                                       'changed_fields': tuple(diff)}
+        self.cycles += 1
+        try:
+            sub.deliver(merged)
+        except Exception as e:
+            print(f"行情分发错误: {e}")
+
+
+def _abort(connection: Optional[HTTPConnection]):
+    """从其他线程中断阻塞在读取上的连接"""
+    if connection is None or connection.sock is None:
+        return
+    try:
+        connection.sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
@@ -0,0 +1,330 @@
+"""
+进程内统一的实时行情订阅中心
+所有界面共用一个轮询线程：每个周期把到期的股票合并成一次批量行情请求，
+再按订阅分发给回调函数或队列。新增一个视图只是在下一轮请求里多几只股票，
+不会多一个线程和一路HTTP请求
+
+轮询按股票自适应：盘中价格在变的股票按订阅间隔轮询，连续不变的逐步放慢（最多 MAX_BACKOFF 倍），
+非交易时段按交易日历慢速轮询或暂停（见 trading_calendar.poll_delay）
+
+分发只包含有变化的股票：每只股票与上一轮快照比较价格、涨跌、成交量和买卖一价，都没变化的股票不推送，
+整轮都没有变化的订阅不会被调用；订阅时 diff_only=True 只收到变化的字段，否则收到完整行情，
+其中 'changed_fields' 列出本轮变化的字段（首次推送为全部字段）
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from config import QUOTE_GATEWAY, UPDATE_INTERVAL
+from latency_trace import UpdateTrace
+from trading_calendar import get_calendar
+
+DEFAULT_INTERVAL = 5.0
+# 轮询线程最短间隔，防止订阅间隔过小时打满接口
+MIN_INTERVAL = 1.0
+# 价格连续不变时轮询间隔每轮翻倍，最多放慢到订阅间隔的这么多倍
+MAX_BACKOFF = 4
+# 参与比较的字段：只有这些字段变化时才算行情有变化（quote_time 等每轮都会变的字段不计）
+DIFF_FIELDS = ("price", "change", "change_amount", "volume", "bid", "ask")
+# 成交相关字段：这些字段变化时视图才需要重绘K线，只有买卖盘变化时只更新文字
+TRADE_FIELDS = frozenset(("price", "volume"))
+# 不推送的字段（由轮询器或界面端生成）
+VOLATILE_FIELDS = ("timestamp", "cycle_stamps", "changed_fields")
+
+
+def quote_diff(previous: Optional[Dict], quote: Dict) -> Dict:
+    """
+    行情相对上次快照的变化；previous 为 None 时返回全部字段
+
+    DIFF_FIELDS 都没变时返回空字典；有变化时一并带上其他变化的字段（如 quote_time），
+    按差异合并的接收方（网关客户端）也能拿到完整的最新行情
+    """
+    if previous is not None and all(previous.get(key) == quote.get(key) for key in DIFF_FIELDS):
+        return {}
+    return {key: value for key, value in quote.items()
+            if key not in VOLATILE_FIELDS and (previous is None or previous.get(key) != value)}
+
+
+class Subscription:
+    """一个视图的订阅：股票列表、推送间隔和接收方（回调或队列）"""
+
+    def __init__(self, hub: "QuoteHub", codes: Iterable[str], target, interval: float,
+                 diff_only: bool = False):
+        self.hub = hub
+        self.codes = list(dict.fromkeys(codes))
+        self.target = target
+        self.interval = max(MIN_INTERVAL, float(interval))
+        self.diff_only = diff_only
+        # 已推送过完整行情的股票，之后只在有变化时推送
+        self.seen = set()
+        self.deliveries = 0
+
+    def set_codes(self, codes: Iterable[str]):
+        """更换订阅的股票，下一轮立即生效"""
+        self.hub.update(self, codes=codes)
+
+    def set_interval(self, interval: float):
+        self.hub.update(self, interval=interval)
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def deliver(self, quotes: Dict[str, Dict]):
+        """推送本订阅的行情（轮询线程中调用），队列接收方放入整轮结果"""
+        self.deliveries += 1
+        if hasattr(self.target, "put"):
+            self.target.put(quotes)
+        else:
+            self.target(quotes)
+
+
+class QuoteHub:
+    """
+    单一行情轮询器，subscribe() 可在任意线程调用
+
+    回调在轮询线程中执行，收到 {代码: 行情}（只含本订阅中有变化的股票；有股票没取到时照常调用，
+    可能为空字典），界面回调应只做投递（RenderScheduler.mark_dirty 或放入队列），不要直接操作 Tk
+    """
+
+    def __init__(self, fetcher=None, calendar=None, idle_interval: float = UPDATE_INTERVAL * 60):
+        self._fetcher = fetcher
+        self.calendar = calendar or get_calendar()
+        self.idle_interval = idle_interval
+        self._cond = threading.Condition()
+        self._subs: List[Subscription] = []
+        # 每只股票的轮询状态: 代码 -> [下次轮询时间(monotonic), 连续未变化轮数, 上次价格]
+        self._symbols: Dict[str, list] = {}
+        # 每只股票上一轮的完整行情，用于逐字段比较
+        self._last: Dict[str, Dict] = {}
+        self._thread = None
+        self._closed = False
+
+        # 统计：轮询周期数、请求股票总数、最近一轮耗时
+        self.cycles = 0
+        self.symbols_requested = 0
+        self.last_cycle_seconds = 0.0
+
+    @property
+    def fetcher(self):
+        if self._fetcher is None:
+            from data_fetcher import StockDataFetcher
+            self._fetcher = StockDataFetcher()
+        return self._fetcher
+
+    # ---- 订阅 ----
+
+    def subscribe(self, codes: Iterable[str], target, interval: float = DEFAULT_INTERVAL,
+                  diff_only: bool = False) -> Subscription:
+        """订阅股票行情，target 为回调函数 target(quotes) 或带 put() 的队列；首轮立即推送完整行情"""
+        sub = Subscription(self, codes, target, interval, diff_only)
+        with self._cond:
+            self._subs.append(sub)
+            self._mark_due(sub.codes)
+            self._ensure_thread()
+            self._cond.notify()
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._cond:
+            if sub in self._subs:
+                self._subs.remove(sub)
+            self._cond.notify()
+
+    def update(self, sub: Subscription, codes: Optional[Iterable[str]] = None,
+               interval: Optional[float] = None):
+        with self._cond:
+            if codes is not None:
+                sub.codes = list(dict.fromkeys(codes))
+                # 退订后重新订阅的股票再推送一次完整行情
+                sub.seen &= set(sub.codes)
+                self._mark_due(code for code in sub.codes if code not in sub.seen)
+            if interval is not None:
+                sub.interval = max(MIN_INTERVAL, float(interval))
+                # 已订阅的股票按新间隔重新开始
+                due = time.monotonic() + sub.interval
+                for code in sub.codes:
+                    state = self._symbols.get(code)
+                    if state is not None:
+                        state[0] = min(state[0], due)
+                        state[1] = 0
+            self._cond.notify()
+
+    def _mark_due(self, codes: Iterable[str]):
+        """已在轮询的股票立即到期，新订阅者不必等到该股票的下次轮询（调用方持有锁）"""
+        now = time.monotonic()
+        for code in codes:
+            state = self._symbols.get(code)
+            if state is not None:
+                state[0] = min(state[0], now)
+
+    def symbols(self) -> List[str]:
+        """当前所有订阅的股票（去重）"""
+        with self._cond:
+            return list(dict.fromkeys(code for sub in self._subs for code in sub.codes))
+
+    def latest(self, codes: Iterable[str]) -> Dict[str, Dict]:
+        """已轮询过的股票的最近一次完整行情（不含每轮变化的字段）"""
+        with self._cond:
+            return {code: quote_diff(None, self._last[code]) for code in codes if code in self._last}
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    # ---- 轮询 ----
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="quote-hub", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    wait = self._next_due() - now
+                    if wait <= 0:
+                        break
+                    self._cond.wait(None if wait == float("inf") else wait)
+                if self._closed:
+                    return
+            self.poll_once()
+
+    def _next_due(self) -> float:
+        """最早到期的股票的轮询时间，新订阅的股票立即到期（调用方持有锁）"""
+        due = float("inf")
+        for sub in self._subs:
+            for code in sub.codes:
+                state = self._symbols.get(code)
+                due = min(due, state[0] if state is not None else 0.0)
+        return due
+
+    def _base_interval(self, code: str) -> float:
+        return min((s.interval for s in self._subs if code in s.codes), default=DEFAULT_INTERVAL)
+
+    def poll_once(self, force: bool = False) -> Dict[str, Dict]:
+        """对到期的股票（force 时为全部订阅股票）做一次批量请求并分发，返回本轮行情"""
+        with self._cond:
+            now = time.monotonic()
+            subscribed = list(dict.fromkeys(code for sub in self._subs for code in sub.codes))
+            # 清理已无人订阅的股票
+            for code in set(self._symbols) - set(subscribed):
+                del self._symbols[code]
+                self._last.pop(code, None)
+            codes = [code for code in subscribed
+                     if force or code not in self._symbols or self._symbols[code][0] <= now]
+            subs = [sub for sub in self._subs if any(code in codes for code in sub.codes)]
+            # 先按订阅间隔占位，请求期间不会重复到期
+            for code in codes:
+                state = self._symbols.setdefault(code, [0.0, 0, None])
+                state[0] = now + self._base_interval(code)
+
+        if not codes:
+            return {}
+
+        # 整轮共用一条时间线：请求开始、首个响应到达、解析完成
+        cycle = UpdateTrace("batch")
+        cycle.mark("request_start")
+        try:
+            quotes = self.fetcher.get_multiple_stocks_realtime(codes, trace=cycle)
+        except Exception as e:
+            print(f"行情获取失败: {e}")
+            quotes = {}
+        cycle.mark("parse_done")
+        for quote in quotes.values():
+            quote['cycle_stamps'] = dict(cycle.stamps)
+
+        self.cycles += 1
+        self.symbols_requested += len(codes)
+        self.last_cycle_seconds = cycle.stamps["parse_done"] - cycle.stamps["request_start"]
+        self._reschedule(codes, quotes)
+
+        with self._cond:
+            diffs = {}
+            for code, quote in quotes.items():
+                diffs[code] = quote_diff(self._last.get(code), quote)
+                self._last[code] = quote
+            # sub.seen 与 update() 中的修改在同一把锁下进行
+            payloads = [(sub, *self._payload(sub, codes, quotes, diffs)) for sub in subs]
+
+        for sub, payload, missing in payloads:
+            if not payload and not missing:
+                continue
+            try:
+                sub.deliver(payload)
+            except Exception as e:
+                print(f"行情分发错误: {e}")
+        return quotes
+
+    def _payload(self, sub: Subscription, codes: List[str], quotes: Dict[str, Dict], diffs: Dict[str, Dict]):
+        """本订阅本轮要推送的行情，以及本轮请求了但没取到的股票数（调用方持有锁）"""
+        payload = {}
+        missing = 0
+        for code in sub.codes:
+            if code not in codes:
+                continue
+            if code not in quotes:
+                missing += 1
+                continue
+            if code in sub.seen:
+                diff = diffs[code]
+                if not diff:
+                    continue
+            else:
+                diff = quote_diff(None, quotes[code])
+                sub.seen.add(code)
+            payload[code] = diff if sub.diff_only else {**quotes[code], 'changed_fields': tuple(diff)}
+        return payload, missing
+
+    def _reschedule(self, codes: List[str], quotes: Dict[str, Dict]):
+        """按交易时段和价格变化安排各股票的下一次轮询；没取到行情的按订阅间隔重试"""
+        intervals = {}
+        with self._cond:
+            for code in codes:
+                state = self._symbols.get(code)
+                quote = quotes.get(code)
+                if state is None or quote is None:
+                    continue
+                price = quote.get('price')
+                state[1] = state[1] + 1 if price == state[2] else 0
+                state[2] = price
+                intervals[code] = self._base_interval(code) * min(2 ** state[1], MAX_BACKOFF)
+
+        # 交易日历首次查询可能访问网络，不持有锁
+        delays = {code: self.calendar.poll_delay(interval, self.idle_interval)
+                  for code, interval in intervals.items()}
+
+        with self._cond:
+            now = time.monotonic()
+            for code, delay in delays.items():
+                state = self._symbols.get(code)
+                if state is not None:
+                    state[0] = now + delay
+
+
+def trace_for(quote: Dict, symbol: str) -> UpdateTrace:
+    """由一轮行情的时间点生成延迟追踪，界面继续标记投递和绘制阶段"""
+    trace = UpdateTrace(symbol)
+    trace.stamps.update(quote.get('cycle_stamps', {}))
+    return trace
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub() -> QuoteHub:
+    """进程内唯一的 QuoteHub；配置了 QUOTE_GATEWAY 时为从本地网关接收行情的 RemoteQuoteHub"""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            if QUOTE_GATEWAY:
+                from quote_gateway import RemoteQuoteHub
+                _hub = RemoteQuoteHub(QUOTE_GATEWAY)
+            else:
+                _hub = QuoteHub()
+        return _hub
@@ -9,18 +9,27 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import matplotlib.dates as mdates
+from matplotlib.ticker import FuncFormatter, MaxNLocator
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import threading
 import time
 
-# 设置matplotlib支持中文
-import matplotlib
-matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']
-matplotlib.rcParams['axes.unicode_minus'] = False
+# 设置matplotlib支持中文（使用本机已安装的字体，解析结果有缓存）
+from font_utils import setup_cjk_font
+setup_cjk_font()
 
-from data_fetcher import StockDataFetcher
+from data_fetcher import create_fetcher
+from kline_renderer import ohlcv_arrays, draw_candlesticks, draw_volume
+from kline_lod import OHLCPyramid, max_bars_for_axes
+from local_store import LocalBarStore
+from viewport import ViewportManager
+from profiling import profiled
+from render_scheduler import RenderScheduler
+
+# 向左翻页时每次加载的K线根数（腾讯接口单次上限）
+OLDER_PAGE_BARS = 320
 
 class RealKlineUI:
     def __init__(self, root, proxy_host: str = "127.0.0.1", proxy_port: int = 7890):
@@ -33,11 +42,20 @@ class RealKlineUI:
             pass
         
         # 数据获取器 - 配置代理
-        self.fetcher = StockDataFetcher(proxy_host=proxy_host, proxy_port=proxy_port)
+        self.fetcher = create_fetcher(proxy_host=proxy_host, proxy_port=proxy_port)
         self.current_stock = "601127"
         
         # 数据存储
         self.current_data = None
+        # 当前数据的K线金字塔缓存 (数据key, 金字塔, 日期)
+        self._lod_cache = None
+        self._chart_dates = None
+        # 当前绘制的K线/成交量集合对象，平移缩放时替换
+        self._bar_artists = []
+        # 本地K线存储，向左翻页时优先读取
+        self.bar_store = LocalBarStore()
+        # 界面刷新调度：数据加载和平移缩放的重绘按帧合并
+        self.scheduler = RenderScheduler(self.root)
         self.basic_info = None
         
         # 创建界面
@@ -171,6 +189,11 @@ class RealKlineUI:
         self.canvas = FigureCanvasTkAgg(self.fig, parent)
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
         
+        # 视口：滚轮缩放、拖动平移、到达左边缘时加载更早数据
+        self.viewport = ViewportManager(self.canvas, (self.ax_kline, self.ax_volume),
+                                        lambda: self.scheduler.mark_dirty("viewport", self.redraw_viewport),
+                                        self.load_older_bars)
+        
         # 初始化空图表
         self.init_empty_chart()
         
@@ -187,7 +210,8 @@ class RealKlineUI:
                            ha='center', va='center', transform=self.ax_volume.transAxes, 
                            fontsize=12, color='gray')
         
-        self.canvas.draw()
+        # 控件显示后再绘制，不阻塞界面构造
+        self.canvas.draw_idle()
         
     def load_real_data(self):
         """加载真实数据"""
@@ -203,36 +227,37 @@ class RealKlineUI:
         """数据加载线程"""
         try:
             self.current_stock = stock_code
-            self.update_status("正在获取数据...")
+            self.post_status("正在获取数据...")
             
             # 1. 获取基本信息
-            self.update_status("获取基本信息...")
+            self.post_status("获取基本信息...")
             basic_info = self.fetcher.get_stock_info(stock_code)
             
             if basic_info:
                 self.basic_info = basic_info
-                self.root.after(0, self.update_basic_info)
+                self.scheduler.mark_dirty("basic_info", self.update_basic_info)
             else:
-                self.root.after(0, lambda: self.update_status("获取基本信息失败"))
+                self.post_status("获取基本信息失败")
                 return
             
             # 2. 获取历史数据
-            self.update_status("获取历史K线数据...")
-            hist_data = self.fetcher.get_historical_data(stock_code)
+            self.post_status("获取历史K线数据...")
+            # 采集进程（main.py --daemon）运行时本地K线已是最新，不再请求网络
+            hist_data = self.bar_store.load_recent(stock_code, limit=320, metrics=self.fetcher.metrics)
+            if hist_data is None:
+                hist_data = self.fetcher.get_historical_data(stock_code)
+                if hist_data is not None and not hist_data.empty:
+                    self.bar_store.merge(stock_code, hist_data)
             
             if hist_data is not None and not hist_data.empty:
-                self.current_data = hist_data
-                self.root.after(0, self.update_latest_data)
-                self.root.after(0, self.update_stats)
-                self.root.after(0, self.draw_real_chart)
-                self.root.after(0, lambda: self.update_status("数据加载完成"))
+                # 数据只在主线程替换，避免与正在进行的重绘交错
+                self.scheduler.mark_dirty("history", self.on_history_loaded, hist_data)
             else:
-                self.root.after(0, lambda: self.update_status("获取历史数据失败"))
+                self.post_status("获取历史数据失败")
                 
         except Exception as e:
             print(f"数据加载错误: {e}")
-            msg = str(e)[:100]
-            self.root.after(0, lambda: self.update_status(f"数据加载失败"))
+            self.post_status("数据加载失败")
             
     def update_basic_info(self):
         """更新基本信息显示"""
@@ -319,8 +344,9 @@ class RealKlineUI:
         except Exception as e:
             print(f"更新统计信息错误: {e}")
             
+    @profiled("draw.RealKlineUI.draw_real_chart")
     def draw_real_chart(self):
-        """绘制真实数据图表"""
+        """绘制真实数据图表（整图重绘，平移缩放只走 redraw_viewport）"""
         if self.current_data is None or self.current_data.empty:
             return
             
@@ -328,114 +354,106 @@ class RealKlineUI:
             # 清空图表
             self.ax_kline.clear()
             self.ax_volume.clear()
+            self._bar_artists = []
             
-            # 准备数据
-            df = self.current_data.copy()
-            
-            # 确保日期列格式正确
-            if '日期' in df.columns:
-                df['日期'] = pd.to_datetime(df['日期'])
-                # 重置索引，使用连续的数字索引
-                df = df.reset_index(drop=True)
-            
-            # 只显示最近30根K线，避免图表过于拥挤
-            if len(df) > 30:
-                df = df.tail(30).reset_index(drop=True)
-            
-            # 绘制K线图
-            self.draw_kline_bars(df)
-            
-            # 绘制成交量
-            self.draw_volume_bars(df)
+            # 绘制可见区间的K线和成交量
+            self.redraw_viewport(draw=False)
             
             # 设置图表样式
-            self.setup_chart_style(df)
+            self.setup_chart_style()
             
             # 刷新画布
-            self.canvas.draw()
+            with profiled("draw.RealKlineUI.canvas_draw"):
+                self.canvas.draw()
             
         except Exception as e:
             print(f"绘制图表错误: {e}")
             self.update_status(f"绘制图表失败: {str(e)}")
             
-    def draw_kline_bars(self, df):
-        """绘制K线柱"""
+    def on_history_loaded(self, hist_data):
+        """新数据加载完成：一次性刷新信息面板、复位视口并整图重绘"""
+        self.current_data = hist_data
+        self.update_latest_data()
+        self.update_stats()
+        self.scheduler.cancel("viewport")
+        self.viewport.reset(len(self.current_data))
+        self.draw_real_chart()
+        self.update_status("数据加载完成")
+            
+    def get_lod_pyramid(self):
+        """获取当前数据的K线金字塔和日期序列，数据未变化时复用"""
+        df = self.current_data
+        key = (id(df), len(df))
+        if self._lod_cache is None or self._lod_cache[0] != key:
+            dates = pd.to_datetime(df['日期']).reset_index(drop=True) if '日期' in df.columns else None
+            self._lod_cache = (key, OHLCPyramid(*ohlcv_arrays(df)), dates)
+            self._chart_dates = dates
+        return self._lod_cache[1]
+        
+    def redraw_viewport(self, draw: bool = True):
+        """只查询并绘制视口内（含预取余量）的K线，替换上一次的集合对象"""
+        if self.current_data is None or self.current_data.empty:
+            return
+            
+        with profiled("draw.RealKlineUI.redraw_viewport"):
+            for artist in self._bar_artists:
+                artist.remove()
+            self._bar_artists = []
+            
+            # 按坐标轴像素宽度降采样：可见跨度对应屏幕宽度，预取部分按同样密度
+            start, end = self.viewport.query_range()
+            visible_bars = max_bars_for_axes(self.ax_kline)
+            max_bars = int(visible_bars * (end - start) / max(self.viewport.span(), 1)) + 1
+            bars = self.get_lod_pyramid().query(start, end, max_bars)
+            
+            # 绘制K线图
+            self.draw_kline_bars(bars)
+            
+            # 绘制成交量
+            self.draw_volume_bars(bars)
+            
+            # 坐标范围只按可见部分计算
+            left, right = self.viewport.xlim()
+            self.ax_kline.set_xlim(left, right)
+            self.ax_volume.set_xlim(left, right)
+            shown = (bars['x'] >= left) & (bars['x'] <= right)
+            if shown.any():
+                low, high = np.nanmin(bars['low'][shown]), np.nanmax(bars['high'][shown])
+                pad = (high - low) * 0.05 or high * 0.01 or 1.0
+                self.ax_kline.set_ylim(low - pad, high + pad)
+                self.ax_volume.set_ylim(0, max(float(np.nanmax(bars['volume'][shown])) * 1.05, 1.0))
+            
+        if draw:
+            self.canvas.draw_idle()
+        
+    def draw_kline_bars(self, bars):
+        """绘制K线柱（bars 为 OHLCPyramid.query 的结果）"""
         try:
-            for i in range(len(df)):
-                row = df.iloc[i]
-                
-                # 安全转换数值，处理可能的数据类型问题
-                try:
-                    open_price = float(row['开盘'])
-                    high_price = float(row['最高'])
-                    low_price = float(row['最低'])
-                    close_price = float(row['收盘'])
-                except (ValueError, KeyError) as e:
-                    print(f"数据转换错误 第{i}行: {e}")
-                    continue
-                
-                # 确定K线颜色（中国习惯：红涨绿跌）
-                if close_price >= open_price:
-                    color = '#FF0000'  # 红色
-                    edge_color = '#CC0000'
-                else:
-                    color = '#00AA00'  # 绿色
-                    edge_color = '#008800'
-                
-                # 绘制上下影线
-                self.ax_kline.plot([i, i], [low_price, high_price], 
-                                  color='black', linewidth=1, solid_capstyle='round')
-                
-                # 绘制K线实体
-                body_height = abs(close_price - open_price)
-                body_bottom = min(open_price, close_price)
-                
-                if body_height > 0.01:  # 避免过小的实体
-                    # 有实体的K线
-                    from matplotlib.patches import Rectangle
-                    rect = Rectangle((i-0.4, body_bottom), 0.8, body_height,
-                                   facecolor=color, edgecolor=edge_color, 
-                                   alpha=0.8, linewidth=0.5)
-                    self.ax_kline.add_patch(rect)
-                else:
-                    # 十字星（开盘价=收盘价）
-                    self.ax_kline.plot([i-0.4, i+0.4], [close_price, close_price], 
-                                     color=color, linewidth=2)
+            artists = draw_candlesticks(self.ax_kline, bars['x'], bars['open'], bars['high'], bars['low'],
+                                        bars['close'], width=bars['width'], autoscale=False)
+            self._bar_artists.extend(artists.values())
         except Exception as e:
             print(f"绘制K线错误: {e}")
                                  
-    def draw_volume_bars(self, df):
+    def draw_volume_bars(self, bars):
         """绘制成交量柱状图"""
         try:
-            volumes = []
-            colors = []
-            
-            for i in range(len(df)):
-                row = df.iloc[i]
-                
-                try:
-                    volume = float(row['成交量'])
-                    open_price = float(row['开盘'])
-                    close_price = float(row['收盘'])
-                    
-                    volumes.append(volume)
-                    # 成交量柱颜色与K线一致
-                    color = '#FF0000' if close_price >= open_price else '#00AA00'
-                    colors.append(color)
-                    
-                except (ValueError, KeyError) as e:
-                    print(f"成交量数据错误 第{i}行: {e}")
-                    volumes.append(0)
-                    colors.append('#CCCCCC')
-            
-            # 批量绘制成交量柱
-            bars = self.ax_volume.bar(range(len(volumes)), volumes, 
-                                     width=0.8, color=colors, alpha=0.7)
-            
+            # 成交量柱颜色与K线一致
+            self._bar_artists.append(draw_volume(self.ax_volume, bars['x'], bars['volume'], bars['open'],
+                                                 bars['close'], width=bars['width'], alpha=0.7, autoscale=False))
         except Exception as e:
             print(f"绘制成交量错误: {e}")
             
-    def setup_chart_style(self, df):
+    def format_date_tick(self, x, pos=None):
+        """X轴刻度：K线序号 -> 日期，可见跨度超过一年时显示年月"""
+        dates = self._chart_dates
+        index = int(round(x))
+        if dates is None or not 0 <= index < len(dates) or pd.isna(dates[index]):
+            return ''
+        left, right = self.ax_volume.get_xlim()
+        return dates[index].strftime('%Y-%m' if right - left > 250 else '%m-%d')
+            
+    def setup_chart_style(self):
         """设置图表样式"""
         try:
             # K线图设置
@@ -448,51 +466,18 @@ class RealKlineUI:
             
             # 成交量图设置
             self.ax_volume.set_ylabel("成交量", fontsize=11)
-            self.ax_volume.set_xlabel("交易日期", fontsize=11)
+            self.ax_volume.set_xlabel("交易日期（滚轮缩放 / 拖动平移 / 双击显示全部）", fontsize=11)
             self.ax_volume.grid(True, alpha=0.3, linestyle='--')
             
-            # 设置X轴标签 - 修复坐标问题
-            if len(df) > 0 and '日期' in df.columns:
-                # 确定标签间隔，避免过于密集
-                total_bars = len(df)
-                if total_bars <= 10:
-                    step = 1
-                elif total_bars <= 20:
-                    step = 2
-                else:
-                    step = max(1, total_bars // 8)
-                
-                # 生成X轴位置和标签
-                x_positions = list(range(0, total_bars, step))
-                x_labels = []
-                
-                for pos in x_positions:
-                    if pos < len(df):
-                        try:
-                            date_obj = df.iloc[pos]['日期']
-                            if pd.isna(date_obj):
-                                x_labels.append('')
-                            else:
-                                # 处理日期格式
-                                if isinstance(date_obj, str):
-                                    date_obj = pd.to_datetime(date_obj)
-                                x_labels.append(date_obj.strftime('%m-%d'))
-                        except Exception as e:
-                            print(f"日期格式处理错误: {e}")
-                            x_labels.append(f"Day{pos+1}")
-                
-                # 设置X轴刻度 - 留出右边空间以显示完整的K线
-                self.ax_kline.set_xlim(-1, total_bars)
-                self.ax_kline.set_xticks(x_positions)
-                self.ax_kline.set_xticklabels(x_labels, rotation=45, ha='right')
-                
-                self.ax_volume.set_xlim(-1, total_bars)
-                self.ax_volume.set_xticks(x_positions)
-                self.ax_volume.set_xticklabels(x_labels, rotation=45, ha='right')
-                
-                # 设置Y轴格式
-                self.ax_kline.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x:.2f}'))
-                self.ax_volume.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x:,.0f}'))
+            # X轴刻度随视口变化自动生成，标签由序号映射为日期
+            for ax in (self.ax_kline, self.ax_volume):
+                ax.xaxis.set_major_locator(MaxNLocator(nbins=8, integer=True))
+                ax.xaxis.set_major_formatter(FuncFormatter(self.format_date_tick))
+                ax.tick_params(axis='x', labelrotation=45)
+            
+            # 设置Y轴格式
+            self.ax_kline.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x:.2f}'))
+            self.ax_volume.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x:,.0f}'))
             
             # 调整布局 - 增加右边距
             self.fig.tight_layout(rect=[0, 0.03, 0.95, 0.97])
@@ -500,6 +485,45 @@ class RealKlineUI:
             
         except Exception as e:
             print(f"设置图表样式错误: {e}")
+            
+    def load_older_bars(self):
+        """视口接近左边缘：后台加载更早的K线（由 ViewportManager 调用）"""
+        if self.current_data is None or self.current_data.empty:
+            self.viewport.mark_exhausted()
+            return
+        oldest = str(self.current_data.iloc[0]['日期'])[:10]
+        self.update_status("加载更早的历史数据...")
+        threading.Thread(target=self.load_older_thread, args=(self.current_stock, oldest), daemon=True).start()
+        
+    def load_older_thread(self, stock_code, oldest):
+        """先查本地存储，不足一页再从网络获取并写回本地"""
+        try:
+            older = self.bar_store.load(stock_code, end_date=oldest, limit=OLDER_PAGE_BARS)
+            if len(older) < OLDER_PAGE_BARS:
+                end_date = pd.to_datetime(oldest) - timedelta(days=1)
+                fetched = self.fetcher.get_historical_data(stock_code, end_date=end_date.strftime('%Y%m%d'),
+                                                           count=OLDER_PAGE_BARS)
+                if fetched is not None and not fetched.empty:
+                    self.bar_store.merge(stock_code, fetched)
+                    older = self.bar_store.load(stock_code, end_date=oldest, limit=OLDER_PAGE_BARS)
+        except Exception as e:
+            print(f"加载更早数据错误: {e}")
+            older = None
+        self.scheduler.mark_dirty("older_bars", self.prepend_bars, stock_code, older)
+        
+    def prepend_bars(self, stock_code, older):
+        """在主线程把更早的K线拼到当前数据前面"""
+        if stock_code != self.current_stock or self.current_data is None:
+            return
+        if older is None or older.empty:
+            self.viewport.mark_exhausted()
+            self.update_status("没有更早的历史数据")
+            return
+        
+        self.current_data = pd.concat([older, self.current_data], ignore_index=True)
+        self.update_stats()
+        self.viewport.prepend(len(older))
+        self.update_status(f"已加载更早的 {len(older)} 根K线")
         
     def refresh_data(self):
         """刷新当前数据"""
@@ -511,6 +535,10 @@ class RealKlineUI:
     def update_status(self, message):
         """更新状态显示"""
         self.status_var.set(message)
+        
+    def post_status(self, message):
+        """后台线程更新状态：下一帧显示，只保留最新一条"""
+        self.scheduler.mark_dirty("status", self.update_status, message)
 
 def main():
     """主程序入口"""
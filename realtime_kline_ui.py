@@ -9,14 +9,24 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import matplotlib.dates as mdates
+from matplotlib.lines import Line2D
 from matplotlib.patches import Rectangle
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import threading
-import time
+import os
 
-from data_fetcher import StockDataFetcher
+from config import DATA_DIR
+from data_fetcher import create_fetcher
+from kline_renderer import ohlcv_arrays, draw_candlesticks, draw_volume, BlitManager
+from latency_trace import TraceRecorder
+from profiling import profiled
+from render_scheduler import RenderScheduler
+from price_stream import PriceStreamView
+from font_utils import setup_cjk_font
+from quote_hub import TRADE_FIELDS, get_hub, trace_for
+from update_engine import UpdateEngine
 
 class RealtimeKlineUI:
     def __init__(self, root):
@@ -26,17 +36,32 @@ class RealtimeKlineUI:
         self.root.state('zoomed')  # 最大化窗口
         
         # 数据相关
-        self.fetcher = StockDataFetcher()
+        self.fetcher = create_fetcher()
         self.current_stock = "601127"
         self.update_interval = 30  # 30秒更新一次，比同花顺更快
         self.is_updating = False
-        self.update_thread = None
+        self.subscription = None
+        self.update_count = 0
         
         # 存储数据
         self.kline_data = pd.DataFrame()
         self.realtime_prices = []
         self.price_timestamps = []
         
+        # 端到端延迟追踪
+        self.trace_recorder = TraceRecorder()
+        
+        # 界面刷新调度：后台线程只标记需要刷新的部分，主线程按帧合并执行
+        self.scheduler = RenderScheduler(self.root)
+        # 后台任务：固定大小线程池，停止/重新开始后旧任务的结果直接丢弃
+        self.engine = UpdateEngine(self.scheduler)
+        self._latest_quote = None
+        # 上次刷新以来变化过的行情字段
+        self._changed_fields = set()
+        # 轮询线程收到、主线程尚未处理的行情（每笔都要记录，不能按帧覆盖）
+        self._pending_ticks = []
+        self._ticks_lock = threading.Lock()
+        
         # 创建界面
         self.create_widgets()
         self.setup_matplotlib_style()
@@ -74,11 +99,16 @@ class RealtimeKlineUI:
         self.stop_btn.pack(side="left", padx=5)
         
         ttk.Button(control_frame, text="刷新图表", command=self.refresh_chart).pack(side="left", padx=5)
+        ttk.Button(control_frame, text="导出延迟", command=self.export_latency_csv).pack(side="left", padx=5)
         
         # 状态显示
         self.status_var = tk.StringVar(value="就绪")
         ttk.Label(control_frame, textvariable=self.status_var, foreground="blue").pack(side="right")
         
+        # 端到端延迟显示
+        self.latency_var = tk.StringVar(value="延迟: --")
+        ttk.Label(control_frame, textvariable=self.latency_var, foreground="orange").pack(side="right", padx=(0, 15))
+        
         # 主内容区域
         main_frame = ttk.Frame(self.root)
         main_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
@@ -108,12 +138,16 @@ class RealtimeKlineUI:
         self.canvas = FigureCanvasTkAgg(self.fig, parent)
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
         
+        # 静态图层缓存 + 局部刷新
+        self.init_chart_cache()
+        
         # 初始化图表
         self.init_empty_chart()
         
     def setup_matplotlib_style(self):
         """设置matplotlib样式"""
         plt.style.use('default')
+        setup_cjk_font()
         self.fig.patch.set_facecolor('white')
         
     def init_empty_chart(self):
@@ -157,12 +191,10 @@ class RealtimeKlineUI:
         realtime_frame = ttk.LabelFrame(parent, text="价格动态", padding=10)
         realtime_frame.pack(fill="x", pady=(0, 10))
         
-        self.price_listbox = tk.Listbox(realtime_frame, height=8, font=("Courier", 9))
-        scrollbar = ttk.Scrollbar(realtime_frame, orient="vertical", command=self.price_listbox.yview)
-        self.price_listbox.configure(yscrollcommand=scrollbar.set)
-        
-        self.price_listbox.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        # 环形缓冲区，只绘制可见行
+        self.price_stream = PriceStreamView(realtime_frame, capacity=2000, height=8,
+                                            scheduler=self.scheduler)
+        self.price_stream.pack(fill="both", expand=True)
         
         # 更新统计
         stats_frame = ttk.LabelFrame(parent, text="更新统计", padding=10)
@@ -186,6 +218,8 @@ class RealtimeKlineUI:
             self.update_interval = 30
         elif "60秒" in interval_text:
             self.update_interval = 60
+        if self.subscription is not None:
+            self.subscription.set_interval(self.update_interval)
             
     def start_realtime_update(self):
         """开始实时更新"""
@@ -198,85 +232,97 @@ class RealtimeKlineUI:
             return
             
         self.is_updating = True
+        self.update_count = 0
         self.start_btn.config(state="disabled")
         self.stop_btn.config(state="normal")
         
-        # 启动更新线程
-        self.update_thread = threading.Thread(target=self.update_loop, daemon=True)
-        self.update_thread.start()
+        # 新的一代任务：加载历史数据后向行情中心订阅，上一次启动的任务全部作废
+        token = self.engine.start()
+        with self._ticks_lock:
+            self._pending_ticks.clear()
+        self.engine.submit(self.update_loop, self.current_stock, token=token)
         
         self.update_status(f"开始实时更新 {self.current_stock} (间隔: {self.update_interval}秒)")
         
     def stop_realtime_update(self):
-        """停止实时更新"""
+        """停止实时更新（订阅随代号一起关闭）"""
         self.is_updating = False
+        self.engine.stop()
         self.start_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
         self.update_status("已停止更新")
         
-    def update_loop(self):
-        """更新循环"""
-        update_count = 0
-        
-        # 首次加载历史数据
-        self.load_historical_data()
+    def update_loop(self, token, stock_code):
+        """首次加载历史数据，之后行情由 QuoteHub 统一轮询推送"""
+        self.load_historical_data(token, stock_code)
+        if token.cancelled:
+            return
+        subscription = get_hub().subscribe([stock_code], lambda quotes: self.on_quotes(token, stock_code, quotes),
+                                           interval=self.update_interval)
+        self.subscription = subscription
+        self.engine.attach(token, lambda: self.close_subscription(subscription))
+        
+    def close_subscription(self, subscription):
+        subscription.close()
+        if self.subscription is subscription:
+            self.subscription = None
+        
+    def on_quotes(self, token, stock_code, quotes):
+        """QuoteHub 推送行情（轮询线程）：只放入待处理列表，价格记录和图表刷新在主线程进行"""
+        if token.cancelled:
+            return
+        quote = quotes.get(stock_code)
+        if not quote:
+            self.engine.post(token, "status", self.update_status, "本轮未获取到行情")
+            return
+        # 只有买卖盘变化时本视图没有要更新的内容
+        changed = set(quote.get('changed_fields', quote))
+        if not changed & TRADE_FIELDS:
+            return
+            
+        trace = trace_for(quote, stock_code)
+        trace.mark("queued")
+        with self._ticks_lock:
+            self._pending_ticks.append((quote, changed, datetime.now(), trace))
+        self.engine.post(token, "ticks", self.drain_ticks)
+        
+    def drain_ticks(self):
+        """主线程：按顺序记录积压的每笔行情，再按最新一笔刷新图表和统计"""
+        with self._ticks_lock:
+            ticks, self._pending_ticks = self._pending_ticks, []
+        if not ticks:
+            return
+        for quote, changed, received_at, _ in ticks:
+            self.record_realtime_price(quote['price'], quote['change'], received_at, quote.get('volume'), changed)
+        self.update_count += len(ticks)
         
-        while self.is_updating:
-            try:
-                update_count += 1
-                
-                # 模拟获取实时价格（实际场景中这里会调用实时API）
-                self.simulate_realtime_price()
-                
-                # 更新图表
-                self.root.after(0, self.update_chart)
+        self.update_chart(ticks[-1][3])
+        self.update_counter(self.update_count, ticks[-1][2])
                 
-                # 更新统计信息
-                self.root.after(0, lambda: self.update_count_var.set(str(update_count)))
-                self.root.after(0, lambda: self.last_update_var.set(datetime.now().strftime("%H:%M:%S")))
-                
-                # 等待下次更新
-                time.sleep(self.update_interval)
-                
-            except Exception as e:
-                self.root.after(0, lambda: self.update_status(f"更新错误: {str(e)}"))
-                break
-                
-    def load_historical_data(self):
-        """加载历史数据"""
+    def load_historical_data(self, token, stock_code):
+        """加载历史数据（线程池中执行，结果在主线程落到界面）"""
         try:
-            self.update_status("加载历史数据...")
+            self.engine.post(token, "status", self.update_status, "加载历史数据...")
             
-            # 获取历史数据
-            hist_data = self.fetcher.get_historical_data(self.current_stock)
-            if hist_data is not None:
-                self.kline_data = hist_data.tail(50)  # 只取最近50根K线
-                
-                # 获取基本信息
-                info = self.fetcher.get_stock_info(self.current_stock)
-                if info:
-                    self.root.after(0, lambda: self.stock_name_var.set(info.get('股票简称', '--')))
-                    
-            self.update_status("历史数据加载完成")
+            # 获取历史数据和基本信息
+            hist_data = self.fetcher.get_historical_data(stock_code)
+            info = self.fetcher.get_stock_info(stock_code) if hist_data is not None else None
+            
+            self.engine.post(token, "history", self.on_historical_data, hist_data, info)
             
         except Exception as e:
-            self.update_status(f"历史数据加载失败: {str(e)}")
+            self.engine.post(token, "status", self.update_status, f"历史数据加载失败: {str(e)}")
             
-    def simulate_realtime_price(self):
-        """模拟实时价格数据（演示用）"""
-        if self.kline_data.empty:
-            return
+    def on_historical_data(self, hist_data, info):
+        """主线程：应用历史数据"""
+        if hist_data is not None:
+            self.kline_data = hist_data.tail(50)  # 只取最近50根K线
+        if info:
+            self.stock_name_var.set(info.get('股票简称', '--'))
+        self.update_status("历史数据加载完成")
             
-        # 基于最后价格生成模拟实时价格
-        last_price = float(self.kline_data.iloc[-1]['收盘'])
-        
-        # 随机波动 ±1%
-        change_percent = np.random.uniform(-0.01, 0.01)
-        new_price = last_price * (1 + change_percent)
-        
-        current_time = datetime.now()
-        
-        # 存储实时价格点
+    def record_realtime_price(self, new_price, change_percent, current_time, volume=None, changed=None):
+        """存储实时价格点并更新实时信息"""
         self.realtime_prices.append(new_price)
         self.price_timestamps.append(current_time)
         
@@ -285,54 +331,184 @@ class RealtimeKlineUI:
             self.realtime_prices = self.realtime_prices[-100:]
             self.price_timestamps = self.price_timestamps[-100:]
             
-        # 更新实时信息
-        change_amount = new_price - last_price
-        change_percent = (change_amount / last_price) * 100
-        
-        self.root.after(0, lambda: self.current_price_var.set(f"{new_price:.2f}"))
-        self.root.after(0, lambda: self.change_var.set(f"{change_percent:+.2f}%"))
-        
-        # 添加价格动态记录
-        time_str = current_time.strftime("%H:%M:%S")
-        price_text = f"{time_str} {new_price:.2f} ({change_percent:+.2f}%)"
-        
-        self.root.after(0, lambda: self.add_price_record(price_text))
-        
-    def add_price_record(self, text):
-        """添加价格记录"""
-        self.price_listbox.insert(0, text)
-        if self.price_listbox.size() > 20:
-            self.price_listbox.delete(20, tk.END)
-            
-    def update_chart(self):
-        """更新图表"""
+        # 更新实时信息（只保留最新一笔），价格记录写入价格流，下一帧统一绘制
+        self._latest_quote = (new_price, change_percent, volume)
+        # 未给出变化字段时全部刷新
+        self._changed_fields |= {'price', 'change', 'volume'} if changed is None else set(changed)
+        self.price_stream.push(new_price, change_percent, volume or 0, self.current_stock, current_time)
+        
+        self.scheduler.mark_dirty("price_info", self.refresh_price_info)
+        
+    def refresh_price_info(self):
+        """刷新实时价格信息（每帧最多一次，只写入变化过的字段）"""
+        changed, self._changed_fields = self._changed_fields, set()
+        if self._latest_quote is not None:
+            new_price, change_percent, volume = self._latest_quote
+            if 'price' in changed:
+                self.current_price_var.set(f"{new_price:.2f}")
+            if 'change' in changed:
+                self.change_var.set(f"{change_percent:+.2f}%")
+            if volume is not None and 'volume' in changed:
+                self.volume_var.set(f"{volume:,.0f}")
+        
+    def update_counter(self, update_count, updated_at):
+        """更新次数和最后更新时间"""
+        self.update_count_var.set(str(update_count))
+        self.last_update_var.set(updated_at.strftime("%H:%M:%S"))
+        
+    @profiled("draw.RealtimeKlineUI.update_chart")
+    def update_chart(self, trace=None):
+        """更新图表：静态图层未变化时只局部刷新最后一根K线、实时价格线和价格标记"""
         if self.kline_data.empty:
             return
             
         try:
-            # 清空图表
-            self.ax1.clear()
-            self.ax2.clear()
-            
-            # 绘制K线图
-            self.draw_kline()
-            
-            # 绘制实时价格线
-            if len(self.realtime_prices) > 1:
-                self.draw_realtime_line()
+            # 静态图层（坐标轴、网格、历史K线、成交量、刻度）失效时才整图重绘
+            if self._static_key != self.static_layer_key():
+                self.draw_static_layers()
+                
+            self.update_live_artists()
             
-            # 绘制成交量
-            self.draw_volume()
+            # 实时价格超出当前坐标范围时需要重新计算刻度
+            if not self.live_artists_fit():
+                self.draw_static_layers()
+                self.update_live_artists()
+                
+            if trace is not None:
+                trace.mark("draw_done")
             
-            # 设置图表样式
-            self.setup_chart_style()
+            # 局部刷新画布
+            self.blit_manager.update(self.ax1.bbox)
+            self.canvas.flush_events()
             
-            # 刷新画布
-            self.canvas.draw()
+            if trace is not None:
+                trace.mark("canvas_flushed")
+                self.trace_recorder.add(trace)
+                self.latency_var.set(f"延迟: {trace.format_status()}")
             
         except Exception as e:
             self.update_status(f"图表更新失败: {str(e)}")
             
+    def init_chart_cache(self):
+        """初始化静态图层缓存和局部刷新管理器"""
+        self.blit_manager = BlitManager(self.canvas)
+        self._static_key = None
+        self.live_artists = {}
+        
+    def invalidate_static_layers(self):
+        """强制下次更新整图重绘"""
+        self._static_key = None
+        
+    def static_layer_key(self):
+        """静态图层内容标识：股票或历史K线变化时失效"""
+        last_date = str(self.kline_data.iloc[-1]['日期']) if not self.kline_data.empty else ""
+        return (self.current_stock, id(self.kline_data), len(self.kline_data), last_date)
+        
+    def draw_static_layers(self):
+        """整图重绘静态图层，并重建动画图元"""
+        self.ax1.clear()
+        self.ax2.clear()
+        
+        # 历史K线（最后一根作为实时K线单独绘制）
+        self.draw_kline()
+        
+        # 绘制成交量
+        self.draw_volume()
+        
+        # 设置图表样式
+        self.setup_chart_style()
+        
+        # 动画图元：实时K线（影线+实体）、实时价格线、价格标记线和标签
+        self.live_artists = {
+            'wick': Line2D([], [], color='black', linewidth=1),
+            'body': Rectangle((0, 0), 0.6, 0, facecolor='red', alpha=0.7, edgecolor='black', linewidth=0.5),
+            'line': Line2D([], [], color='blue', linewidth=2, alpha=0.8, label='实时价格'),
+            'marker': Line2D([], [], color='blue', linewidth=0.8, linestyle='--', alpha=0.6),
+            'label': self.ax1.text(0.995, 0, '', transform=self.ax1.get_yaxis_transform(),
+                                   ha='right', va='center', fontsize=9, color='white',
+                                   bbox=dict(boxstyle='round,pad=0.2', facecolor='blue', alpha=0.8)),
+        }
+        for key in ('wick', 'line', 'marker'):
+            self.ax1.add_line(self.live_artists[key])
+        self.ax1.add_patch(self.live_artists['body'])
+        
+        self.blit_manager.clear_artists()
+        for artist in self.live_artists.values():
+            self.blit_manager.add_artist(artist)
+            
+        self.ax1.legend(handles=[self.live_artists['line']], loc='upper left')
+        
+        # 预留价格和时间余量，实时价格小幅波动时无需重算刻度
+        self.fit_live_limits()
+        self.fig.tight_layout()
+        
+        self.canvas.draw()
+        self._static_key = self.static_layer_key()
+        
+    def live_candle(self):
+        """最后一根K线叠加实时价格后的 (x, 开, 高, 低, 收)"""
+        last = self.kline_data.iloc[-1]
+        x = mdates.date2num(pd.to_datetime(last['日期']))
+        open_price = float(last['开盘'])
+        high_price = float(last['最高'])
+        low_price = float(last['最低'])
+        close_price = float(last['收盘'])
+        
+        if self.realtime_prices:
+            close_price = self.realtime_prices[-1]
+            high_price = max(high_price, max(self.realtime_prices))
+            low_price = min(low_price, min(self.realtime_prices))
+        return x, open_price, high_price, low_price, close_price
+        
+    def update_live_artists(self):
+        """用 set_data 更新实时K线、实时价格线和价格标记"""
+        x, open_price, high_price, low_price, close_price = self.live_candle()
+        color = 'red' if close_price >= open_price else 'green'
+        
+        self.live_artists['wick'].set_data([x, x], [low_price, high_price])
+        body = self.live_artists['body']
+        body.set_xy((x - 0.3, min(open_price, close_price)))
+        body.set_height(abs(close_price - open_price))
+        body.set_facecolor(color)
+        
+        # 取快照：价格列表由更新线程追加，避免图元引用到变化中的列表
+        count = min(len(self.realtime_prices), len(self.price_timestamps))
+        if count > 1:
+            timestamps = mdates.date2num(self.price_timestamps[-count:])
+            self.live_artists['line'].set_data(timestamps, np.array(self.realtime_prices[-count:]))
+        else:
+            self.live_artists['line'].set_data([], [])
+            
+        self.live_artists['marker'].set_data(self.ax1.get_xlim(), [close_price, close_price])
+        label = self.live_artists['label']
+        label.set_y(close_price)
+        label.set_text(f"{close_price:.2f}")
+        
+    def fit_live_limits(self):
+        """坐标范围覆盖实时价格和时间，并留出余量"""
+        _, _, high_price, low_price, _ = self.live_candle()
+        y_min, y_max = self.ax1.get_ylim()
+        pad = (max(y_max, high_price) - min(y_min, low_price)) * 0.05
+        self.ax1.set_ylim(min(y_min, low_price - pad), max(y_max, high_price + pad))
+        
+        if self.price_timestamps:
+            x_min, x_max = self.ax1.get_xlim()
+            latest = mdates.date2num(self.price_timestamps[-1])
+            self.ax1.set_xlim(x_min, max(x_max, latest + 1))
+            self.ax2.set_xlim(self.ax1.get_xlim())
+            
+    def live_artists_fit(self):
+        """实时图元是否仍在当前坐标范围内"""
+        _, _, high_price, low_price, _ = self.live_candle()
+        y_min, y_max = self.ax1.get_ylim()
+        if low_price < y_min or high_price > y_max:
+            return False
+        if self.price_timestamps:
+            x_min, x_max = self.ax1.get_xlim()
+            if mdates.date2num(self.price_timestamps[-1]) > x_max:
+                return False
+        return True
+        
     def draw_kline(self):
         """绘制K线图"""
         df = self.kline_data.copy()
@@ -340,49 +516,24 @@ class RealtimeKlineUI:
         # 转换日期
         df['日期'] = pd.to_datetime(df['日期'])
         
-        # 绘制K线
-        for i, row in df.iterrows():
-            date = mdates.date2num(row['日期'])
-            open_price = float(row['开盘'])
-            high_price = float(row['最高'])
-            low_price = float(row['最低'])
-            close_price = float(row['收盘'])
-            
-            # 确定颜色
-            color = 'red' if close_price >= open_price else 'green'
-            
-            # 绘制影线
-            self.ax1.plot([date, date], [low_price, high_price], color='black', linewidth=1)
+        # 绘制历史K线（最后一根由实时图元绘制）
+        df = df.iloc[:-1]
+        dates = mdates.date2num(df['日期'])
+        opens, highs, lows, closes, _ = ohlcv_arrays(df)
+        draw_candlesticks(self.ax1, dates, opens, highs, lows, closes, width=0.6,
+                          up_color='red', down_color='green',
+                          up_edge_color='black', down_edge_color='black',
+                          alpha=0.7, edge_width=0.5, doji_threshold=None)
             
-            # 绘制实体
-            height = abs(close_price - open_price)
-            bottom = min(open_price, close_price)
-            
-            rect = Rectangle((date - 0.3, bottom), 0.6, height, 
-                           facecolor=color, alpha=0.7, edgecolor='black', linewidth=0.5)
-            self.ax1.add_patch(rect)
-            
-    def draw_realtime_line(self):
-        """绘制实时价格线"""
-        if len(self.realtime_prices) < 2:
-            return
-            
-        # 转换时间戳
-        timestamps = [mdates.date2num(ts) for ts in self.price_timestamps]
-        
-        # 绘制实时价格线
-        self.ax1.plot(timestamps, self.realtime_prices, 'blue', linewidth=2, alpha=0.8, label='实时价格')
-        self.ax1.legend()
-        
     def draw_volume(self):
         """绘制成交量"""
         df = self.kline_data.copy()
         df['日期'] = pd.to_datetime(df['日期'])
         
-        dates = [mdates.date2num(date) for date in df['日期']]
-        volumes = [float(vol) for vol in df['成交量']]
+        dates = mdates.date2num(df['日期'])
+        _, _, _, _, volumes = ohlcv_arrays(df)
         
-        self.ax2.bar(dates, volumes, width=0.6, alpha=0.7, color='gray')
+        draw_volume(self.ax2, dates, volumes, width=0.6, color='gray', alpha=0.7)
         
     def setup_chart_style(self):
         """设置图表样式"""
@@ -403,10 +554,21 @@ class RealtimeKlineUI:
         # 自动调整布局
         self.fig.tight_layout()
         
+    def export_latency_csv(self):
+        """导出端到端延迟时间线"""
+        if self.trace_recorder.latest() is None:
+            messagebox.showinfo("提示", "暂无延迟记录，请先开始实时更新")
+            return
+            
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(DATA_DIR, f"latency_{self.current_stock}_{timestamp}.csv")
+        count = self.trace_recorder.export_csv(path)
+        self.update_status(f"已导出 {count} 条延迟记录: {path}")
+        
     def refresh_chart(self):
         """刷新图表"""
         if not self.is_updating:
-            threading.Thread(target=self.load_historical_data, daemon=True).start()
+            self.engine.submit(self.load_historical_data, self.current_stock, key="history")
             
     def update_status(self, message):
         """更新状态"""
@@ -0,0 +1,90 @@
+"""
+界面刷新调度器
+后台线程只标记"某部分需要刷新"，主线程按固定帧率（默认30fps）统一执行：
+- 同一个 key 在一帧内多次标记只执行最后一次，旧的更新直接丢弃而不是排队
+- 每帧最多执行一次各 key 的回调，整图重绘不会因为积压的回调而连续执行多次
+- 某一帧耗时超过帧预算时，下一帧顺延，留出时间处理鼠标键盘事件
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Hashable, Tuple
+
+DEFAULT_FPS = 30
+
+
+class RenderScheduler:
+    """按帧合并 Tk 界面更新，mark_dirty 可在任意线程调用"""
+
+    def __init__(self, root, fps: int = DEFAULT_FPS):
+        self.root = root
+        self.frame_ms = max(1, int(1000 / fps))
+        self._lock = threading.Lock()
+        self._dirty: Dict[Hashable, Tuple[Callable, tuple]] = {}
+        self._after_id = None
+        self._running = False
+
+        # 统计：已执行帧数、被合并丢弃的更新数、超出帧预算的帧数
+        self.frames = 0
+        self.dropped = 0
+        self.overruns = 0
+
+        self.start()
+
+    def mark_dirty(self, key: Hashable, callback: Callable, *args):
+        """标记 key 需要刷新，下一帧执行 callback(*args)；同 key 未执行的旧回调被替换"""
+        with self._lock:
+            if key in self._dirty:
+                self.dropped += 1
+            self._dirty[key] = (callback, args)
+
+    def cancel(self, key: Hashable):
+        with self._lock:
+            self._dirty.pop(key, None)
+
+    def start(self):
+        """开始帧循环（须在主线程调用）"""
+        if self._running:
+            return
+        self._running = True
+        self._after_id = self.root.after(self.frame_ms, self._tick)
+
+    def stop(self):
+        self._running = False
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+
+    def flush(self):
+        """立即在当前线程执行所有待刷新回调（主线程）"""
+        with self._lock:
+            pending, self._dirty = self._dirty, {}
+        for callback, args in pending.values():
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"界面刷新错误: {e}")
+        return len(pending)
+
+    def _tick(self):
+        if not self._running:
+            return
+
+        started = time.perf_counter()
+        if self.flush():
+            self.frames += 1
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        # 超出帧预算：整帧顺延，期间新的标记会被合并
+        delay = self.frame_ms
+        if elapsed_ms > self.frame_ms:
+            self.overruns += 1
+            delay = max(self.frame_ms, int(elapsed_ms))
+        try:
+            self._after_id = self.root.after(delay, self._tick)
+        except Exception:
+            # 窗口已销毁
+            self._running = False
@@ -0,0 +1,453 @@
+"""
+分片全市场行情采集
+把全市场股票按工作进程分片，每个进程只批量请求自己的分片，结果汇总到协调器：
+- 协调器: 记录存活的工作进程，用最高随机权重（rendezvous）哈希分配股票，进程加入或退出时只移动约 1/N 的股票；
+  合并各分片上报的行情，定期原子写入 data/market_quotes.csv；/status 和 /metrics 给出各分片吞吐
+- 工作进程: 每轮把上一轮的行情和统计上报给协调器，同时取回最新分配，然后批量请求自己的分片；
+  可以在本机（local 子命令按进程数启动）或其他主机上运行（worker 子命令指向协调器地址）
+- 替身行情服务器: 按腾讯接口格式返回随机游走的行情，配合 config.TENCENT_QUOTE_URL 在单机上完整测试
+
+用法:
+    python sharded_collector.py fake-server --port 8700
+    python sharded_collector.py local --workers 4 --quote-url http://127.0.0.1:8700/q= --synthetic 5000
+    python sharded_collector.py coordinator --port 8710 --universe all
+    python sharded_collector.py worker --coordinator http://主机:8710
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from config import DATA_DIR
+
+DEFAULT_PORT = 8710
+DEFAULT_INTERVAL = 3.0
+QUOTES_FILE = os.path.join(DATA_DIR, "market_quotes.csv")
+# 合并结果写入文件的间隔（秒）
+FLUSH_SECONDS = 5.0
+# 上报中保存的行情字段
+QUOTE_FIELDS = ("name", "price", "change", "change_amount", "volume", "quote_time")
+
+
+def _json_request(url: str, payload: Dict, timeout: float = 10) -> Dict:
+    import requests
+    response = requests.post(url, json=payload, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+# ---- 协调器 ----
+
+def _weight(worker: str, code: str) -> bytes:
+    return hashlib.blake2b(f"{worker}:{code}".encode(), digest_size=8).digest()
+
+
+def assign_shards(codes: List[str], workers: List[str]) -> Dict[str, List[str]]:
+    """最高随机权重哈希：每只股票分给 hash(进程:代码) 最大的进程，成员变化时其余股票不动"""
+    shards = {worker: [] for worker in workers}
+    if not workers:
+        return shards
+    for code in codes:
+        owner = max(workers, key=lambda worker: _weight(worker, code))
+        shards[owner].append(code)
+    return shards
+
+
+class Coordinator:
+    """分片协调器，HTTP 接口在后台线程中服务"""
+
+    def __init__(self, codes: List[str], host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 interval: float = DEFAULT_INTERVAL, quotes_file: str = QUOTES_FILE):
+        self.codes = list(dict.fromkeys(codes))
+        self.interval = interval
+        self.quotes_file = quotes_file
+        # 超过这么久没有上报的进程视为退出
+        self.worker_ttl = max(10.0, interval * 3)
+        self.epoch = 0
+        self.workers: Dict[str, Dict] = {}
+        self.shards: Dict[str, List[str]] = {}
+        self.quotes: Dict[str, Dict] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def start(self) -> "Coordinator":
+        threading.Thread(target=self.server.serve_forever, name="coordinator", daemon=True).start()
+        threading.Thread(target=self._housekeeping, name="coordinator-flush", daemon=True).start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        self.server.shutdown()
+        self.server.server_close()
+        self.flush()
+
+    def _rebalance_locked(self):
+        self.epoch += 1
+        self.shards = assign_shards(self.codes, sorted(self.workers))
+
+    def _expire_locked(self, now: float):
+        expired = [w for w, info in self.workers.items() if now - info["last_seen"] > self.worker_ttl]
+        for worker in expired:
+            del self.workers[worker]
+        if expired:
+            self._rebalance_locked()
+
+    def report(self, worker: str, epoch: int, stats: Dict, quotes: Dict[str, Dict]) -> Dict:
+        """工作进程上报：合并行情、更新统计，返回分配（分配未变时不带股票列表）"""
+        now = time.time()
+        with self._lock:
+            self.quotes.update(quotes)
+            self._dirty = self._dirty or bool(quotes)
+            joined = worker not in self.workers
+            info = self.workers.setdefault(worker, {"joined": now})
+            info.update(stats, last_seen=now)
+            self._expire_locked(now)
+            if joined:
+                self._rebalance_locked()
+            reply = {"epoch": self.epoch, "interval": self.interval}
+            if epoch != self.epoch:
+                reply["codes"] = self.shards.get(worker, [])
+        return reply
+
+    def leave(self, worker: str):
+        with self._lock:
+            if self.workers.pop(worker, None) is not None:
+                self._rebalance_locked()
+
+    def _housekeeping(self):
+        while not self._stop.wait(FLUSH_SECONDS):
+            with self._lock:
+                self._expire_locked(time.time())
+            self.flush()
+
+    def flush(self):
+        """合并后的行情原子写入 CSV（先写临时文件再替换）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            rows = [{"code": code, **quote} for code, quote in sorted(self.quotes.items())]
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.quotes_file) or ".", exist_ok=True)
+        tmp = f"{self.quotes_file}.tmp"
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=("code",) + QUOTE_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(tmp, self.quotes_file)
+
+    def status(self) -> Dict:
+        with self._lock:
+            shards = {worker: {**info, "assigned": len(self.shards.get(worker, []))}
+                      for worker, info in self.workers.items()}
+            return {"epoch": self.epoch, "universe": len(self.codes), "covered": len(self.quotes),
+                    "workers": shards,
+                    "symbols_per_second": round(sum(s.get("symbols_per_second", 0) for s in shards.values()), 1)}
+
+    def to_prometheus(self) -> str:
+        """各分片吞吐（Prometheus 文本格式）"""
+        status = self.status()
+        lines = []
+        for metric in ("epoch", "universe", "covered"):
+            lines.append(f"# TYPE sharded_collector_{metric} gauge")
+            lines.append(f"sharded_collector_{metric} {status[metric]}")
+        for metric, key, kind in (("assigned", "assigned", "gauge"),
+                                  ("symbols_per_second", "symbols_per_second", "gauge"),
+                                  ("cycle_seconds", "cycle_seconds", "gauge"),
+                                  ("cycles_total", "cycles", "counter"),
+                                  ("errors_total", "errors", "counter")):
+            lines.append(f"# TYPE sharded_collector_shard_{metric} {kind}")
+            for worker, info in status["workers"].items():
+                lines.append(f'sharded_collector_shard_{metric}{{worker="{worker}"}} {info.get(key, 0)}')
+        return "\n".join(lines) + "\n"
+
+    def _handler_class(self):
+        coordinator = self
+
+        class CoordinatorHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                    if self.path == "/report":
+                        reply = coordinator.report(body["worker"], body.get("epoch", -1),
+                                                   body.get("stats", {}), body.get("quotes", {}))
+                    elif self.path == "/leave":
+                        coordinator.leave(body["worker"])
+                        reply = {"ok": True}
+                    else:
+                        self.send_error(404)
+                        return
+                except (KeyError, ValueError) as e:
+                    self.send_error(400, explain=f"参数错误: {e}")
+                    return
+                self.send_body(json.dumps(reply).encode("utf-8"), "application/json")
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/status":
+                    body = json.dumps(coordinator.status(), ensure_ascii=False)
+                    self.send_body(body.encode("utf-8"), "application/json; charset=utf-8")
+                elif url.path == "/metrics":
+                    self.send_body(coordinator.to_prometheus().encode("utf-8"),
+                                   "text/plain; version=0.0.4; charset=utf-8")
+                elif url.path == "/quotes":
+                    codes = parse_qs(url.query).get("codes", [""])[-1].split(",")
+                    with coordinator._lock:
+                        quotes = {c: coordinator.quotes[c] for c in codes if c in coordinator.quotes}
+                    self.send_body(json.dumps(quotes, ensure_ascii=False).encode("utf-8"),
+                                   "application/json; charset=utf-8")
+                else:
+                    self.send_error(404)
+
+            def send_body(self, body: bytes, content_type: str):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return CoordinatorHandler
+
+
+# ---- 工作进程 ----
+
+class ShardWorker:
+    """采集一个分片：批量请求腾讯行情，每轮结束向协调器上报并取回分配"""
+
+    def __init__(self, coordinator_url: str, worker_id: Optional[str] = None, quote_url: Optional[str] = None):
+        from data_fetcher import StockDataFetcher
+
+        self.coordinator_url = coordinator_url.rstrip("/")
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.fetcher = StockDataFetcher(quote_url=quote_url)
+        self.codes: List[str] = []
+        self.epoch = -1
+        self.interval = DEFAULT_INTERVAL
+        self.stats = {"cycles": 0, "errors": 0, "symbols": 0, "returned": 0,
+                      "cycle_seconds": 0.0, "symbols_per_second": 0.0}
+        self._stop = threading.Event()
+
+    def report(self, quotes: Dict[str, Dict]) -> bool:
+        try:
+            reply = _json_request(f"{self.coordinator_url}/report", {
+                "worker": self.worker_id, "epoch": self.epoch, "stats": self.stats, "quotes": quotes})
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[{self.worker_id}] 上报失败: {str(e)[:80]}")
+            return False
+        self.interval = reply.get("interval", self.interval)
+        if "codes" in reply:
+            self.codes = reply["codes"]
+            self.epoch = reply["epoch"]
+        return True
+
+    def fetch(self) -> Dict[str, Dict]:
+        """批量请求本分片（每 TENCENT_BATCH_SIZE 只一个请求），只保留上报字段"""
+        started = time.perf_counter()
+        quotes = self.fetcher.get_tencent_batch(self.codes) if self.codes else {}
+        seconds = time.perf_counter() - started
+        self.stats.update(cycles=self.stats["cycles"] + 1, symbols=len(self.codes), returned=len(quotes),
+                          cycle_seconds=round(seconds, 4),
+                          symbols_per_second=round(len(quotes) / seconds, 1) if seconds > 0 else 0.0)
+        return {code: {field: quote.get(field) for field in QUOTE_FIELDS} for code, quote in quotes.items()}
+
+    def run(self):
+        quotes = {}
+        while not self._stop.is_set():
+            started = time.monotonic()
+            if self.report(quotes):
+                quotes = {}
+            quotes.update(self.fetch())
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+        self.leave()
+
+    def leave(self):
+        try:
+            _json_request(f"{self.coordinator_url}/leave", {"worker": self.worker_id}, timeout=3)
+        except Exception:
+            pass
+
+    def stop(self, *_):
+        self._stop.set()
+
+
+def run_worker(coordinator_url: str, worker_id: Optional[str] = None, quote_url: Optional[str] = None):
+    """工作进程入口，SIGINT/SIGTERM 时退出分配并结束"""
+    worker = ShardWorker(coordinator_url, worker_id, quote_url)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, worker.stop)
+    worker.run()
+
+
+def run_local(codes: List[str], workers: int, interval: float = DEFAULT_INTERVAL,
+              quote_url: Optional[str] = None, port: int = 0):
+    """本机运行协调器和 workers 个工作进程，直到 Ctrl+C"""
+    coordinator = Coordinator(codes, port=port, interval=interval).start()
+    context = mp.get_context("spawn")
+    processes = [context.Process(target=run_worker, args=(coordinator.url, f"local-{i}", quote_url), daemon=True)
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    print(f"协调器: {coordinator.url}/status，{len(codes)} 只股票，{workers} 个工作进程")
+    try:
+        while True:
+            time.sleep(interval)
+            status = coordinator.status()
+            print(f"epoch {status['epoch']}  覆盖 {status['covered']}/{status['universe']}  "
+                  f"{status['symbols_per_second']} 只/秒  进程 {len(status['workers'])}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(5)
+        coordinator.close()
+
+
+# ---- 替身行情服务器 ----
+
+class StandInQuoteServer:
+    """按腾讯接口格式（GBK，~ 分隔）返回随机游走行情，GET /q=sh600000,sz000001"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8700, seed: int = 0, latency: float = 0.0):
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.prices: Dict[str, float] = {}
+        self.prev_close: Dict[str, float] = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}/q="
+
+    def start(self) -> "StandInQuoteServer":
+        threading.Thread(target=self.server.serve_forever, name="stand-in-quotes", daemon=True).start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def quote_line(self, symbol: str) -> str:
+        code = symbol[2:]
+        with self._lock:
+            if symbol not in self.prices:
+                self.prices[symbol] = self.prev_close[symbol] = round(self.rng.uniform(3, 200), 2)
+            price = round(max(0.01, self.prices[symbol] * (1 + self.rng.gauss(0, 0.002))), 2)
+            self.prices[symbol] = price
+            base = self.prev_close[symbol]
+            volume = self.rng.randint(1000, 10 ** 6)
+        parts = [""] * 50
+        parts[0:7] = ["1", f"测试{code}", code, f"{price:.2f}", f"{base:.2f}", f"{base:.2f}", str(volume)]
+        parts[30] = time.strftime("%Y%m%d%H%M%S")
+        parts[31] = f"{price - base:.2f}"
+        parts[32] = f"{(price - base) / base * 100:.2f}"
+        return f'v_{symbol}="{"~".join(parts)}";\n'
+
+    def _handler_class(self):
+        server = self
+
+        class QuoteHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not self.path.startswith("/q="):
+                    self.send_error(404)
+                    return
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                symbols = [s for s in self.path[3:].split(",") if len(s) == 8]
+                body = "".join(server.quote_line(s) for s in symbols).encode("gbk")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=GBK")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return QuoteHandler
+
+
+def synthetic_universe(count: int) -> List[str]:
+    """测试用股票代码：一半沪市 6 开头，一半深市"""
+    half = count // 2
+    return [f"{600000 + i}" for i in range(half)] + [f"{i + 1:06d}" for i in range(count - half)]
+
+
+def _universe(args) -> List[str]:
+    if args.synthetic:
+        return synthetic_universe(args.synthetic)
+    if args.universe == "all":
+        from collector import load_universe
+        return load_universe()
+    from config import STOCK_CODES
+    return list(args.codes or STOCK_CODES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片全市场行情采集")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("local", "coordinator"):
+        p = sub.add_parser(name)
+        p.add_argument("--port", type=int, default=DEFAULT_PORT if name == "coordinator" else 0)
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="每轮间隔（秒）")
+        p.add_argument("--universe", choices=["watchlist", "all"], default="all")
+        p.add_argument("--codes", nargs="*", help="指定股票代码（--universe watchlist 时使用）")
+        p.add_argument("--synthetic", type=int, help="使用 N 只虚拟股票代码（配合替身行情服务器）")
+        if name == "local":
+            p.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+            p.add_argument("--quote-url", help="行情接口前缀，默认 config.TENCENT_QUOTE_URL")
+
+    p = sub.add_parser("worker")
+    p.add_argument("--coordinator", required=True, help="协调器地址，如 http://10.0.0.1:8710")
+    p.add_argument("--id", help="进程标识，默认 主机名-PID")
+    p.add_argument("--quote-url")
+
+    p = sub.add_parser("fake-server")
+    p.add_argument("--port", type=int, default=8700)
+    p.add_argument("--latency", type=float, default=0.0, help="每个请求的模拟延迟（秒）")
+
+    args = parser.parse_args()
+    if args.command == "local":
+        run_local(_universe(args), args.workers, args.interval, args.quote_url, args.port)
+    elif args.command == "coordinator":
+        coordinator = Coordinator(_universe(args), args.host, args.port, args.interval).start()
+        print(f"协调器: {coordinator.url}  (/status /metrics /quotes?codes=)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            coordinator.close()
+    elif args.command == "worker":
+        run_worker(args.coordinator, args.id, args.quote_url)
+    else:
+        server = StandInQuoteServer(port=args.port, latency=args.latency).start()
+        print(f"替身行情服务器: {server.url}sh600000,sz000001")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
 import threading
+from collections import deque
 from datetime import datetime
 import pandas as pd
 import os
@@ -13,6 +14,11 @@ import os
 from data_fetcher import StockDataFetcher
 from config import STOCK_CODES
 from display_utils import format_stock_info, format_historical_summary
+from render_scheduler import RenderScheduler
+from update_engine import UpdateEngine
+
+# 批量获取的并发线程数（同时在途的请求数）
+BATCH_WORKERS = 8
 
 class StockDataUI:
     def __init__(self, root):
@@ -27,6 +33,15 @@ class StockDataUI:
         # 初始化数据获取器
         self.fetcher = StockDataFetcher()
         
+        # 界面刷新调度：后台线程输出的结果按帧批量写入文本框
+        self.scheduler = RenderScheduler(self.root)
+        self._pending_results = deque()
+        
+        # 批量获取：每只股票一个任务，重新开始或取消时旧任务的结果全部丢弃
+        self.engine = UpdateEngine(self.scheduler, max_workers=BATCH_WORKERS, name="batch")
+        self._batch_lock = threading.Lock()
+        self._batch = {"total": 0, "done": 0, "success": 0}
+        
         # 创建界面
         self.create_widgets()
         
@@ -92,8 +107,11 @@ class StockDataUI:
         button_frame = ttk.Frame(self.root)
         button_frame.pack(fill="x", padx=10, pady=10)
         
-        ttk.Button(button_frame, text="开始获取", command=self.start_fetch_data, 
-                  style="Accent.TButton").pack(side="left", padx=(0, 10))
+        self.start_btn = ttk.Button(button_frame, text="开始获取", command=self.start_fetch_data, 
+                                    style="Accent.TButton")
+        self.start_btn.pack(side="left", padx=(0, 10))
+        self.cancel_btn = ttk.Button(button_frame, text="取消", command=self.cancel_fetch, state="disabled")
+        self.cancel_btn.pack(side="left", padx=(0, 10))
         ttk.Button(button_frame, text="清空结果", command=self.clear_results).pack(side="left", padx=(0, 10))
         ttk.Button(button_frame, text="打开数据目录", command=self.open_data_dir).pack(side="left", padx=(0, 10))
         
@@ -107,7 +125,7 @@ class StockDataUI:
         self.status_label.pack(side="left", padx=(5, 0))
         
         # 进度条
-        self.progress = ttk.Progressbar(self.root, mode='indeterminate')
+        self.progress = ttk.Progressbar(self.root, mode='determinate')
         self.progress.pack(fill="x", padx=10, pady=2)
         
         # 结果显示区域
@@ -125,98 +143,126 @@ class StockDataUI:
         self.code_entry.insert(0, default_codes)
         
     def start_fetch_data(self):
-        """开始获取数据（在新线程中执行）"""
+        """开始获取数据：每只股票提交一个后台任务，结果按完成顺序流式写入"""
         # 验证输入
         codes_text = self.code_entry.get().strip()
         if not codes_text:
             messagebox.showwarning("输入错误", "请输入股票代码")
             return
             
-        # 在新线程中执行数据获取
-        thread = threading.Thread(target=self.fetch_data_thread, args=(codes_text,))
-        thread.daemon = True
-        thread.start()
-        
-    def fetch_data_thread(self, codes_text):
-        """数据获取线程"""
-        try:
-            # 更新UI状态
-            self.update_status("正在获取数据...")
-            self.progress.start(10)
-            
-            # 解析股票代码
-            stock_codes = [code.strip() for code in codes_text.split(",") if code.strip()]
-            
-            # 获取功能类型
-            function_type = self.function_var.get()
+        # 解析股票代码（去重保序）
+        stock_codes = list(dict.fromkeys(code.strip() for code in codes_text.split(",") if code.strip()))
+        if not stock_codes:
+            messagebox.showwarning("输入错误", "请输入股票代码")
+            return
             
+        # Tk 变量只在主线程读取
+        function_type = self.function_var.get()
+        save = self.save_var.get()
+        
+        # 新的一代任务，上一批未完成的任务作废；换代与任务写结果互斥，旧任务不会写进新一批
+        with self._batch_lock:
+            token = self.engine.start()
             self.clear_results()
-            self.append_result(f"开始获取 {len(stock_codes)} 只股票的数据...")
-            self.append_result(f"股票列表: {', '.join(stock_codes)}")
-            self.append_result(f"获取类型: {self.get_function_name(function_type)}")
-            self.append_result("=" * 60 + "\n")
-            
-            success_count = 0
+            self._batch = batch = {"total": len(stock_codes), "done": 0, "success": 0}
+        
+        self.append_result(f"开始获取 {len(stock_codes)} 只股票的数据...")
+        self.append_result(f"股票列表: {', '.join(stock_codes)}")
+        self.append_result(f"获取类型: {self.get_function_name(function_type)}")
+        self.append_result("=" * 60 + "\n")
+        
+        self.progress.config(maximum=len(stock_codes), value=0)
+        self.start_btn.config(state="disabled")
+        self.cancel_btn.config(state="normal")
+        self.update_status(f"正在获取数据 (0/{len(stock_codes)})...")
+        
+        for code in stock_codes:
+            self.engine.submit(self.fetch_one, batch, code, function_type, save, token=token)
             
-            for i, code in enumerate(stock_codes, 1):
-                self.update_status(f"正在处理 {code} ({i}/{len(stock_codes)})...")
+    def fetch_one(self, token, batch, code, function_type, save):
+        """获取一只股票的数据（后台线程），整段结果一次写入，不与其他股票交错"""
+        lines = []
+        ok = False
+        try:
+            if function_type in ["basic_info", "both"]:
+                lines.extend(self.process_basic_info(code))
                 
-                try:
-                    if function_type in ["basic_info", "both"]:
-                        self.process_basic_info(code)
-                        
-                    if function_type in ["historical", "both"]:
-                        self.process_historical_data(code)
-                        
-                    success_count += 1
-                    self.append_result(f"✅ {code} 处理完成\n")
-                    
-                except Exception as e:
-                    self.append_result(f"❌ {code} 处理失败: {str(e)}\n")
-            
-            # 完成总结
-            self.append_result("=" * 60)
-            self.append_result(f"数据获取完成！成功: {success_count}/{len(stock_codes)}")
-            
-            if self.save_var.get():
-                self.append_result(f"数据已保存到 data/ 目录")
+            if function_type in ["historical", "both"] and not token.cancelled:
+                lines.extend(self.process_historical_data(code, save))
                 
-            self.update_status("获取完成")
+            ok = True
+            lines.append(f"✅ {code} 处理完成\n")
             
         except Exception as e:
-            self.append_result(f"❌ 获取过程中出现错误: {str(e)}")
-            self.update_status("获取失败")
+            lines.append(f"❌ {code} 处理失败: {str(e)}\n")
+            
+        with self._batch_lock:
+            if token.cancelled:
+                return
+            self.append_result("\n".join(lines))
+            batch["done"] += 1
+            batch["success"] += ok
+            done, success, total = batch["done"], batch["success"], batch["total"]
+        self.engine.post(token, "progress", self.update_progress, code, ok, done, total)
+        if done == total:
+            self.engine.post(token, "finished", self.on_fetch_finished, success, total, save)
             
-        finally:
-            self.progress.stop()
+    def update_progress(self, code, ok, done, total):
+        """主线程：更新进度条和状态（一帧内多只股票完成时只显示最新一只）"""
+        self.progress.config(value=done)
+        self.status_var.set(f"{'✅' if ok else '❌'} {code}  已完成 {done}/{total}")
+        
+    def on_fetch_finished(self, success, total, save):
+        """主线程：全部股票处理完成"""
+        self.append_result("=" * 60)
+        self.append_result(f"数据获取完成！成功: {success}/{total}")
+        
+        if save:
+            self.append_result(f"数据已保存到 data/ 目录")
+            
+        self.update_status("获取完成")
+        self.start_btn.config(state="normal")
+        self.cancel_btn.config(state="disabled")
+        
+    def cancel_fetch(self):
+        """取消批量获取：排队中的任务不再执行，执行中的任务结果丢弃"""
+        with self._batch_lock:
+            self.engine.stop()
+            done, total = self._batch["done"], self._batch["total"]
+        self.append_result("=" * 60)
+        self.append_result(f"已取消，完成 {done}/{total}")
+        self.progress.config(value=done)
+        self.update_status("已取消")
+        self.start_btn.config(state="normal")
+        self.cancel_btn.config(state="disabled")
             
     def process_basic_info(self, code):
-        """处理基本信息获取"""
+        """处理基本信息获取，返回结果文本行"""
         info = self.fetcher.get_stock_info(code)
         if info:
             formatted_info = format_stock_info(info, code)
-            self.append_result(formatted_info + "\n")
-        else:
-            self.append_result(f"❌ 无法获取 {code} 的基本信息\n")
+            return [formatted_info + "\n"]
+        return [f"❌ 无法获取 {code} 的基本信息\n"]
             
-    def process_historical_data(self, code):
-        """处理历史数据获取"""
+    def process_historical_data(self, code, save=True):
+        """处理历史数据获取，返回结果文本行"""
         hist_data = self.fetcher.get_historical_data(code)
-        if hist_data is not None:
-            self.append_result(f"📊 {code} 历史数据 ({len(hist_data)} 条记录):")
-            
-            # 显示最近3天的数据
-            summary = format_historical_summary(hist_data, 3)
-            self.append_result(summary + "\n")
+        if hist_data is None:
+            return [f"❌ 无法获取 {code} 的历史数据\n"]
             
-            # 保存数据
-            if self.save_var.get():
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{code}_data_{timestamp}.csv"
-                self.fetcher.save_to_csv(hist_data, filename)
-                self.append_result(f"💾 已保存为: {filename}\n")
-        else:
-            self.append_result(f"❌ 无法获取 {code} 的历史数据\n")
+        lines = [f"📊 {code} 历史数据 ({len(hist_data)} 条记录):"]
+        
+        # 显示最近3天的数据
+        summary = format_historical_summary(hist_data, 3)
+        lines.append(summary + "\n")
+        
+        # 保存数据
+        if save:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"{code}_data_{timestamp}.csv"
+            self.fetcher.save_to_csv(hist_data, filename)
+            lines.append(f"💾 已保存为: {filename}\n")
+        return lines
             
     def get_function_name(self, func_type):
         """获取功能类型的中文名称"""
@@ -228,18 +274,26 @@ class StockDataUI:
         return names.get(func_type, "未知")
         
     def update_status(self, message):
-        """更新状态栏"""
-        self.status_var.set(message)
-        self.root.update_idletasks()
+        """更新状态栏（可在后台线程调用，下一帧显示最新一条）"""
+        self.scheduler.mark_dirty("status", self.status_var.set, message)
         
     def append_result(self, text):
-        """添加结果文本"""
-        self.result_text.insert(tk.END, text + "\n")
-        self.result_text.see(tk.END)
-        self.root.update_idletasks()
+        """添加结果文本（可在后台线程调用，下一帧批量写入）"""
+        self._pending_results.append(text + "\n")
+        self.scheduler.mark_dirty("results", self.flush_results)
+        
+    def flush_results(self):
+        """把累积的结果一次性写入文本框"""
+        lines = []
+        while self._pending_results:
+            lines.append(self._pending_results.popleft())
+        if lines:
+            self.result_text.insert(tk.END, "".join(lines))
+            self.result_text.see(tk.END)
         
     def clear_results(self):
         """清空结果显示"""
+        self._pending_results.clear()
         self.result_text.delete(1.0, tk.END)
         
     def open_data_dir(self):
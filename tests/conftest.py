@@ -0,0 +1,6 @@
+"""测试从仓库根目录导入各模块（模块都在根目录下，没有包结构）"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,135 @@
+"""QuoteHub 的按股票调度和逐字段差异：用假的获取器和日历，不启动轮询线程"""
+
+import pytest
+
+from quote_hub import MAX_BACKOFF, TRADE_FIELDS, VOLATILE_FIELDS, QuoteHub, Subscription, quote_diff
+
+
+class FakeFetcher:
+    def __init__(self):
+        self.quotes = {}
+        self.requests = []
+
+    def get_multiple_stocks_realtime(self, codes, trace=None):
+        self.requests.append(list(codes))
+        return {code: dict(self.quotes[code]) for code in codes if code in self.quotes}
+
+
+class RecordingCalendar:
+    """poll_delay 原样返回间隔并记录"""
+
+    def __init__(self):
+        self.intervals = []
+
+    def poll_delay(self, interval, idle_interval=0, now=None):
+        self.intervals.append(interval)
+        return interval
+
+
+def quote(code, price, **fields):
+    return {"code": code, "name": code, "price": price, "change": 0.0, "change_amount": 0.0,
+            "volume": 100.0, "bid": price, "ask": price, "quote_time": "20261019100000", **fields}
+
+
+@pytest.fixture
+def hub():
+    return QuoteHub(fetcher=FakeFetcher(), calendar=RecordingCalendar())
+
+
+def add_subscription(hub, codes, interval=5.0, **kwargs):
+    received = []
+    sub = Subscription(hub, codes, received.append, interval, **kwargs)
+    hub._subs.append(sub)
+    return sub, received
+
+
+def test_backoff_doubles_up_to_max(hub):
+    add_subscription(hub, ["600000"], interval=5.0)
+    hub.fetcher.quotes["600000"] = quote("600000", 10.0)
+    for _ in range(5):
+        hub.poll_once(force=True)
+    assert hub.calendar.intervals == [5.0, 10.0, 20.0, 5.0 * MAX_BACKOFF, 5.0 * MAX_BACKOFF]
+
+
+def test_price_change_resets_backoff(hub):
+    add_subscription(hub, ["600000"], interval=5.0)
+    hub.fetcher.quotes["600000"] = quote("600000", 10.0)
+    for _ in range(3):
+        hub.poll_once(force=True)
+    hub.fetcher.quotes["600000"] = quote("600000", 10.1)
+    hub.poll_once(force=True)
+    assert hub.calendar.intervals[-1] == 5.0
+
+
+def test_shortest_subscription_interval_wins(hub):
+    add_subscription(hub, ["600000"], interval=30.0)
+    add_subscription(hub, ["600000"], interval=5.0)
+    hub.fetcher.quotes["600000"] = quote("600000", 10.0)
+    hub.poll_once(force=True)
+    assert hub.calendar.intervals == [5.0]
+
+
+def test_only_due_codes_are_requested(hub):
+    add_subscription(hub, ["600000", "000001"])
+    hub.fetcher.quotes.update({"600000": quote("600000", 10.0), "000001": quote("000001", 12.0)})
+    hub.poll_once()
+    assert hub.fetcher.requests == [["600000", "000001"]]
+    # 刚轮询过、尚未到期
+    assert hub.poll_once() == {}
+    assert len(hub.fetcher.requests) == 1
+
+
+def test_missing_quote_is_not_rescheduled(hub):
+    add_subscription(hub, ["600000", "000001"])
+    hub.fetcher.quotes["600000"] = quote("600000", 10.0)
+    hub.poll_once()
+    # 没取到的股票不走日历，按订阅间隔重试
+    assert hub.calendar.intervals == [5.0]
+
+
+
+# ---- 逐字段差异 ----
+
+def test_quote_diff_first_snapshot_is_full_without_volatile_fields():
+    current = quote("600000", 10.0, timestamp="t", cycle_stamps={})
+    diff = quote_diff(None, current)
+    assert set(diff) == set(current) - set(VOLATILE_FIELDS)
+
+
+def test_quote_diff_ignores_quote_time_only_changes():
+    assert quote_diff(quote("600000", 10.0), quote("600000", 10.0, quote_time="20261019100005")) == {}
+
+
+def test_quote_diff_reports_changed_fields_with_other_drift():
+    previous = quote("600000", 10.0)
+    current = quote("600000", 10.0, bid=9.99, quote_time="20261019100005")
+    assert quote_diff(previous, current) == {"bid": 9.99, "quote_time": "20261019100005"}
+
+
+def test_unchanged_round_is_not_delivered(hub):
+    _, received = add_subscription(hub, ["600000"])
+    hub.fetcher.quotes["600000"] = quote("600000", 10.0)
+    hub.poll_once(force=True)
+    hub.fetcher.quotes["600000"] = quote("600000", 10.0, quote_time="20261019100005")
+    hub.poll_once(force=True)
+    assert len(received) == 1
+    assert set(received[0]["600000"]["changed_fields"]) == set(quote("600000", 10.0))
+
+
+def test_diff_only_and_full_subscribers(hub):
+    _, full = add_subscription(hub, ["600000"])
+    _, diffs = add_subscription(hub, ["600000"], diff_only=True)
+    hub.fetcher.quotes["600000"] = quote("600000", 10.0)
+    hub.poll_once(force=True)
+    hub.fetcher.quotes["600000"] = quote("600000", 10.0, ask=10.02)
+    hub.poll_once(force=True)
+    assert diffs[-1] == {"600000": {"ask": 10.02}}
+    assert full[-1]["600000"]["price"] == 10.0
+    assert full[-1]["600000"]["changed_fields"] == ("ask",)
+    assert not {"ask"} & TRADE_FIELDS
+
+
+def test_failed_round_still_notifies(hub):
+    _, received = add_subscription(hub, ["600000"])
+    hub.poll_once(force=True)
+    assert received == [{}]
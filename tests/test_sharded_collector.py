@@ -0,0 +1,42 @@
+"""最高随机权重哈希分片：覆盖、稳定性和成员变化时的迁移量"""
+
+from sharded_collector import assign_shards
+
+CODES = [f"{600000 + i}" for i in range(3000)]
+
+
+def owners(shards):
+    return {code: worker for worker, codes in shards.items() for code in codes}
+
+
+def test_every_code_assigned_exactly_once():
+    shards = assign_shards(CODES, ["w1", "w2", "w3"])
+    assigned = [code for codes in shards.values() for code in codes]
+    assert sorted(assigned) == sorted(CODES)
+
+
+def test_assignment_is_deterministic_and_order_independent():
+    assert owners(assign_shards(CODES, ["w1", "w2", "w3"])) == owners(assign_shards(CODES, ["w3", "w1", "w2"]))
+
+
+def test_shards_are_roughly_balanced():
+    sizes = [len(codes) for codes in assign_shards(CODES, ["w1", "w2", "w3"]).values()]
+    assert max(sizes) - min(sizes) < len(CODES) * 0.1
+
+
+def test_leaving_worker_only_moves_its_own_codes():
+    before = owners(assign_shards(CODES, ["w1", "w2", "w3"]))
+    after = owners(assign_shards(CODES, ["w1", "w3"]))
+    moved = {code for code in CODES if before[code] != after[code]}
+    assert moved == {code for code in CODES if before[code] == "w2"}
+
+
+def test_joining_worker_only_takes_codes():
+    before = owners(assign_shards(CODES, ["w1", "w2"]))
+    after = owners(assign_shards(CODES, ["w1", "w2", "w3"]))
+    moved = [code for code in CODES if before[code] != after[code]]
+    assert moved and all(after[code] == "w3" for code in moved)
+
+
+def test_no_workers():
+    assert assign_shards(CODES, []) == {}
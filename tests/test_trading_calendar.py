@@ -0,0 +1,81 @@
+"""交易时段与轮询间隔：用固定时间和离线日历，不访问网络"""
+
+import json
+from datetime import date, datetime
+
+import pytest
+
+from trading_calendar import CLOSE_GRACE_SECONDS, TradingCalendar
+
+# 2026-10-19 为周一
+MONDAY = date(2026, 10, 19)
+
+
+@pytest.fixture
+def calendar(tmp_path):
+    """无缓存、不联网：按周一至周五估计交易日"""
+    return TradingCalendar(cache_file=str(tmp_path / "calendar.json"), fetch=False)
+
+
+def at(text: str) -> datetime:
+    return datetime.fromisoformat(text)
+
+
+def test_phase(calendar):
+    assert calendar.phase(at("2026-10-19 09:20")) == "auction"
+    assert calendar.phase(at("2026-10-19 10:00")) == "continuous"
+    assert calendar.phase(at("2026-10-19 12:00")) == "break"
+    assert calendar.phase(at("2026-10-19 15:00")) == "break"
+    assert calendar.phase(at("2026-10-24 10:00")) == "closed"
+
+
+def test_poll_delay_in_session_uses_interval(calendar):
+    assert calendar.poll_delay(5, now=at("2026-10-19 10:00")) == 5
+
+
+def test_poll_delay_polls_again_after_session_end(calendar):
+    # 距上午收盘 2 秒：收盘后再取一次（加 CLOSE_GRACE_SECONDS）
+    assert calendar.poll_delay(60, now=at("2026-10-19 11:29:58")) == 2 + CLOSE_GRACE_SECONDS
+    assert calendar.poll_delay(60, now=at("2026-10-19 14:59:58")) == 2 + CLOSE_GRACE_SECONDS
+
+
+def test_poll_delay_auction_runs_into_continuous(calendar):
+    # 集合竞价结束紧接连续竞价，不加宽限
+    assert calendar.poll_delay(60, now=at("2026-10-19 09:29:58")) == 2
+
+
+def test_poll_delay_lunch_break(calendar):
+    assert calendar.poll_delay(5, now=at("2026-10-19 12:00")) == 3600
+    assert calendar.poll_delay(5, idle_interval=300, now=at("2026-10-19 12:00")) == 300
+    # 慢速轮询不超过下一个时段开始
+    assert calendar.poll_delay(5, idle_interval=300, now=at("2026-10-19 12:58")) == 120
+
+
+def test_poll_delay_after_close_waits_for_next_open(calendar):
+    assert calendar.poll_delay(5, idle_interval=300, now=at("2026-10-19 15:10")) == 300
+    expected = (at("2026-10-20 09:15") - at("2026-10-19 16:00")).total_seconds()
+    assert calendar.poll_delay(5, idle_interval=300, now=at("2026-10-19 16:00")) == expected
+
+
+def test_poll_delay_weekend(calendar):
+    expected = (at("2026-10-26 09:15") - at("2026-10-24 10:00")).total_seconds()
+    assert calendar.poll_delay(5, idle_interval=300, now=at("2026-10-24 10:00")) == expected
+
+
+def test_holiday_from_cached_calendar(tmp_path):
+    cache = tmp_path / "calendar.json"
+    # 周一休市
+    days = ["2026-10-16", "2026-10-20", "2026-10-21", "2026-12-31"]
+    cache.write_text(json.dumps({"fetched": date.today().isoformat(), "dates": days}))
+    calendar = TradingCalendar(cache_file=str(cache), fetch=False)
+
+    assert not calendar.is_trading_day(MONDAY)
+    assert calendar.phase(at("2026-10-19 10:00")) == "closed"
+    expected = (at("2026-10-20 09:15") - at("2026-10-19 10:00")).total_seconds()
+    assert calendar.poll_delay(5, now=at("2026-10-19 10:00")) == expected
+    assert calendar.last_close(at("2026-10-19 10:00")) == at(f"2026-10-16 15:00:{CLOSE_GRACE_SECONDS:02d}")
+
+
+def test_last_close(calendar):
+    assert calendar.last_close(at("2026-10-19 10:00")) == at(f"2026-10-16 15:00:{CLOSE_GRACE_SECONDS:02d}")
+    assert calendar.last_close(at("2026-10-19 16:00")) == at(f"2026-10-19 15:00:{CLOSE_GRACE_SECONDS:02d}")
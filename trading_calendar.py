@@ -0,0 +1,178 @@
+"""
+沪深交易日历与交易时段
+- 集合竞价 9:15–9:30，连续竞价 9:30–11:30、13:00–15:00
+- 交易日列表来自 AkShare（新浪交易日历），缓存到 data/trade_calendar.json，每月刷新一次；
+  获取失败且没有缓存时按周一至周五估计
+- poll_delay() 给出下一次行情轮询的等待秒数：盘中按给定间隔，收盘后补一次收盘价，
+  午休和盘前盘后慢速轮询，夜间和休市日等到下一个交易时段
+"""
+
+import json
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Set
+
+from config import DATA_DIR
+
+CALENDAR_FILE = os.path.join(DATA_DIR, "trade_calendar.json")
+# 缓存超过此天数重新获取
+CALENDAR_MAX_AGE_DAYS = 30
+
+# (开始, 结束, 阶段)
+SESSIONS = [
+    (time(9, 15), time(9, 30), "auction"),
+    (time(9, 30), time(11, 30), "continuous"),
+    (time(13, 0), time(15, 0), "continuous"),
+]
+# 交易日内慢速轮询的时间窗口（盘前、午休、盘后固定价格交易）
+EXTENDED_START = time(9, 0)
+EXTENDED_END = time(15, 30)
+# 时段结束后再取一次，拿到收盘价
+CLOSE_GRACE_SECONDS = 5
+
+
+class TradingCalendar:
+    """交易日历，首次查询时加载（可能访问网络，应在后台线程调用）"""
+
+    def __init__(self, cache_file: str = CALENDAR_FILE, fetch: bool = True):
+        self.cache_file = cache_file
+        self.fetch = fetch
+        self._dates: Optional[Set[date]] = None
+        self._last_date: Optional[date] = None
+        self._lock = threading.Lock()
+        self.source = "weekday"
+
+    # ---- 交易日 ----
+
+    def _load(self):
+        cached = self._read_cache()
+        today = date.today()
+        fresh = (cached is not None
+                 and (today - cached["fetched"]).days <= CALENDAR_MAX_AGE_DAYS
+                 and cached["last"] >= today)
+        if not fresh and self.fetch:
+            fetched = self._fetch_dates()
+            if fetched:
+                self._write_cache(fetched)
+                cached = {"fetched": today, "dates": fetched, "last": max(fetched)}
+        if cached is not None:
+            self._dates = cached["dates"]
+            self._last_date = cached["last"]
+            self.source = "calendar"
+        else:
+            self._dates = set()
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_file, encoding="utf-8") as f:
+                raw = json.load(f)
+            dates = {date.fromisoformat(d) for d in raw["dates"]}
+            return {"fetched": date.fromisoformat(raw["fetched"]), "dates": dates, "last": max(dates)}
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_cache(self, dates: Set[date]):
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            with open(self.cache_file, "w", encoding="utf-8") as f:
+                json.dump({"fetched": date.today().isoformat(),
+                           "dates": sorted(d.isoformat() for d in dates)}, f)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _fetch_dates() -> Optional[Set[date]]:
+        try:
+            import akshare
+            df = akshare.tool_trade_date_hist_sina()
+            return {d if isinstance(d, date) else date.fromisoformat(str(d)[:10]) for d in df["trade_date"]}
+        except Exception as e:
+            print(f"交易日历获取失败，按工作日估计: {str(e)[:80]}")
+            return None
+
+    def is_trading_day(self, day: date) -> bool:
+        with self._lock:
+            if self._dates is None:
+                self._load()
+        # 日历覆盖范围之外按工作日估计
+        if self._last_date is None or day > self._last_date:
+            return day.weekday() < 5
+        return day in self._dates
+
+    # ---- 时段 ----
+
+    def phase(self, now: Optional[datetime] = None) -> str:
+        """当前阶段: auction / continuous / break（交易日非交易时段）/ closed（休市日）"""
+        now = now or datetime.now()
+        if not self.is_trading_day(now.date()):
+            return "closed"
+        t = now.time()
+        for start, end, name in SESSIONS:
+            if start <= t < end:
+                return name
+        return "break"
+
+    def next_session_start(self, now: Optional[datetime] = None) -> datetime:
+        """下一个交易时段的开始时间（当前在时段内时返回之后的时段）"""
+        now = now or datetime.now()
+        day = now.date()
+        for _ in range(30):
+            if self.is_trading_day(day):
+                for start, _, _ in SESSIONS:
+                    begin = datetime.combine(day, start)
+                    if begin > now:
+                        return begin
+            day += timedelta(days=1)
+        return now + timedelta(days=1)
+
+    def last_close(self, now: Optional[datetime] = None) -> datetime:
+        """最近一次已经收盘的时间（含 CLOSE_GRACE_SECONDS），收盘后取到的K线即为当日最终数据"""
+        now = now or datetime.now()
+        close = SESSIONS[-1][1]
+        day = now.date()
+        for _ in range(30):
+            if self.is_trading_day(day):
+                end = datetime.combine(day, close) + timedelta(seconds=CLOSE_GRACE_SECONDS)
+                if end <= now:
+                    return end
+            day -= timedelta(days=1)
+        return now - timedelta(days=1)
+
+    def poll_delay(self, interval: float, idle_interval: float = 0,
+                   now: Optional[datetime] = None) -> float:
+        """
+        距下一次轮询的秒数
+
+        Args:
+            interval: 盘中轮询间隔
+            idle_interval: 交易日盘前、午休、盘后的慢速轮询间隔，0 表示不轮询
+        """
+        now = now or datetime.now()
+        until_open = (self.next_session_start(now) - now).total_seconds()
+        if not self.is_trading_day(now.date()):
+            return until_open
+
+        t = now.time()
+        for start, end, _ in SESSIONS:
+            if start <= t < end:
+                until_end = (datetime.combine(now.date(), end) - now).total_seconds()
+                # 下一次轮询不晚于时段结束，相邻时段（集合竞价 -> 连续竞价）直接衔接
+                return min(interval, until_end + (0 if end == SESSIONS[1][0] else CLOSE_GRACE_SECONDS))
+
+        if idle_interval and EXTENDED_START <= t < EXTENDED_END:
+            return min(idle_interval, until_open)
+        return until_open
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def get_calendar() -> TradingCalendar:
+    """进程内共用的交易日历"""
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            _calendar = TradingCalendar()
+        return _calendar
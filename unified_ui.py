@@ -2,14 +2,25 @@
 统一股票终端 UI
 - Tab1: 实时K线（复用 RealKlineUI）
 - Tab2: 简易查询（复用 SimpleStockUI）
+- Tab3: 多股监控墙（GridMonitorUI）
+
+页面模块（matplotlib、pandas 等导入较慢）在窗口显示后由后台线程预先导入，
+各页签在第一次被选中时才构造
 """
 
+import importlib
 import tkinter as tk
 from tkinter import ttk
+from concurrent.futures import ThreadPoolExecutor
 
-# 复用现有页面
-from real_kline_ui import RealKlineUI
-from stock_ui import StockDataUI
+# 页签：(页签属性, 页面属性, 标题, 模块, 类名)，按预导入顺序排列
+TABS = [
+    ("tab_kline", "kline_page", "K线图表", "real_kline_ui", "RealKlineUI"),
+    ("tab_data", "data_page", "数据批量获取", "stock_ui", "StockDataUI"),
+    ("tab_grid", "grid_page", "多股监控", "grid_monitor_ui", "GridMonitorUI"),
+]
+# 等待后台导入完成时的轮询间隔（毫秒）
+IMPORT_POLL_MS = 50
 
 class UnifiedStockApp:
     def __init__(self, root):
@@ -23,15 +34,51 @@ class UnifiedStockApp:
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill="both", expand=True)
 
-        # K线页签
-        self.tab_kline = ttk.Frame(self.notebook)
-        self.notebook.add(self.tab_kline, text="K线图表")
-        self.kline_page = RealKlineUI(self.tab_kline)  # 以 Frame 作为父容器
+        # 先只放占位页签，页面对象在首次选中时创建
+        self._tabs = {}
+        for tab_attr, page_attr, title, module, class_name in TABS:
+            frame = ttk.Frame(self.notebook)
+            self.notebook.add(frame, text=title)
+            placeholder = ttk.Label(frame, text="加载中...", foreground="gray")
+            placeholder.place(relx=0.5, rely=0.5, anchor="center")
+            setattr(self, tab_attr, frame)
+            setattr(self, page_attr, None)
+            self._tabs[str(frame)] = (frame, placeholder, page_attr, module, class_name)
+
+        # 单个后台线程按页签顺序导入页面模块
+        self._importer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tab-import")
+        self._modules = {module: self._importer.submit(importlib.import_module, module)
+                         for _, _, _, module, _ in TABS}
+        self._importer.shutdown(wait=False)
+
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+
+    def on_tab_changed(self, event=None):
+        self.build_tab(self.notebook.select())
+
+    def build_tab(self, tab_id):
+        """构造页签页面；模块还在后台导入时稍后重试"""
+        spec = self._tabs.get(str(tab_id))
+        if spec is None:
+            return
+        frame, placeholder, page_attr, module, class_name = spec
+        if getattr(self, page_attr) is not None:
+            return
+
+        future = self._modules[module]
+        if not future.done():
+            self.root.after(IMPORT_POLL_MS, self.build_tab, tab_id)
+            return
 
-        # 数据批量获取页签
-        self.tab_data = ttk.Frame(self.notebook)
-        self.notebook.add(self.tab_data, text="数据批量获取")
-        self.data_page = StockDataUI(self.tab_data)
+        try:
+            page_class = getattr(future.result(), class_name)
+            setattr(self, page_attr, page_class(frame))  # 以 Frame 作为父容器
+            placeholder.destroy()
+        except Exception as e:
+            placeholder.configure(text=f"页面加载失败: {e}", foreground="red")
+            print(f"页面加载失败 {module}.{class_name}: {e}")
+            # 不再重试
+            setattr(self, page_attr, False)
 
 def main():
     root = tk.Tk()
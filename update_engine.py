@@ -0,0 +1,126 @@
+"""
+界面后台更新引擎
+- 每次 start()/stop() 生成新的代号，旧代号的任务在下一个检查点退出，结果直接丢弃
+- 等待用 threading.Event，停止在毫秒级生效，不会有沉睡中的旧循环被重新唤醒
+- 任务在固定大小的线程池中执行，同 key 的任务未完成时不重复提交，并发请求数有上限
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+DEFAULT_WORKERS = 2
+
+
+class UpdateToken:
+    """一次 start() 的代号，任务通过它判断是否已被取消"""
+
+    def __init__(self, engine: "UpdateEngine", generation: int):
+        self.engine = engine
+        self.generation = generation
+        self.stopped = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.stopped.is_set() or self.generation != self.engine.generation
+
+    def wait(self, seconds: float) -> bool:
+        """等待 seconds 秒，被取消时立即返回 True"""
+        self.stopped.wait(seconds)
+        return self.cancelled
+
+
+class UpdateEngine:
+    """
+    管理一个界面的后台任务，start()/stop()/submit() 在主线程调用
+
+    任务签名为 func(token, *args)；后台结果经 post() 交给 RenderScheduler，
+    在主线程执行前再次检查代号，过期的结果不会落到界面上
+    """
+
+    def __init__(self, scheduler=None, max_workers: int = DEFAULT_WORKERS, name: str = "update"):
+        self.scheduler = scheduler
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._token = UpdateToken(self, 0)
+        # key -> (提交时的代号, Future)
+        self._running: Dict[Hashable, Tuple[UpdateToken, Future]] = {}
+        self._closers: List[Callable[[], None]] = []
+
+    @property
+    def token(self) -> UpdateToken:
+        return self._token
+
+    def start(self) -> UpdateToken:
+        """取消上一代任务并开始新的一代"""
+        with self._lock:
+            self._cancel_locked()
+            self._token = UpdateToken(self, self.generation)
+            return self._token
+
+    def stop(self):
+        with self._lock:
+            self._cancel_locked()
+            self._token = UpdateToken(self, self.generation)
+
+    def _cancel_locked(self):
+        self.generation += 1
+        self._token.stopped.set()
+        closers, self._closers = self._closers, []
+        for close in closers:
+            try:
+                close()
+            except Exception as e:
+                print(f"停止更新时出错: {e}")
+
+    def attach(self, token: UpdateToken, close: Callable[[], None]) -> bool:
+        """把订阅等资源绑定到代号：代号过期时调用 close()；已经过期则立即关闭并返回 False"""
+        with self._lock:
+            if not token.cancelled:
+                self._closers.append(close)
+                return True
+        close()
+        return False
+
+    def submit(self, func: Callable, *args, key: Optional[Hashable] = None,
+               token: Optional[UpdateToken] = None) -> Future:
+        """
+        在线程池中执行 func(token, *args)；同一代号下同 key 的任务还在执行时返回已有的 Future，
+        上一代还没退出的同 key 任务不影响新一代提交
+        """
+        token = token or self._token
+        with self._lock:
+            if key is not None and key in self._running:
+                running_token, running = self._running[key]
+                if running_token is token and not token.cancelled and not running.done():
+                    return running
+            future = self._pool.submit(self._run, func, token, args)
+            if key is not None:
+                self._running[key] = (token, future)
+        return future
+
+    @staticmethod
+    def _run(func: Callable, token: UpdateToken, args: tuple):
+        if token.cancelled:
+            return None
+        try:
+            return func(token, *args)
+        except Exception as e:
+            print(f"后台任务出错: {e}")
+            return None
+
+    def post(self, token: UpdateToken, key: Hashable, callback: Callable, *args):
+        """后台结果投递到主线程，执行时代号已过期则丢弃"""
+        if token.cancelled:
+            return
+        self.scheduler.mark_dirty(key, self._deliver, token, callback, args)
+
+    @staticmethod
+    def _deliver(token: UpdateToken, callback: Callable, args: tuple):
+        if not token.cancelled:
+            callback(*args)
+
+    def shutdown(self):
+        self.stop()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,148 @@
+"""
+K线图视口管理
+鼠标滚轮缩放、左键拖动平移、双击复位；视口以K线序号为坐标，
+只向数据层请求可见区间加预取余量，拖到左边缘附近时请求加载更早的历史
+"""
+
+import math
+from typing import Callable, Optional, Sequence, Tuple
+
+# 最少可见K线根数（放大极限）
+MIN_VISIBLE_BARS = 10
+# 预取余量：可见跨度的比例，左右各多取这么多，平移时不会露出空白
+PREFETCH_RATIO = 0.5
+# 每次滚轮缩放比例
+ZOOM_STEP = 1.2
+
+
+class ViewportManager:
+    """
+    维护可见区间 [start, end)，通过 matplotlib 事件响应缩放/平移
+
+    on_change() 在视口变化时调用（由界面重新查询并绘制可见区间）；
+    on_need_older() 在视口左侧预取区间超出已加载数据时调用，
+    加载完成后界面调用 prepend(n) 或 mark_exhausted()
+    """
+
+    def __init__(self, canvas, axes: Sequence, on_change: Callable[[], None],
+                 on_need_older: Optional[Callable[[], None]] = None,
+                 min_bars: int = MIN_VISIBLE_BARS, prefetch_ratio: float = PREFETCH_RATIO):
+        self.canvas = canvas
+        self.axes = list(axes)
+        self.on_change = on_change
+        self.on_need_older = on_need_older
+        self.min_bars = min_bars
+        self.prefetch_ratio = prefetch_ratio
+
+        self.total = 0
+        self.start = 0.0
+        self.end = 0.0
+        self.loading = False
+        self.exhausted = False
+        self._drag = None
+
+        self._cids = [
+            canvas.mpl_connect('scroll_event', self.on_scroll),
+            canvas.mpl_connect('button_press_event', self.on_press),
+            canvas.mpl_connect('motion_notify_event', self.on_motion),
+            canvas.mpl_connect('button_release_event', self.on_release),
+        ]
+
+    def disconnect(self):
+        for cid in self._cids:
+            self.canvas.mpl_disconnect(cid)
+        self._cids = []
+
+    # ---- 区间 ----
+
+    def reset(self, total: int, visible: Optional[int] = None):
+        """加载新数据后复位：显示最后 visible 根（默认全部）"""
+        self.total = total
+        self.end = float(total)
+        self.start = float(max(0, total - visible)) if visible else 0.0
+        self.loading = False
+        self.exhausted = False
+
+    def span(self) -> float:
+        return self.end - self.start
+
+    def xlim(self) -> Tuple[float, float]:
+        """坐标轴显示范围（两侧各留半根K线）"""
+        return self.start - 0.5, self.end - 0.5
+
+    def query_range(self) -> Tuple[int, int]:
+        """需要向数据层查询的序号区间：可见区间加左右预取余量"""
+        margin = self.span() * self.prefetch_ratio
+        return (max(0, int(math.floor(self.start - margin))),
+                min(self.total, int(math.ceil(self.end + margin))))
+
+    def prepend(self, count: int):
+        """左侧插入了 count 根更早的K线，序号整体右移，画面保持不动"""
+        self.total += count
+        self.start += count
+        self.end += count
+        if self._drag is not None:
+            x0, start0, width = self._drag
+            self._drag = (x0, start0 + count, width)
+        self.loading = False
+        if count <= 0:
+            self.exhausted = True
+        self.on_change()
+
+    def mark_exhausted(self):
+        """没有更早的数据了"""
+        self.loading = False
+        self.exhausted = True
+
+    def _set_range(self, start: float, end: float):
+        span = min(max(end - start, self.min_bars), max(self.total, self.min_bars))
+        # 左侧允许拖出少量空白，提示正在加载
+        lower = -span * 0.2 if not self.exhausted else 0.0
+        start = min(max(start, lower), self.total - span)
+        start = max(start, lower)
+        self.start, self.end = start, start + span
+        self._check_left_edge()
+        self.on_change()
+
+    def _check_left_edge(self):
+        if self.loading or self.exhausted or self.on_need_older is None:
+            return
+        if self.start - self.span() * self.prefetch_ratio < 0:
+            self.loading = True
+            self.on_need_older()
+
+    def zoom(self, factor: float, center: float):
+        """以 center（K线序号）为中心缩放，factor>1 为缩小（显示更多K线）"""
+        self._set_range(center - (center - self.start) * factor,
+                        center + (self.end - center) * factor)
+
+    def pan(self, bars: float):
+        """平移 bars 根，正数向右（看更新的K线）"""
+        self._set_range(self.start + bars, self.end + bars)
+
+    # ---- 事件 ----
+
+    def on_scroll(self, event):
+        if event.inaxes not in self.axes or event.xdata is None or not self.total:
+            return
+        factor = 1 / ZOOM_STEP if event.button == 'up' else ZOOM_STEP
+        self.zoom(factor, event.xdata)
+
+    def on_press(self, event):
+        if event.inaxes not in self.axes or not self.total:
+            return
+        if event.dblclick:
+            self._set_range(0, self.total)
+            return
+        if event.button == 1:
+            self._drag = (event.x, self.start, event.inaxes.get_window_extent().width)
+
+    def on_motion(self, event):
+        if self._drag is None or event.x is None:
+            return
+        x0, start0, width = self._drag
+        bars = (x0 - event.x) / max(width, 1) * self.span()
+        self.pan(start0 + bars - self.start)
+
+    def on_release(self, event):
+        self._drag = None